@@ -17,4 +17,232 @@ function showSubs(id){
             subExpand.style.display = "none";
         }
     }
-}
\ No newline at end of file
+}
+
+/*
+ * Lazy viewer (see scripts/build_viewer.py). Node records, neighborhoods and
+ * search entries live in static JSON shards that are fetched the first time
+ * they are needed and kept in memory afterwards.
+ */
+var viewer = {base: ".", manifest: null, shards: {}, pending: {}};
+
+function loadJSON(url, callback){
+    if (viewer.shards[url] !== undefined){
+        callback(viewer.shards[url]);
+        return;
+    }
+    if (viewer.pending[url] !== undefined){
+        viewer.pending[url].push(callback);
+        return;
+    }
+    viewer.pending[url] = [callback];
+    var xhr = new XMLHttpRequest();
+    xhr.open("GET", viewer.base + "/" + url, true);
+    xhr.onreadystatechange = function(){
+        if (xhr.readyState != 4){
+            return;
+        }
+        var data = null;
+        if (xhr.status == 200 || xhr.status == 0){
+            try{
+                data = JSON.parse(xhr.responseText);
+            }
+            catch (e){
+                data = null;
+            }
+        }
+        // Missing shards (e.g. no search entries for a prefix) are cached as null
+        viewer.shards[url] = data;
+        var callbacks = viewer.pending[url];
+        delete viewer.pending[url];
+        for (var i = 0; i < callbacks.length; i++){
+            callbacks[i](data);
+        }
+    };
+    xhr.send(null);
+}
+
+function shardOf(id){
+    return Math.floor(id / viewer.manifest.shard_size);
+}
+
+function getNode(id, callback){
+    loadJSON("nodes/" + shardOf(id) + ".json", function(shard){
+        callback(shard ? shard[id] : null);
+    });
+}
+
+function getNeighbors(id, callback){
+    loadJSON("edges/" + shardOf(id) + ".json", function(shard){
+        callback(shard && shard[id] ? shard[id] : {total: 0, edges: []});
+    });
+}
+
+function escapeHTML(text){
+    return String(text).replace(/&/g, "&amp;").replace(/</g, "&lt;")
+        .replace(/>/g, "&gt;").replace(/"/g, "&quot;");
+}
+
+function nodeLink(id, label){
+    return "<a href=\"#" + id + "\" onclick=\"showNode(" + id + "); return false;\">" +
+        escapeHTML(label) + "</a>";
+}
+
+function renderChildren(list, entries){
+    var html = "";
+    for (var i = 0; i < entries.length; i++){
+        var id = entries[i][0], label = entries[i][1], kind = entries[i][2], count = entries[i][3];
+        html += "<li id=\"node-" + id + "\">";
+        html += "<span class=\"" + (kind == "class" ? "keyword" : "literal") + "\">" + nodeLink(id, label) + "</span>";
+        if (count > 0){
+            html += " <a class=\"subsexpand\" id=\"subs-" + id + "-expand\" href=\"#\" onclick=\"expandNode(" +
+                id + "); return false;\">(" + count + ")</a>";
+            html += "<ul id=\"subs-" + id + "\" class=\"minihierarchy\" style=\"display: none\"></ul>";
+        }
+        html += "</li>";
+    }
+    list.insertAdjacentHTML("beforeend", html);
+}
+
+function loadChildPage(id, page, list){
+    loadJSON("children/" + id + "-" + page + ".json", function(entries){
+        var more = document.getElementById("more-" + id);
+        if (more != null){
+            more.parentNode.removeChild(more);
+        }
+        if (entries == null){
+            return;
+        }
+        renderChildren(list, entries);
+        if (entries.length == viewer.manifest.child_page_size){
+            list.insertAdjacentHTML("beforeend", "<li id=\"more-" + id + "\"><a class=\"subsexpand\" href=\"#\" " +
+                "onclick=\"loadChildPage(" + id + ", " + (page + 1) + ", document.getElementById('subs-" + id +
+                "')); return false;\">more...</a></li>");
+        }
+    });
+}
+
+function expandNode(id){
+    var list = document.getElementById("subs-" + id);
+    if (list == null){
+        return;
+    }
+    if (list.getAttribute("data-loaded") == null){
+        list.setAttribute("data-loaded", "1");
+        getNode(id, function(node){
+            if (node == null){
+                return;
+            }
+            renderChildren(list, node.children);
+            if (node.child_count > node.children.length){
+                list.insertAdjacentHTML("beforeend", "<li id=\"more-" + id + "\"><a class=\"subsexpand\" href=\"#\" " +
+                    "onclick=\"loadChildPage(" + id + ", 1, document.getElementById('subs-" + id +
+                    "')); return false;\">" + (node.child_count - node.children.length) + " more...</a></li>");
+            }
+        });
+    }
+    showSubs("subs-" + id);
+    var expand = document.getElementById("subs-" + id + "-expand");
+    if (expand != null){
+        // showSubs hides the expander; keep it as the collapse toggle
+        expand.style.display = "inline";
+    }
+}
+
+function showNode(id){
+    getNode(id, function(node){
+        var details = document.getElementById("details");
+        if (node == null){
+            details.innerHTML = "Unknown node " + id;
+            return;
+        }
+        var html = "<h2 class=\"active-entity\">" + escapeHTML(node.label) + "</h2>";
+        html += "<div class=\"ontology-uri\">" + escapeHTML(node.iri) + "</div>";
+        if (node.comment){
+            html += "<p class=\"comment\">" + escapeHTML(node.comment) + "</p>";
+        }
+        html += "<p>" + node.kind + ", " + node.child_count + (node.kind == "class" ? " children" : " subjects") + "</p>";
+        if (node.parents.length > 0){
+            html += "<b>Parents</b><ul>";
+            for (var i = 0; i < node.parents.length; i++){
+                html += "<li>" + nodeLink(node.parents[i][0], node.parents[i][1]) + "</li>";
+            }
+            html += "</ul>";
+        }
+        html += "<b>Neighborhood</b><ul id=\"neighbors\"><li>loading...</li></ul>";
+        details.innerHTML = html;
+
+        getNeighbors(id, function(near){
+            var list = document.getElementById("neighbors");
+            if (list == null){
+                return;
+            }
+            if (near.edges.length == 0){
+                list.innerHTML = "<li>none</li>";
+                return;
+            }
+            list.innerHTML = "";
+            for (var i = 0; i < near.edges.length; i++){
+                (function(edge){
+                    var li = document.createElement("li");
+                    li.innerHTML = "...";
+                    list.appendChild(li);
+                    getNode(edge[1], function(other){
+                        var name = other ? other.label : edge[1];
+                        var prop = "<span class=\"keyword\">" + escapeHTML(edge[0]) + "</span>";
+                        li.innerHTML = edge[2] == "out" ? prop + " &rarr; " + nodeLink(edge[1], name)
+                            : nodeLink(edge[1], name) + " &rarr; " + prop;
+                    });
+                })(near.edges[i]);
+            }
+            if (near.total > near.edges.length){
+                list.insertAdjacentHTML("beforeend", "<li>(" + (near.total - near.edges.length) + " more not shown)</li>");
+            }
+        });
+    });
+}
+
+var searchTimer = null;
+
+function searchLabels(text){
+    if (searchTimer != null){
+        clearTimeout(searchTimer);
+    }
+    searchTimer = setTimeout(function(){
+        var results = document.getElementById("search-results");
+        var query = text.toLowerCase().replace(/[^0-9a-z]/g, "");
+        if (query.length < 2){
+            results.innerHTML = "";
+            return;
+        }
+        loadJSON("search/" + query.substring(0, 2) + ".json", function(entries){
+            var html = "", shown = 0;
+            var needle = text.toLowerCase();
+            for (var i = 0; entries != null && i < entries.length && shown < 50; i++){
+                if (entries[i][0].toLowerCase().indexOf(needle) >= 0){
+                    html += "<li>" + nodeLink(entries[i][1], entries[i][0]) + "</li>";
+                    shown++;
+                }
+            }
+            results.innerHTML = html || "<li>no match</li>";
+        });
+    }, 150);
+}
+
+function initViewer(base){
+    viewer.base = base;
+    loadJSON("manifest.json", function(manifest){
+        if (manifest == null){
+            document.getElementById("tree").innerHTML = "<li>manifest.json not found (serve this directory over HTTP)</li>";
+            return;
+        }
+        viewer.manifest = manifest;
+        document.getElementById("counts").innerHTML = manifest.classes + " classes, " +
+            manifest.individuals + " individuals";
+        renderChildren(document.getElementById("tree"), manifest.roots);
+        var hash = parseInt(window.location.hash.substring(1), 10);
+        if (!isNaN(hash)){
+            showNode(hash);
+        }
+    });
+}
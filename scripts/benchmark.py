@@ -0,0 +1,301 @@
+# scripts/benchmark.py
+import os
+import sys
+import json
+import time
+import random
+import shutil
+import argparse
+import tempfile
+import tracemalloc
+
+from mock_llm_server import start_mock_server
+
+#########################################
+#  Offline benchmark harness
+#########################################
+# Runs each pipeline stage (and the whole pipeline) against bundled and
+# synthetic inputs with the LLM replaced by mock_llm_server, and reports
+# latency percentiles, throughput and peak traced memory per stage.
+#
+#   python scripts/benchmark.py --repeat 3 --output bench_output.json
+#   python scripts/benchmark.py --baseline bench_output.json   # exit 1 on regression
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+BUNDLED_PDFS = [
+    os.path.join(REPO_ROOT, "data", "primary_documents", "tank_manual.pdf"),
+    os.path.join(REPO_ROOT, "data", "primary_documents", "vehical_manual.pdf"),
+]
+
+_WORDS = ("engine turret hull gun track sight radio hatch armor fuel pump valve filter "
+          "sensor panel switch cable mount door seat driver gunner loader commander").split()
+
+
+#########################################
+#  Synthetic inputs
+#########################################
+def synthetic_text(pages, lines_per_page=45, seed=0):
+    """
+    Manual-like pages: numbered headings, prose with capitalized terms,
+    and a repeated page header.
+    """
+    rng = random.Random(seed)
+    out = []
+    for p in range(pages):
+        lines = [f"TM 9-2350-264-10 OPERATOR MANUAL    PAGE {p + 1}"]
+        if p % 3 == 0:
+            lines.append(f"{p // 3 + 1}.{p % 7} {rng.choice(_WORDS).upper()} {rng.choice(_WORDS).upper()} SYSTEM")
+        for _ in range(lines_per_page):
+            a, b = rng.choice(_WORDS).title(), rng.choice(_WORDS).title()
+            lines.append(f"The {a} {b} connects to the {rng.choice(_WORDS)} assembly. Check it before use.")
+        out.append(lines)
+    return out
+
+
+def write_synthetic_pdf(path, pages, lines_per_page=45, seed=0):
+    """
+    Writes a minimal text PDF (Helvetica, one content stream per page) that
+    PyPDF2 can extract, without any PDF-writing dependency.
+    """
+    def esc(s):
+        return s.replace("\\", "\\\\").replace("(", "\\(").replace(")", "\\)")
+
+    page_lines = synthetic_text(pages, lines_per_page, seed)
+    objects = []  # object bodies; object number = index + 1
+    objects.append("<< /Type /Catalog /Pages 2 0 R >>")
+    objects.append(None)  # pages tree, filled in below
+    objects.append("<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>")
+    kids = []
+    for lines in page_lines:
+        body = "BT /F1 9 Tf 11 TL 40 770 Td " + " ".join(f"({esc(l)}) Tj T*" for l in lines) + " ET"
+        objects.append(f"<< /Length {len(body)} >>\nstream\n{body}\nendstream")
+        content_num = len(objects)
+        objects.append(f"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 612 792] "
+                       f"/Resources << /Font << /F1 3 0 R >> >> /Contents {content_num} 0 R >>")
+        kids.append(f"{len(objects)} 0 R")
+    objects[1] = f"<< /Type /Pages /Kids [{' '.join(kids)}] /Count {len(kids)} >>"
+
+    out = bytearray(b"%PDF-1.4\n")
+    offsets = []
+    for num, body in enumerate(objects, start=1):
+        offsets.append(len(out))
+        out += f"{num} 0 obj\n{body}\nendobj\n".encode("latin-1")
+    xref = len(out)
+    out += f"xref\n0 {len(objects) + 1}\n0000000000 65535 f \n".encode("latin-1")
+    for off in offsets:
+        out += f"{off:010d} 00000 n \n".encode("latin-1")
+    out += f"trailer\n<< /Size {len(objects) + 1} /Root 1 0 R >>\nstartxref\n{xref}\n%%EOF\n".encode("latin-1")
+    with open(path, "wb") as f:
+        f.write(out)
+    return path
+
+
+def synthetic_partials(count, entities_per=20, relationships_per=30, seed=0):
+    rng = random.Random(seed)
+    partials = []
+    for _ in range(count):
+        partials.append({
+            "entities": [{"name": f"{rng.choice(_WORDS)} {rng.choice(_WORDS)}",
+                          "type": "Class",
+                          "description": f"Part {rng.randint(0, 99)} of the {rng.choice(_WORDS)}.",
+                          "properties": {"weight": rng.randint(1, 5)}}
+                         for _ in range(entities_per)],
+            "relationships": [{"source": f"{rng.choice(_WORDS)} {rng.choice(_WORDS)}",
+                               "type": rng.choice(["has part", "connected to", "is_a"]),
+                               "target": f"{rng.choice(_WORDS)} {rng.choice(_WORDS)}",
+                               "properties": {}}
+                              for _ in range(relationships_per)],
+        })
+    return partials
+
+
+def write_synthetic_ttl(path, classes, seed=0):
+    rng = random.Random(seed)
+    lines = ["@prefix : <http://www.example.org/ontology#> .",
+             "@prefix owl: <http://www.w3.org/2002/07/owl#> .",
+             "@prefix rdfs: <http://www.w3.org/2000/01/rdf-schema#> .", ""]
+    for i in range(classes):
+        lines.append(f':C{i} a owl:Class ; rdfs:label "Class {i}" ; rdfs:comment "Synthetic class {i}."'
+                     + (f" ; rdfs:subClassOf :C{rng.randrange(i)}" if i else "") + " .")
+        lines.append(f":I{i} a :C{i} ; rdfs:label \"Individual {i}\" ; :p{i % 40} :I{rng.randrange(classes)} .")
+    for p in range(40):
+        lines.append(f":p{p} a owl:ObjectProperty ; rdfs:domain :C{p} ; rdfs:range :C{p + 1} .")
+    with open(path, "w", encoding="utf-8") as f:
+        f.write("\n".join(lines))
+    return path
+
+
+#########################################
+#  Measurement
+#########################################
+def percentile(values, q):
+    ordered = sorted(values)
+    if not ordered:
+        return 0.0
+    k = min(len(ordered) - 1, max(0, int(round(q / 100.0 * (len(ordered) - 1)))))
+    return ordered[k]
+
+
+def measure(name, fn, repeat=3, work=None, unit="items", setup=None):
+    """
+    Times `fn` `repeat` times, then runs it once more under tracemalloc for
+    peak memory (kept separate because tracing distorts timings).
+    `work` is the amount of input processed per call, for throughput.
+    """
+    latencies = []
+    for _ in range(repeat):
+        if setup:
+            setup()
+        start = time.perf_counter()
+        fn()
+        latencies.append(time.perf_counter() - start)
+
+    if setup:
+        setup()
+    tracemalloc.start()
+    fn()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    p50 = percentile(latencies, 50)
+    result = {
+        "stage": name,
+        "runs": repeat,
+        "p50_s": round(p50, 4),
+        "p90_s": round(percentile(latencies, 90), 4),
+        "p99_s": round(percentile(latencies, 99), 4),
+        "max_s": round(max(latencies), 4),
+        "peak_mem_mb": round(peak / (1024 * 1024), 2),
+    }
+    if work:
+        result["throughput"] = round(work / p50, 1) if p50 else None
+        result["unit"] = f"{unit}/s"
+    print(f"  {name:<42} p50={result['p50_s']:>8.3f}s p90={result['p90_s']:>8.3f}s "
+          f"peak={result['peak_mem_mb']:>8.2f}MB"
+          + (f"  {result['throughput']} {result['unit']}" if work else ""))
+    return result
+
+
+def run_benchmarks(args):
+    workspace = tempfile.mkdtemp(prefix="ontology-bench-")
+    server, base_url = start_mock_server(
+        latency=args.latency, jitter=args.latency / 4, tokens_per_second=args.tokens_per_second,
+        error_rate=args.error_rate, rate_limit_rate=args.rate_limit_rate, seed=0)
+
+    # Must be set before the pipeline modules create their client and caches
+    os.environ["OPENAI_BASE_URL"] = base_url
+    os.environ["OPENAI_API_KEY"] = "mock-key"
+    os.environ["LLM_CACHE_DIR"] = os.path.join(workspace, "llm_cache")
+    os.environ["PAGE_CACHE_DIR"] = os.path.join(workspace, "page_cache")
+    os.chdir(workspace)
+
+    from parse_manual import extract_text_from_pdf
+    from chunking import chunk_text_by_tokens
+    from generate_ontology import chunk_text, merge_partial_json
+    from visualize_ontology import visualize_ontology
+    from pipeline import process_pdf_to_ontology_and_visualize
+
+    scale = 0.2 if args.quick else 1.0
+    synthetic_pdf = write_synthetic_pdf(os.path.join(workspace, "synthetic_manual.pdf"),
+                                        pages=max(5, int(200 * scale)))
+    pdfs = [p for p in BUNDLED_PDFS if os.path.exists(p)] + [synthetic_pdf]
+    results = []
+
+    print("[BENCH] extract_text_from_pdf")
+    texts = {}
+    for pdf in pdfs:
+        texts[pdf] = extract_text_from_pdf(pdf, use_cache=False)
+        from PyPDF2 import PdfReader
+        with open(pdf, "rb") as f:
+            num_pages = len(PdfReader(f).pages)
+        results.append(measure(f"extract_text_from_pdf[{os.path.basename(pdf)}]",
+                               lambda pdf=pdf: extract_text_from_pdf(pdf, use_cache=False),
+                               args.repeat, num_pages, "pages"))
+
+    print("[BENCH] chunking")
+    corpus = "\n".join(texts.values()) * max(1, int(10 * scale))
+    mb = len(corpus) / 1e6
+    results.append(measure("chunk_text", lambda: chunk_text(corpus), args.repeat, mb, "MB"))
+    results.append(measure("chunk_text_by_tokens", lambda: chunk_text_by_tokens(corpus), args.repeat, mb, "MB"))
+
+    print("[BENCH] merge_partial_json")
+    partials = synthetic_partials(max(10, int(1000 * scale)))
+    items = sum(len(p["entities"]) + len(p["relationships"]) for p in partials)
+    results.append(measure("merge_partial_json", lambda: merge_partial_json(partials),
+                           args.repeat, items, "items"))
+
+    print("[BENCH] visualize_ontology")
+    ttl = write_synthetic_ttl(os.path.join(workspace, "synthetic.ttl"), max(100, int(5000 * scale)))
+    results.append(measure("visualize_ontology", lambda: visualize_ontology(ttl, os.path.join(workspace, "out.dot")),
+                           args.repeat))
+
+    print(f"[BENCH] full pipeline against mock LLM at {base_url}")
+
+    def fresh_state():
+        for d in ("data", "ontologies", os.environ["LLM_CACHE_DIR"], os.environ["PAGE_CACHE_DIR"]):
+            shutil.rmtree(d, ignore_errors=True)
+
+    for pdf in ([synthetic_pdf] if args.quick else pdfs):
+        base = os.path.splitext(os.path.basename(pdf))[0]
+        requests_before = server.RequestHandlerClass.config.requests
+        results.append(measure(
+            f"pipeline[{base}]",
+            lambda pdf=pdf, base=base: process_pdf_to_ontology_and_visualize(
+                pdf, f"ontologies/{base}.ttl", f"ontologies/graphs/{base}.dot", use_chunks=True),
+            args.repeat, setup=fresh_state))
+        results[-1]["llm_requests_per_run"] = round(
+            (server.RequestHandlerClass.config.requests - requests_before) / (args.repeat + 1), 1)
+
+    server.shutdown()
+    shutil.rmtree(workspace, ignore_errors=True)
+    return {
+        "python": sys.version.split()[0],
+        "mock": {"latency": args.latency, "tokens_per_second": args.tokens_per_second,
+                 "error_rate": args.error_rate, "rate_limit_rate": args.rate_limit_rate},
+        "results": results,
+    }
+
+
+def compare_to_baseline(report, baseline_path, tolerance):
+    """
+    Prints stages whose p50 grew by more than `tolerance` (fraction) versus
+    the baseline report. Returns the number of regressions.
+    """
+    with open(baseline_path, "r", encoding="utf-8") as f:
+        baseline = {r["stage"]: r for r in json.load(f)["results"]}
+    regressions = 0
+    for r in report["results"]:
+        old = baseline.get(r["stage"])
+        if not old or not old["p50_s"]:
+            continue
+        change = (r["p50_s"] - old["p50_s"]) / old["p50_s"]
+        flag = "REGRESSION" if change > tolerance else "ok"
+        regressions += change > tolerance
+        print(f"  {flag:<10} {r['stage']:<42} {old['p50_s']:.3f}s -> {r['p50_s']:.3f}s ({change:+.0%})")
+    return regressions
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Offline pipeline benchmarks (no API spend)")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--quick", action="store_true", help="smaller inputs for a fast smoke run")
+    parser.add_argument("--latency", type=float, default=0.2, help="mock time-to-first-token (s)")
+    parser.add_argument("--tokens-per-second", type=float, default=500.0, help="mock generation speed")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="fraction of mock 500s")
+    parser.add_argument("--rate-limit-rate", type=float, default=0.0, help="fraction of mock 429s")
+    parser.add_argument("--output", help="write the JSON report here")
+    parser.add_argument("--baseline", help="compare against a previous JSON report")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="allowed p50 slowdown vs baseline")
+    args = parser.parse_args()
+
+    # Resolve output paths before run_benchmarks switches to its workspace
+    output = os.path.abspath(args.output) if args.output else None
+    baseline = os.path.abspath(args.baseline) if args.baseline else None
+
+    report = run_benchmarks(args)
+    if output:
+        with open(output, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+        print(f"[INFO] Wrote benchmark report to {output}")
+    if baseline:
+        sys.exit(1 if compare_to_baseline(report, baseline, args.tolerance) else 0)
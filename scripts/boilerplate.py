@@ -0,0 +1,168 @@
+# scripts/boilerplate.py
+import os
+import re
+import bisect
+import hashlib
+from collections import Counter
+from typing import Dict, List, Optional, Sequence, Tuple
+
+from chunking import split_into_blocks
+from minhash import MinHasher, LSHIndex, word_shingles, normalize_text, jaccard
+from metrics import metrics
+
+#########################################
+#  Boilerplate and near-duplicate filtering
+#########################################
+# Runs on the extracted pages before chunking, so repeated material is never
+# sent to the LLM (and never produces duplicate entities for the merge):
+#   1. lines that recur on many pages -- running headers/footers, page
+#      numbers, distribution statements -- are removed; digits are masked
+#      when comparing, so "Page 12" and "Page 13" count as the same line
+#   2. paragraph blocks that are exact or MinHash near-duplicates of an
+#      earlier block (repeated warnings, tables copied between chapters) are
+#      dropped; the report records which page each copy pointed back to
+# The cleaned text keeps page offsets, so any position in it maps back to
+# the page it came from.
+
+BOILERPLATE_FILTER = os.getenv("BOILERPLATE_FILTER", "1").lower() in ("1", "true", "yes")
+# A line is boilerplate when it recurs on at least this many pages...
+BOILERPLATE_MIN_PAGES = int(os.getenv("BOILERPLATE_MIN_PAGES", "3"))
+# ...and on at least this fraction of all pages
+BOILERPLATE_MIN_FRACTION = float(os.getenv("BOILERPLATE_MIN_FRACTION", "0.1"))
+# Jaccard similarity (word 3-grams) above which a block is a near-duplicate
+DUPLICATE_THRESHOLD = float(os.getenv("DUPLICATE_THRESHOLD", "0.8"))
+# Blocks shorter than this are kept as is: too short to call duplicates
+MIN_BLOCK_WORDS = 12
+
+_DIGITS_RE = re.compile(r"\d+")
+
+Page = Tuple[Optional[int], str]
+
+
+def line_key(line: str) -> str:
+    return _DIGITS_RE.sub("#", " ".join(line.lower().split()))
+
+
+def find_recurring_lines(pages: Sequence[Page], min_pages: int = None,
+                         min_fraction: float = None) -> Dict[str, int]:
+    """
+    Normalized line -> number of pages it appears on, for the lines that
+    recur often enough to be boilerplate. Needs at least `min_pages` pages.
+    """
+    min_pages = BOILERPLATE_MIN_PAGES if min_pages is None else min_pages
+    min_fraction = BOILERPLATE_MIN_FRACTION if min_fraction is None else min_fraction
+    if len(pages) < min_pages:
+        return {}
+    counts = Counter()
+    for _, text in pages:
+        counts.update({line_key(line) for line in text.splitlines() if line.strip()})
+    needed = max(min_pages, min_fraction * len(pages))
+    return {key: n for key, n in counts.items() if n >= needed and key.strip("# ")}
+
+
+class CleanedDocument:
+    """
+    Result of clean_pages: the filtered `pages`, their concatenation `text`
+    and a `report` of what was removed. page_at(offset) maps a character
+    offset in `text` back to its source page.
+    """
+
+    def __init__(self, pages: List[Page], report: Dict):
+        self.pages = pages
+        self.report = report
+        self.page_offsets: List[int] = []
+        parts, offset = [], 0
+        for _, text in pages:
+            self.page_offsets.append(offset)
+            parts.append(text)
+            offset += len(text) + 1
+        self.text = "\n".join(parts)
+
+    def page_at(self, offset: int) -> Optional[int]:
+        if not self.pages:
+            return None
+        i = bisect.bisect_right(self.page_offsets, offset) - 1
+        return self.pages[max(0, i)][0]
+
+
+def clean_pages(pages: Sequence[Page], threshold: float = DUPLICATE_THRESHOLD,
+                num_perm: int = 32, bands: int = 8) -> CleanedDocument:
+    """
+    Strips recurring lines, then drops blocks that duplicate an earlier
+    block (exact match on normalized text, or MinHash/LSH candidates whose
+    shingle Jaccard reaches `threshold`). First occurrences are kept, so the
+    document still reads in order. Pages left empty are dropped.
+    """
+    with metrics.span("boilerplate"):
+        recurring = find_recurring_lines(pages)
+        hasher = MinHasher(num_perm=num_perm)
+        lsh = LSHIndex(num_perm=num_perm, bands=bands)
+        exact: Dict[str, Optional[int]] = {}
+        shingles_of: Dict[int, set] = {}
+        page_of: Dict[int, Optional[int]] = {}
+        removed_lines = Counter()
+        duplicates = []
+        chars_in = chars_out = 0
+
+        cleaned: List[Page] = []
+        block_id = 0
+        for page_number, text in pages:
+            chars_in += len(text)
+            lines = []
+            for line in text.splitlines():
+                key = line_key(line)
+                if key in recurring:
+                    removed_lines[key] += 1
+                else:
+                    lines.append(line)
+
+            kept_blocks = []
+            for block, _ in split_into_blocks("\n".join(lines)):
+                norm = normalize_text(block)
+                if len(norm.split()) < MIN_BLOCK_WORDS:
+                    kept_blocks.append(block)
+                    continue
+                digest = hashlib.sha1(norm.encode("utf-8")).hexdigest()
+                if digest in exact:
+                    duplicates.append({"page": page_number, "duplicate_of_page": exact[digest],
+                                       "chars": len(block), "similarity": 1.0})
+                    continue
+                shingles = word_shingles(norm, 3)
+                signature = hasher.signature(shingles)
+                best, best_sim = None, 0.0
+                for other in lsh.query(signature):
+                    sim = jaccard(shingles, shingles_of[other])
+                    if sim > best_sim:
+                        best, best_sim = other, sim
+                if best is not None and best_sim >= threshold:
+                    duplicates.append({"page": page_number, "duplicate_of_page": page_of[best],
+                                       "chars": len(block), "similarity": round(best_sim, 3)})
+                    continue
+                exact[digest] = page_number
+                shingles_of[block_id] = shingles
+                page_of[block_id] = page_number
+                lsh.add(block_id, signature)
+                block_id += 1
+                kept_blocks.append(block)
+
+            page_text = "\n\n".join(kept_blocks)
+            if page_text.strip():
+                cleaned.append((page_number, page_text))
+                chars_out += sum(len(block) for block in kept_blocks)
+
+    report = {
+        "pages_in": len(pages),
+        "pages_out": len(cleaned),
+        "chars_in": chars_in,
+        "chars_out": chars_out,
+        "recurring_lines": [{"line": key, "pages": n} for key, n in
+                            sorted(recurring.items(), key=lambda item: -item[1])],
+        "lines_removed": sum(removed_lines.values()),
+        "duplicate_blocks": duplicates,
+    }
+    metrics.incr("boilerplate_lines_removed", report["lines_removed"])
+    metrics.incr("duplicate_blocks_removed", len(duplicates))
+    metrics.incr("boilerplate_chars_removed", max(0, chars_in - chars_out))
+    print(f"[INFO] Boilerplate filter: {len(recurring)} recurring lines ({report['lines_removed']} removed), "
+          f"{len(duplicates)} duplicate blocks dropped; {chars_out}/{chars_in} chars kept")
+    return CleanedDocument(cleaned, report)
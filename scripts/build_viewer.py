@@ -0,0 +1,255 @@
+# scripts/build_viewer.py
+import os
+import re
+import json
+import shutil
+import argparse
+from collections import defaultdict
+
+
+from metrics import metrics
+from graph_cache import load_triples
+from visualize_ontology import GraphIndex
+
+#########################################
+#  Lazy-loading ontology viewer
+#########################################
+# A single DOT/SVG of a 100k-node ontology is unusable, so the viewer is a
+# static site that never holds more than what is on screen:
+#
+#   manifest.json            counts, shard size, the root nodes
+#   nodes/<n>.json           node records for ids [n*SHARD, (n+1)*SHARD)
+#   children/<id>-<p>.json   page p of a node's children (only for wide nodes)
+#   edges/<n>.json           object-property neighborhoods, same sharding
+#   search/<xx>.json         [label, id] pairs by the label's first two chars
+#
+# Ids follow a depth-first walk of the class hierarchy, so a subtree lives in
+# one or a few consecutive shards and expanding it costs one or two fetches.
+# Serve the output directory over HTTP (e.g. `python -m http.server` inside
+# it); browsers refuse XHR on file:// URLs.
+
+VIEWER_DIR = os.getenv("VIEWER_DIR", "ontologies/viewer")
+SHARD_SIZE = int(os.getenv("VIEWER_SHARD_SIZE", "1000"))
+# Children listed inline in a node record; the rest go to paged files
+CHILD_PAGE_SIZE = int(os.getenv("VIEWER_CHILD_PAGE", "500"))
+# Neighbors kept per node in the edge shards
+NEIGHBOR_LIMIT = int(os.getenv("VIEWER_NEIGHBOR_LIMIT", "200"))
+COMMENT_CHARS = 500
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+ASSETS = {"js/tree.js": "tree.js", "css/default.css": "default.css"}
+
+_NON_ALNUM_RE = re.compile(r"[^0-9a-z]")
+
+INDEX_HTML = """<!DOCTYPE html>
+<html>
+<head>
+<meta charset="utf-8">
+<title>{title}</title>
+<link rel="stylesheet" type="text/css" href="default.css">
+<script type="text/javascript" src="tree.js"></script>
+</head>
+<body onload="initViewer('.')">
+<h1>{title}</h1>
+<div id="queryform">
+<input type="text" id="search" size="40" placeholder="Find a class or individual" onkeyup="searchLabels(this.value)">
+<span id="counts"></span>
+</div>
+<ul id="search-results" class="minihierarchy"></ul>
+<table width="100%"><tr>
+<td valign="top" width="45%"><h2>Hierarchy</h2><ul id="tree" class="minihierarchy"></ul></td>
+<td valign="top"><div id="details" class="codebox">Select a node.</div></td>
+</tr></table>
+<p class="footer">Generated by build_viewer.py</p>
+</body>
+</html>
+"""
+
+
+def _search_key(label):
+    key = _NON_ALNUM_RE.sub("", label.lower())[:2]
+    return key.ljust(2, "_") if key else "__"
+
+
+def _write_json(path, data):
+    # json.dumps uses the C encoder; json.dump to a file does not
+    text = json.dumps(data, ensure_ascii=False, separators=(",", ":"))
+    with open(path, "w", encoding="utf-8") as f:
+        return f.write(text)
+
+
+def build_hierarchy(index):
+    """
+    Returns (order, roots, parents, children, kind): `order` lists every node
+    in depth-first preorder from the roots, parents/children map node -> list
+    of nodes, kind is "class" or "individual". Individuals hang under their
+    classes; untyped ones and classes without a superclass are roots.
+    """
+    classes = set(index.classes)
+    parents = defaultdict(list)
+    children = defaultdict(list)
+
+    def link(child, parent):
+        if parent not in parents[child]:
+            parents[child].append(parent)
+            children[parent].append(child)
+
+    for subclass, superclass in index.subclass_of:
+        if subclass in classes or superclass in classes:
+            classes.update((subclass, superclass))
+            link(subclass, superclass)
+
+    individuals = [s for s in index.types if s not in classes and index.is_individual(s)]
+    for ind in individuals:
+        for cls in index.types[ind]:
+            if cls in classes:
+                link(ind, cls)
+
+    kind = {c: "class" for c in classes}
+    kind.update((i, "individual") for i in individuals)
+
+    def sort_key(node):
+        return (kind[node] != "class", index.label(node).lower())
+
+    for node in children:
+        children[node].sort(key=sort_key)
+    roots = sorted((n for n in kind if not parents.get(n)), key=sort_key)
+
+    # Iterative DFS: hierarchies can be deeper than the recursion limit
+    order, seen = [], set()
+    for root in roots:
+        stack = [root]
+        while stack:
+            node = stack.pop()
+            if node in seen:
+                continue
+            seen.add(node)
+            order.append(node)
+            stack.extend(reversed(children.get(node, ())))
+    # Nodes only reachable through a cycle
+    order.extend(sorted((n for n in kind if n not in seen), key=sort_key))
+    return order, roots, parents, children, kind
+
+
+def build_neighbors(index, ids):
+    """
+    node id -> [[property label, other id, "out" | "in"], ...]: class-level
+    domain/range and restriction links and instance-level object property
+    links.
+    """
+    neighbors = defaultdict(list)
+    seen = set()
+
+    def link(src, prop, dst):
+        if src in ids and dst in ids and (src, prop, dst) not in seen:
+            seen.add((src, prop, dst))
+            label = index.label(prop)
+            neighbors[ids[src]].append([label, ids[dst], "out"])
+            neighbors[ids[dst]].append([label, ids[src], "in"])
+
+    for prop in index.object_properties:
+        for domain in index.domains.get(prop, ()):
+            for rng in index.ranges.get(prop, ()):
+                link(domain, prop, rng)
+    for cls, prop, target, _ in index.restrictions:
+        if prop in index.object_properties:
+            link(cls, prop, target)
+    for s, pairs in index.outgoing.items():
+        for p, o in pairs:
+            if p in index.object_properties:
+                link(s, p, o)
+    return neighbors
+
+
+def build_viewer(turtle_file, out_dir=None, use_cache=True, title=None):
+    """
+    Writes the sharded viewer for `turtle_file` to `out_dir` (default
+    ontologies/viewer/<file name>) and returns the path of its index.html.
+    """
+    name = os.path.splitext(os.path.basename(turtle_file))[0]
+    out_dir = out_dir or os.path.join(VIEWER_DIR, name)
+    title = title or f"{name} ontology"
+
+    with metrics.span("viewer_parse"):
+        index = GraphIndex(load_triples(turtle_file, format="ttl", use_cache=use_cache))
+
+    with metrics.span("viewer_build"):
+        order, roots, parents, children, kind = build_hierarchy(index)
+        ids = {node: i for i, node in enumerate(order)}
+        neighbors = build_neighbors(index, ids)
+
+    def child_entry(node):
+        return [ids[node], index.label(node), kind[node], len(children.get(node, ()))]
+
+    if os.path.isdir(out_dir):
+        for sub in ("nodes", "children", "edges", "search"):
+            shutil.rmtree(os.path.join(out_dir, sub), ignore_errors=True)
+    for sub in ("nodes", "children", "edges", "search"):
+        os.makedirs(os.path.join(out_dir, sub), exist_ok=True)
+
+    written = 0
+    with metrics.span("viewer_write"):
+        search = defaultdict(list)
+        for start in range(0, len(order), SHARD_SIZE):
+            shard, edge_shard = {}, {}
+            for node in order[start:start + SHARD_SIZE]:
+                node_id = ids[node]
+                kids = children.get(node, ())
+                record = {
+                    "label": index.label(node),
+                    "kind": kind[node],
+                    "iri": str(node),
+                    "comment": index.comment(node)[:COMMENT_CHARS],
+                    "parents": [[ids[p], index.label(p)] for p in parents.get(node, ())],
+                    "children": [child_entry(c) for c in kids[:CHILD_PAGE_SIZE]],
+                    "child_count": len(kids),
+                }
+                for page, offset in enumerate(range(CHILD_PAGE_SIZE, len(kids), CHILD_PAGE_SIZE), 1):
+                    written += _write_json(
+                        os.path.join(out_dir, "children", f"{node_id}-{page}.json"),
+                        [child_entry(c) for c in kids[offset:offset + CHILD_PAGE_SIZE]])
+                shard[node_id] = record
+                if node_id in neighbors:
+                    near = neighbors[node_id]
+                    edge_shard[node_id] = {"total": len(near), "edges": near[:NEIGHBOR_LIMIT]}
+                search[_search_key(record["label"])].append([record["label"], node_id])
+
+            number = start // SHARD_SIZE
+            written += _write_json(os.path.join(out_dir, "nodes", f"{number}.json"), shard)
+            written += _write_json(os.path.join(out_dir, "edges", f"{number}.json"), edge_shard)
+
+        for key, entries in search.items():
+            entries.sort(key=lambda e: e[0].lower())
+            written += _write_json(os.path.join(out_dir, "search", f"{key}.json"), entries)
+
+        manifest = {
+            "title": title,
+            "source": os.path.abspath(turtle_file),
+            "shard_size": SHARD_SIZE,
+            "child_page_size": CHILD_PAGE_SIZE,
+            "classes": sum(1 for k in kind.values() if k == "class"),
+            "individuals": sum(1 for k in kind.values() if k == "individual"),
+            "roots": [child_entry(r) for r in roots],
+        }
+        written += _write_json(os.path.join(out_dir, "manifest.json"), manifest)
+
+        for src, dst in ASSETS.items():
+            shutil.copyfile(os.path.join(REPO_ROOT, src), os.path.join(out_dir, dst))
+        index_path = os.path.join(out_dir, "index.html")
+        with open(index_path, "w", encoding="utf-8") as f:
+            written += f.write(INDEX_HTML.format(title=title))
+
+    metrics.incr("bytes_written", written, artifact="viewer")
+    print(f"[INFO] Viewer for {manifest['classes']} classes / {manifest['individuals']} individuals "
+          f"written to: {out_dir}")
+    return index_path
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Build the lazy-loading HTML viewer for a TTL file")
+    parser.add_argument("turtle_file")
+    parser.add_argument("--out-dir", default=None, help="Output directory (default ontologies/viewer/<name>)")
+    parser.add_argument("--title", default=None)
+    parser.add_argument("--no-cache", action="store_true", help="Parse the TTL even if a cached parse exists")
+    args = parser.parse_args()
+    build_viewer(args.turtle_file, args.out_dir, use_cache=not args.no_cache, title=args.title)
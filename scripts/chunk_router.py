@@ -0,0 +1,222 @@
+# scripts/chunk_router.py
+import os
+import re
+import json
+import time
+import hashlib
+import threading
+from collections import Counter, deque
+from typing import Callable, Dict, Optional, Tuple
+
+from chunking import count_tokens
+from metrics import metrics
+
+#########################################
+#  Chunk routing
+#########################################
+# Decides, per chunk and before any request is sent, how much model a chunk
+# is worth:
+#   - "full":  the extraction model (dense spec sections, definitions)
+#   - "cheap": a smaller, faster model (checklists, warnings, thin prose)
+#   - "skip":  no request at all (pages with nothing to extract)
+# The decision uses only local signals:
+#   1. a heuristic estimate of extractable items per 1k tokens: distinct
+#      names / acronyms / designations, labelled line items of checklists
+#      and parts lists ("22. Shoe assemblies. Check for ..."), quantities
+#      with units and definitional phrases, discounted for warning and
+#      table-of-contents lines
+#   2. what earlier runs actually got out of chunks (the routing log): the
+#      estimate is rescaled by the observed/estimated ratio of full-model
+#      extractions, and a chunk whose exact text was extracted before by the
+#      full model is predicted from that measurement instead
+#   3. the LLM cache: a chunk whose full-model reply is already cached is
+#      free, so it always goes to the full model
+# Every decision and its outcome is appended to ROUTER_LOG (JSON lines), so
+# the thresholds can be tuned against real yields. Routing is opt-in, and
+# even then nothing is skipped unless ROUTER_SKIP_BELOW is raised above 0:
+# a low score only sends the chunk to the cheap model.
+
+CHUNK_ROUTING = os.getenv("CHUNK_ROUTING", "0").lower() in ("1", "true", "yes")
+EXTRACTION_CHEAP_MODEL = os.getenv("EXTRACTION_CHEAP_MODEL", "gpt-4o-mini-2024-07-18")
+# Predicted items per 1k tokens below which a chunk is skipped...
+ROUTER_SKIP_BELOW = float(os.getenv("ROUTER_SKIP_BELOW", "0"))
+# ...or sent to the cheap model
+ROUTER_CHEAP_BELOW = float(os.getenv("ROUTER_CHEAP_BELOW", "20"))
+ROUTER_LOG = os.getenv("ROUTER_LOG", "data/chunk_routing.jsonl")
+# Most recent log entries used for calibration
+ROUTER_HISTORY = int(os.getenv("ROUTER_HISTORY", "5000"))
+# Full-model outcomes needed before the estimate is rescaled
+ROUTER_MIN_HISTORY = 5
+
+ROUTES = ("full", "cheap", "skip")
+
+# Multi-word capitalized names, acronyms and designations (M1A1, T-80)
+_TERM_RE = re.compile(r"\b(?:[A-Z][a-z0-9]+(?:[ -][A-Z][A-Za-z0-9]+)+|[A-Z]{2,}[0-9A-Z-]*|[A-Z]+-?\d+[A-Z0-9-]*)\b")
+_QUANTITY_RE = re.compile(
+    r"\b\d+(?:[.,]\d+)?\s?(?:mm|cm|km|m|in|ft|lbs?|kg|tons?|hp|kw|rpm|psi|kpa|mph|km/h|gal|l|v|amps?|°[cf]|%)(?!\w)",
+    re.IGNORECASE)
+_CUE_RE = re.compile(
+    r"\b(?:is an?|consists? of|comprises?|composed of|(?:type|kind|part) of|equipped with|"
+    r"mounted (?:on|in)|connected to|known as|defined as|used (?:to|for))\b",
+    re.IGNORECASE)
+# Lowercase component names are only recognizable by layout: the label that
+# opens a (numbered) line and is closed by leader dots, a period or a colon
+_LINE_ITEM_RE = re.compile(r"^\s*(?:\d+[.)]\s*)?([A-Za-z][A-Za-z/-]+(?:\s+[A-Za-z][A-Za-z/-]*){0,3}?)\s*(?:\.{2,}|\.\s|:)")
+# Lines that rarely hold anything for the ontology
+_NOISE_LINE_RE = re.compile(r"^\s*(?:WARNING|CAUTION|NOTE|DANGER)\b|\.{3,}\s*\d+\s*$", re.IGNORECASE)
+
+
+def text_id(chunk: str) -> str:
+    """
+    Identity of a chunk's text alone (unlike chunk_fingerprint, independent
+    of model and prompt), so yields carry over prompt changes.
+    """
+    return hashlib.sha1(" ".join(chunk.split()).encode("utf-8")).hexdigest()
+
+
+def score_chunk(chunk: str, tokens: int) -> Tuple[float, Dict]:
+    """
+    Estimated extractable items per 1k tokens, and the features behind it.
+    """
+    terms = set(_TERM_RE.findall(chunk))
+    quantities = len(_QUANTITY_RE.findall(chunk))
+    cues = len(_CUE_RE.findall(chunk))
+    lines = [line for line in chunk.splitlines() if line.strip()]
+    items = set()
+    for line in lines:
+        match = _LINE_ITEM_RE.match(line)
+        if match:
+            items.add(" ".join(match.group(1).lower().split()))
+    items -= {term.lower() for term in terms}
+    noise = sum(1 for line in lines if _NOISE_LINE_RE.search(line)) / len(lines) if lines else 1.0
+    raw = len(terms) + len(items) + 0.5 * quantities + 2 * cues
+    score = raw / max(tokens, 1) * 1000 * (1 - 0.5 * noise)
+    features = {"terms": len(terms), "line_items": len(items), "quantities": quantities,
+                "cues": cues, "noise": round(noise, 3)}
+    return round(score, 2), features
+
+
+class RouteDecision:
+    """
+    Where one chunk goes: `route` is one of ROUTES, `model` is None for
+    skipped chunks.
+    """
+
+    def __init__(self, route: str, model: Optional[str], reason: str, score: float,
+                 predicted: float, tokens: int, text_id: str, features: Dict):
+        self.route = route
+        self.model = model
+        self.reason = reason
+        self.score = score
+        self.predicted = predicted
+        self.tokens = tokens
+        self.text_id = text_id
+        self.features = features
+
+
+class ChunkRouter:
+    """
+    Routes chunks (route) and records what each routed chunk yielded
+    (record). `prefix_tokens` is the size of the static instructions sent
+    with every chunk; `cached(chunk)` tells whether the full model's reply
+    for the chunk is already in the LLM cache. Thread-safe.
+    """
+
+    def __init__(self, full_model: str, cheap_model: str = None, prefix_tokens: int = 0,
+                 cached: Callable[[str], bool] = None, log_path: str = None,
+                 skip_below: float = None, cheap_below: float = None):
+        self.full_model = full_model
+        self.cheap_model = cheap_model or EXTRACTION_CHEAP_MODEL
+        self.prefix_tokens = prefix_tokens
+        self.cached = cached
+        self.log_path = ROUTER_LOG if log_path is None else log_path
+        self.skip_below = ROUTER_SKIP_BELOW if skip_below is None else skip_below
+        self.cheap_below = ROUTER_CHEAP_BELOW if cheap_below is None else cheap_below
+        self.counts = Counter()
+        self.tokens_saved = 0
+        self._lock = threading.Lock()
+        self._load_history()
+
+    def _load_history(self):
+        history = deque(maxlen=ROUTER_HISTORY)
+        if self.log_path and os.path.exists(self.log_path):
+            with open(self.log_path, "r", encoding="utf-8") as f:
+                for line in f:
+                    try:
+                        history.append(json.loads(line))
+                    except json.JSONDecodeError:
+                        continue
+        # Only clean full-model outcomes say what a chunk is worth
+        full = [e for e in history if e.get("route") == "full" and not e.get("error")
+                and e.get("tokens") and "items" in e]
+        self.prior_yield = {e["text_id"]: e["items"] / e["tokens"] * 1000 for e in full}
+        estimated = sum(e["score"] for e in full)
+        self.calibration = 1.0
+        if len(full) >= ROUTER_MIN_HISTORY and estimated > 0:
+            observed = sum(e["items"] / e["tokens"] * 1000 for e in full)
+            self.calibration = min(4.0, max(0.25, observed / estimated))
+
+    def route(self, chunk: str) -> RouteDecision:
+        tokens = count_tokens(chunk, self.full_model)
+        score, features = score_chunk(chunk, tokens)
+        tid = text_id(chunk)
+        if tid in self.prior_yield:
+            predicted, basis = self.prior_yield[tid], "measured"
+        else:
+            predicted, basis = score * self.calibration, "estimated"
+        predicted = round(predicted, 2)
+
+        if self.cached is not None and self.cached(chunk):
+            route, reason = "full", "cached"
+        elif predicted < self.skip_below:
+            route, reason = "skip", f"{basis} {predicted} items/1k tokens < {self.skip_below}"
+        elif predicted < self.cheap_below:
+            route, reason = "cheap", f"{basis} {predicted} items/1k tokens < {self.cheap_below}"
+        else:
+            route, reason = "full", f"{basis} {predicted} items/1k tokens"
+        model = {"full": self.full_model, "cheap": self.cheap_model}.get(route)
+        return RouteDecision(route, model, reason, score, predicted, tokens, tid, features)
+
+    def record(self, decision: RouteDecision, partial: Dict):
+        """
+        Counts the decision and appends it, with the items `partial` yielded,
+        to the routing log. Extraction-model prompt tokens avoided by skipped
+        and cheap chunks are reported as saved.
+        """
+        prompt_tokens = self.prefix_tokens + decision.tokens
+        saved = 0 if decision.route == "full" else prompt_tokens
+        entry = {
+            "time": round(time.time(), 3),
+            "text_id": decision.text_id,
+            "tokens": decision.tokens,
+            "score": decision.score,
+            "predicted": decision.predicted,
+            "features": decision.features,
+            "route": decision.route,
+            "model": decision.model,
+            "reason": decision.reason,
+            "tokens_saved": saved,
+        }
+        if decision.route != "skip":
+            entities = len(partial.get("entities", []))
+            relationships = len(partial.get("relationships", []))
+            entry.update(entities=entities, relationships=relationships,
+                         items=entities + relationships, error="error" in partial)
+
+        metrics.incr("router_chunks", route=decision.route)
+        metrics.incr("router_prompt_tokens", prompt_tokens, route=decision.route)
+        metrics.incr("router_tokens_saved", saved)
+        with self._lock:
+            self.counts[decision.route] += 1
+            self.tokens_saved += saved
+            if self.log_path:
+                os.makedirs(os.path.dirname(os.path.abspath(self.log_path)), exist_ok=True)
+                with open(self.log_path, "a", encoding="utf-8") as f:
+                    f.write(json.dumps(entry) + "\n")
+
+    def report(self):
+        if not sum(self.counts.values()):
+            return
+        print(f"[INFO] Chunk router: {self.counts['full']} full, {self.counts['cheap']} cheap "
+              f"({self.cheap_model}), {self.counts['skip']} skipped; "
+              f"~{self.tokens_saved} extraction-model prompt tokens avoided")
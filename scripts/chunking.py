@@ -0,0 +1,193 @@
+# scripts/chunking.py
+import os
+import re
+from functools import lru_cache
+from typing import List, Tuple
+
+try:
+    import tiktoken
+except ImportError:  # optional: fall back to a character heuristic
+    tiktoken = None
+
+#########################################
+#  Token counting
+#########################################
+CHUNK_TOKEN_BUDGET = int(os.getenv("CHUNK_TOKEN_BUDGET", "12000"))
+CHUNK_OVERLAP_TOKENS = int(os.getenv("CHUNK_OVERLAP_TOKENS", "150"))
+
+
+@lru_cache(maxsize=None)
+def _warn_no_tiktoken():
+    print("[INFO] tiktoken is not installed; token counts are approximated as "
+          "characters / 4 (pip install -r requirements.txt)")
+
+
+@lru_cache(maxsize=None)
+def _encoding_for(model: str):
+    if tiktoken is None:
+        _warn_no_tiktoken()
+        return None
+    try:
+        return tiktoken.encoding_for_model(model)
+    except KeyError:
+        return tiktoken.get_encoding("o200k_base")
+
+
+def count_tokens(text: str, model: str = "o3-mini") -> int:
+    """
+    Token count of `text` for `model`. Uses tiktoken when installed and
+    otherwise approximates with ~4 characters per token.
+    """
+    enc = _encoding_for(model)
+    if enc is None:
+        return len(text) // 4 + 1
+    return len(enc.encode(text, disallowed_special=()))
+
+
+#########################################
+#  Structure detection
+#########################################
+# Headings as they come out of PyPDF2 for technical manuals:
+#   "3-2. ENGINE COMPARTMENT", "4.1.2 Hydraulic System", "CHAPTER 5", "APPENDIX B"
+HEADING_RE = re.compile(
+    r"^(?:"
+    r"(?:CHAPTER|SECTION|APPENDIX|PART|ANNEX)\b.*"
+    r"|\d+(?:[.-]\d+)*\.?\s+[A-Z][^.!?]{0,80}"
+    r")$"
+)
+SENTENCE_END_RE = re.compile(r"(?<=[.!?])\s+(?=[A-Z0-9(\"'])")
+
+
+def is_heading(line: str) -> bool:
+    line = line.strip()
+    if not line or len(line) > 90:
+        return False
+    if HEADING_RE.match(line):
+        return True
+    # Short all-caps lines ("WARNING" excluded by the length floor on letters)
+    letters = [c for c in line if c.isalpha()]
+    return len(letters) >= 8 and all(c.isupper() for c in letters)
+
+
+def split_into_blocks(document: str) -> List[Tuple[str, bool]]:
+    """
+    Splits text into paragraph-level blocks in a single pass over its lines.
+    Returns (block_text, starts_section) pairs; a block starts a section when
+    its first line is a detected heading. Blank lines end a paragraph too.
+    """
+    blocks = []
+    current: List[str] = []
+    current_is_section = False
+
+    def flush():
+        if current:
+            blocks.append(("\n".join(current), current_is_section))
+
+    for line in document.splitlines():
+        if not line.strip():
+            flush()
+            current, current_is_section = [], False
+        elif is_heading(line):
+            flush()
+            current, current_is_section = [line], True
+        else:
+            current.append(line)
+    flush()
+    return blocks
+
+
+def _split_oversized(text: str, max_tokens: int, model: str) -> List[str]:
+    """
+    Breaks a single block that exceeds the budget on sentence boundaries,
+    falling back to a proportional character cut for run-on text (tables).
+    """
+    pieces, current, current_tokens = [], [], 0
+    for sentence in SENTENCE_END_RE.split(text):
+        n = count_tokens(sentence, model)
+        if n > max_tokens:
+            step = max(1, len(sentence) * max_tokens // n)
+            parts = [sentence[i:i + step] for i in range(0, len(sentence), step)]
+        else:
+            parts = [sentence]
+        for part in parts:
+            n = count_tokens(part, model) if len(parts) > 1 else n
+            if current and current_tokens + n > max_tokens:
+                pieces.append(" ".join(current))
+                current, current_tokens = [], 0
+            current.append(part)
+            current_tokens += n
+    if current:
+        pieces.append(" ".join(current))
+    return pieces
+
+
+def _tail_sentences(text: str, max_tokens: int, model: str) -> str:
+    """
+    The trailing whole sentences of `text` that fit in `max_tokens`.
+    """
+    if max_tokens <= 0:
+        return ""
+    tail, used = [], 0
+    for sentence in reversed(SENTENCE_END_RE.split(text[-max_tokens * 8:])):
+        n = count_tokens(sentence, model)
+        if used + n > max_tokens:
+            break
+        tail.append(sentence)
+        used += n
+    return " ".join(reversed(tail))
+
+
+#########################################
+#  Token-budget packing
+#########################################
+def chunk_text_by_tokens(document: str, max_tokens: int = None, overlap_tokens: int = None,
+                         model: str = "o3-mini", min_fill: float = 0.6) -> List[str]:
+    """
+    Packs section/paragraph blocks greedily into chunks of at most
+    `max_tokens` tokens for `model`.
+    - A chunk that is at least `min_fill` full is closed at the next section
+      heading, so sections are not split across chunks when avoidable.
+    - A chunk that continues a section mid-way starts with that section's
+      heading plus the last sentences of the previous chunk (up to
+      `overlap_tokens`); a chunk that starts at a heading gets no overlap.
+    Every block is tokenized once, so the cost is linear in document size.
+    """
+    max_tokens = max_tokens or CHUNK_TOKEN_BUDGET
+    overlap_tokens = CHUNK_OVERLAP_TOKENS if overlap_tokens is None else overlap_tokens
+
+    units = []  # (text, tokens, starts_section)
+    for text, starts_section in split_into_blocks(document):
+        n = count_tokens(text, model)
+        if n <= max_tokens:
+            units.append((text, n, starts_section))
+        else:
+            for j, piece in enumerate(_split_oversized(text, max_tokens, model)):
+                units.append((piece, count_tokens(piece, model), starts_section and j == 0))
+
+    chunks: List[str] = []
+    current: List[str] = []
+    current_tokens = 0
+    heading = ""
+
+    for text, n, starts_section in units:
+        at_boundary = starts_section and current_tokens >= min_fill * max_tokens
+        if current and (current_tokens + n > max_tokens or at_boundary):
+            chunks.append("\n".join(current))
+            current, current_tokens = [], 0
+            if not starts_section:
+                # Mid-section break: carry the heading and a little context
+                context = [heading] if heading else []
+                tail = _tail_sentences(chunks[-1], overlap_tokens, model)
+                if tail and tail != heading:
+                    context.append(tail)
+                context_tokens = count_tokens("\n".join(context), model) if context else 0
+                if context and context_tokens + n <= max_tokens:
+                    current, current_tokens = context, context_tokens
+        if starts_section:
+            heading = text.splitlines()[0]
+        current.append(text)
+        current_tokens += n
+
+    if current:
+        chunks.append("\n".join(current))
+    return chunks
@@ -0,0 +1,207 @@
+# scripts/entity_resolution.py
+import os
+from collections import defaultdict
+from functools import lru_cache
+from typing import Dict, List, Optional, Set
+
+from minhash import (MinHasher, LSHIndex, char_shingles, word_shingles,
+                     normalize_text, jaccard)
+
+#########################################
+#  Entity resolution (merge stage)
+#########################################
+# Off by default: a wrong merge silently loses an entity, a missed one only
+# leaves a duplicate. Enable with ENTITY_RESOLUTION=1 (or resolve_entities=
+# True in generate_ontology_for_document).
+ENTITY_RESOLUTION = os.getenv("ENTITY_RESOLUTION", "0").lower() in ("1", "true", "yes")
+# A pair is merged when its score reaches MATCH_THRESHOLD. Two names only
+# match when every word of each is matched by a word of the other, apart
+# from stop words and designators ("M1", "9-2350"): "Engine Oil" is not
+# "Engine". Words match when equal up to a plural "s", or close in spelling
+# (character-trigram Jaccard); the weakest word match is the name score,
+# blended with description similarity when both sides have one.
+MATCH_THRESHOLD = 0.75
+DESCRIPTION_WEIGHT = 0.2
+# Words that never tell two names apart
+STOP_WORDS = frozenset({"a", "an", "the", "of", "for", "and", "with", "to", "in", "on"})
+# Words that only say what kind of thing a designated item is, so they are
+# ignored when either name carries a designator: "Abrams tank" and
+# "M1 Abrams" are the same vehicle, but "Fuel Tank" is not "Fuel"
+GENERIC_WORDS = frozenset({"tank", "vehicle", "truck", "carrier", "model", "variant", "version"})
+# Tokens shared by more than this many names ("tank", "system") are too
+# common to be used as a blocking key.
+MAX_TOKEN_BLOCK = 50
+
+
+def stem(word: str) -> str:
+    if len(word) > 3 and word.endswith("s") and not word.endswith("ss"):
+        return word[:-1]
+    return word
+
+
+@lru_cache(maxsize=1 << 14)
+def word_similarity(a: str, b: str) -> float:
+    if a == b:
+        return 1.0
+    return jaccard(char_shingles(a), char_shingles(b))
+
+
+class UnionFind:
+    def __init__(self):
+        self.parent: Dict[str, str] = {}
+
+    def find(self, x: str) -> str:
+        parent = self.parent
+        parent.setdefault(x, x)
+        root = x
+        while parent[root] != root:
+            root = parent[root]
+        while parent[x] != root:
+            parent[x], x = root, parent[x]
+        return root
+
+    def union(self, a: str, b: str):
+        ra, rb = self.find(a), self.find(b)
+        if ra != rb:
+            self.parent[rb] = ra
+
+
+class EntityResolver:
+    """
+    Finds entities that refer to the same thing under different names
+    ("M1 Abrams", "Abrams tank", "m1_abrams") without comparing all pairs.
+
+    Candidate pairs come from two blocking indexes:
+      - MinHash LSH over character trigrams of the name (spelling variants)
+      - an inverted index over name tokens, ignoring tokens that occur in
+        more than `max_token_block` names (word-order / extra-word variants)
+    Only candidate pairs are scored, so the cost is near-linear in the number
+    of entities.
+    """
+
+    def __init__(self, threshold: float = MATCH_THRESHOLD,
+                 description_weight: float = DESCRIPTION_WEIGHT,
+                 num_perm: int = 32, bands: int = 8,
+                 max_token_block: int = MAX_TOKEN_BLOCK):
+        self.threshold = threshold
+        self.description_weight = description_weight
+        self.num_perm = num_perm
+        self.bands = bands
+        self.max_token_block = max_token_block
+
+    def score(self, a: Dict, b: Dict) -> float:
+        designated = bool(a["designators"] or b["designators"])
+        core_a = {w for w in a["words"] if not (designated and w in GENERIC_WORDS)}
+        core_b = {w for w in b["words"] if not (designated and w in GENERIC_WORDS)}
+        if not core_a or not core_b:
+            # Only designators left to tell them apart ("M1" vs "M1 tank")
+            same = (not core_a and not core_b and a["designators"]
+                    and a["designators"] == b["designators"])
+            name_sim = 1.0 if same else 0.0
+        else:
+            name_sim = min(max(word_similarity(w, o) for o in other)
+                           for words, other in ((core_a, core_b), (core_b, core_a))
+                           for w in words)
+        if a["desc"] and b["desc"]:
+            w = self.description_weight
+            return (1 - w) * name_sim + w * jaccard(a["desc"], b["desc"])
+        return name_sim
+
+    def resolve(self, entities: Dict[str, Dict], mentions: Optional[Set[str]] = None) -> Dict[str, str]:
+        """
+        `entities` maps normalized name -> entity dict (with 'name', optional
+        'description', 'type' and 'sources'); `mentions` are extra normalized
+        names, e.g. relationship endpoints with no entity of their own.
+        Returns {alias: canonical} for every name that should be folded into
+        another entity; canonical names are always keys of `entities`.
+        """
+        records: Dict[str, Dict] = {}
+        for key, entity in entities.items():
+            records[key] = {
+                "shingles": char_shingles(entity.get("name", key)),
+                "tokens": set(normalize_text(entity.get("name", key)).split()),
+                "desc": word_shingles(entity.get("description") or ""),
+                "type": (entity.get("type") or "").lower(),
+            }
+        for key in (mentions or ()):
+            if key not in records:
+                records[key] = {"shingles": char_shingles(key),
+                                "tokens": set(normalize_text(key).split()),
+                                "desc": set(), "type": ""}
+        for rec in records.values():
+            rec["designators"] = {t for t in rec["tokens"] if any(c.isdigit() for c in t)}
+            rec["words"] = {stem(t) for t in rec["tokens"] - rec["designators"] - STOP_WORDS}
+        if len(records) < 2:
+            return {}
+
+        # Token postings for blocking
+        postings: Dict[str, List[str]] = defaultdict(list)
+        for key, rec in records.items():
+            for tok in rec["tokens"]:
+                postings[tok].append(key)
+
+        hasher = MinHasher(self.num_perm)
+        lsh = LSHIndex(self.num_perm, self.bands)
+        for key, rec in records.items():
+            lsh.add(key, hasher.signature(rec["shingles"]))
+        candidates = lsh.candidate_pairs(self.max_token_block)
+        for keys in postings.values():
+            if 1 < len(keys) <= self.max_token_block:
+                for i in range(len(keys)):
+                    for j in range(i + 1, len(keys)):
+                        a, b = keys[i], keys[j]
+                        candidates.add((a, b) if a < b else (b, a))
+
+        matches = []
+        for a, b in candidates:
+            ra, rb = records[a], records[b]
+            if ra["type"] and rb["type"] and ra["type"] != rb["type"]:
+                continue  # never fold a class into an individual
+            if ra["designators"] and rb["designators"] and ra["designators"] != rb["designators"]:
+                continue  # "M1" vs "M1A1", "TM 9-2350" vs "TM 9-2351": distinct items
+            score = self.score(ra, rb)
+            if score >= self.threshold:
+                matches.append((-score, a, b))
+
+        # A name without designator that matches items with different
+        # designators ("Abrams tank" with "M1 Abrams" and "M1A1 Abrams") is
+        # ambiguous and stays on its own
+        designated: Dict[str, Set[frozenset]] = defaultdict(set)
+        for _, a, b in matches:
+            for x, y in ((a, b), (b, a)):
+                if not records[x]["designators"] and records[y]["designators"]:
+                    designated[x].add(frozenset(records[y]["designators"]))
+        ambiguous = {key for key, found in designated.items() if len(found) > 1}
+        matches = [m for m in matches if m[1] not in ambiguous and m[2] not in ambiguous]
+
+        # Best matches first; a union that would still put two different
+        # designators in one cluster is refused
+        uf = UnionFind()
+        cluster_designators: Dict[str, Set[str]] = {}
+        for _, a, b in sorted(matches):
+            root_a, root_b = uf.find(a), uf.find(b)
+            if root_a == root_b:
+                continue
+            da = cluster_designators.get(root_a, records[root_a]["designators"])
+            db = cluster_designators.get(root_b, records[root_b]["designators"])
+            if da and db and da != db:
+                continue
+            uf.union(a, b)
+            cluster_designators[uf.find(a)] = da or db
+
+        clusters: Dict[str, List[str]] = defaultdict(list)
+        for key in list(uf.parent):
+            clusters[uf.find(key)].append(key)
+
+        alias_map = {}
+        order = {k: i for i, k in enumerate(entities)}
+        for members in clusters.values():
+            real = [m for m in members if m in entities]
+            if not real:
+                continue
+            # Canonical: the best-attested entity, first-seen on ties
+            canonical = max(real, key=lambda m: (len(entities[m].get("sources", ())), -order[m]))
+            for m in members:
+                if m != canonical:
+                    alias_map[m] = canonical
+        return alias_map
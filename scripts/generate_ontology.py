@@ -1,18 +1,169 @@
 import os
+import re
+import gc
 import json
+import time
+import hashlib
+import threading
+from collections import deque, defaultdict
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from functools import lru_cache
+import rdflib
 from dotenv import load_dotenv
-from openai import OpenAI
-from typing import List, Dict
-from validation import clean_and_validate_ttl
+from typing import List, Dict, Callable, Iterable, Set
+from validation import clean_and_validate_ttl, clean_and_validate_json, validate_ttl, ValidationError
+from llm_cache import LLMCache, make_cache_key
+from chunking import chunk_text_by_tokens, count_tokens
+from entity_resolution import EntityResolver, ENTITY_RESOLUTION
+from ttl_serializer import serialize_merged_to_ttl, merged_json_to_graph
+from metrics import metrics
+from llm_client import LLMClient
+from ontology_store import save_merged, STORE_SUFFIX
+from retrieval import build_focused_document, TOP_K
+from boilerplate import clean_pages, BOILERPLATE_FILTER
+from incremental_merge import apply_merged, apply_fragment, graph_base_iri
+from parse_manual import tables_to_partial
+from chunk_router import ChunkRouter, CHUNK_ROUTING
+from streaming import (JSONItemStreamParser, TurtleStatementSplitter,
+                       TurtleStatementChecker, MalformedStreamError)
 
 load_dotenv()
 
 #########################################
 #  Setup your LLM API client
 #########################################
-client = OpenAI(
-    api_key=os.getenv("OPENAI_API_KEY")
-)
+# Shared by every call site: pooled connections, retries with backoff,
+# adaptive concurrency and a circuit breaker (see llm_client.py)
+client = LLMClient(api_key=os.getenv("OPENAI_API_KEY"))
+llm_cache = LLMCache()
+
+EXTRACTION_MODEL = "o3-mini-2025-01-31"
+# Stream completions and parse them as they arrive (see streaming.py)
+STREAM_RESPONSES = os.getenv("ONTOLOGY_STREAM", "0").lower() in ("1", "true", "yes")
+# One-pass streaming aborts after this many invalid Turtle statements in a row
+STREAM_MAX_BAD_STATEMENTS = int(os.getenv("ONTOLOGY_STREAM_MAX_BAD_STATEMENTS", "5"))
+# ...or when a single statement grows past this many characters
+STREAM_MAX_STATEMENT_CHARS = int(os.getenv("ONTOLOGY_STREAM_MAX_STATEMENT_CHARS", "20000"))
+# Fixing the syntax of one small fragment does not need the extraction model
+REPAIR_MODEL = "gpt-4o-mini-2024-07-18"
+
+
+def chat_completion(model: str, messages: List[Dict], **params) -> str:
+    """
+    Returns the stripped message content for a chat completion, served from
+    the on-disk cache when the same (model, messages, params) was seen before.
+    """
+    key = make_cache_key(model, messages, **params)
+    cached = llm_cache.get(key)
+    if cached is not None:
+        metrics.incr("llm_cache_hits", model=model)
+        metrics.incr("llm_cache_bytes_saved", len(cached.encode("utf-8")), model=model)
+        return cached
+    metrics.incr("llm_cache_misses", model=model)
+
+    try:
+        with metrics.span("llm_request", model=model):
+            response = client.create(
+                model=model,
+                messages=messages,
+                stream=False,
+                **params
+            )
+    except Exception as e:
+        metrics.incr("llm_errors", model=model, error=type(e).__name__)
+        raise
+    metrics.incr("llm_requests", model=model)
+    metrics.record_usage(getattr(response, "usage", None), model)
+    content = response.choices[0].message.content.strip()
+    llm_cache.put(key, content, model=model)
+    return content
+
+
+def chat_completion_stream(model: str, messages: List[Dict],
+                           on_delta: Callable[[str], None], **params) -> str:
+    """
+    Streaming form of chat_completion: every text delta is passed to
+    `on_delta` as it arrives and the full stripped content is returned.
+    If `on_delta` raises (e.g. MalformedStreamError) the stream is closed,
+    nothing is cached and the exception propagates. Cached responses are
+    replayed through `on_delta` in one piece, so callers see the same items.
+    """
+    key = make_cache_key(model, messages, **params)
+    cached = llm_cache.get(key)
+    if cached is not None:
+        metrics.incr("llm_cache_hits", model=model)
+        metrics.incr("llm_cache_bytes_saved", len(cached.encode("utf-8")), model=model)
+        on_delta(cached)
+        return cached
+    metrics.incr("llm_cache_misses", model=model)
+
+    parts = []
+    usage = None
+    start = time.perf_counter()
+    try:
+        with metrics.span("llm_request", model=model, stream=True):
+            stream = client.create(
+                model=model,
+                messages=messages,
+                stream=True,
+                stream_options={"include_usage": True},
+                **params
+            )
+            try:
+                for event in stream:
+                    if event.usage is not None:
+                        usage = event.usage
+                    if not event.choices:
+                        continue
+                    delta = event.choices[0].delta.content
+                    if not delta:
+                        continue
+                    if not parts:
+                        metrics.observe("llm_first_token", time.perf_counter() - start, model=model)
+                    parts.append(delta)
+                    on_delta(delta)
+            finally:
+                stream.close()
+    except MalformedStreamError:
+        metrics.incr("llm_stream_aborts", model=model)
+        raise
+    except Exception as e:
+        metrics.incr("llm_errors", model=model, error=type(e).__name__)
+        raise
+    metrics.incr("llm_requests", model=model)
+    metrics.record_usage(usage, model)
+    content = "".join(parts).strip()
+    llm_cache.put(key, content, model=model)
+    return content
+
+
+def repair_fragment(fragment: str, error: str, kind: str, context: str = "") -> str:
+    """
+    repair_fn for validation.py: re-prompts for a single broken JSON object
+    or Turtle statement (plus its prefix block as context) instead of the
+    whole chunk or document.
+    """
+    language = "JSON" if kind == "json" else "OWL/Turtle"
+    prompt = f"""
+    The following {language} fragment failed to parse.
+    Error: {error}
+
+    Context (do not repeat it):
+    {context}
+
+    Fix only the syntax; keep every name, value and relationship.
+    Return only the corrected fragment with no extra text.
+
+    Fragment:
+    {fragment}
+    """
+    return chat_completion(
+        model=REPAIR_MODEL,
+        messages=[
+            {"role": "system", "content": f"You fix syntax errors in {language} without changing its content."},
+            {"role": "user", "content": prompt},
+        ],
+    )
 
 
 #########################################
@@ -22,6 +173,7 @@ def chunk_text(document: str, chunk_size=50000, overlap=4000) -> List[str]:
     """
     Splits `document` into overlapping chunks to handle large texts.
     Adjust chunk_size & overlap to your model’s token limit / desired context overlap.
+    Character-based; the pipeline itself uses chunking.chunk_text_by_tokens.
     """
     chunks = []
     start = 0
@@ -36,7 +188,44 @@ def chunk_text(document: str, chunk_size=50000, overlap=4000) -> List[str]:
 #########################################
 #   Step 1: Partial Extraction per Chunk
 #########################################
-def extract_partial_json(chunk: str) -> Dict:
+# Everything except the chunk is the same for every request and goes first,
+# as the system message, so providers that cache prompt prefixes reuse it
+# across chunks; the chunk is the only part that varies, and comes last.
+EXTRACTION_INSTRUCTIONS = """You are an expert in domain knowledge extraction.
+
+Read the document chunk, which explains an OWL ontology, and convert the ontology's structure and components into JSON. Capture its classes, object and data properties, individuals and their interrelationships, including hierarchical relationships, property domains and ranges, and annotations or descriptions.
+
+Requirements:
+1. Classes: name, a brief description or definition, superclasses, subclasses, associated properties.
+2. Properties: "Object Property" or "Data Property", domain (the class it belongs to), range (class or datatype it points to), a brief description, cardinality or value restrictions.
+3. Individuals: name, class membership, property values as key-value pairs.
+4. Annotations: human-readable labels and comments that give more context.
+
+Output format: return a single JSON object of this shape and nothing else:
+
+{
+  "entities": [
+    {"name": "...", "type": "Class | Individual | ObjectProperty | DataProperty",
+     "description": "...", "superclasses": ["..."], "class_membership": ["..."],
+     "domain": ["..."], "range": ["..."], "properties": {"key": "value"}}
+  ],
+  "relationships": [
+    {"source": "...", "type": "...", "target": "...", "properties": {}}
+  ]
+}"""
+
+
+def extraction_messages(chunk: str) -> List[Dict]:
+    return [
+        {"role": "system", "content": EXTRACTION_INSTRUCTIONS},
+        {"role": "user", "content": f"Document chunk:\n{chunk}"},
+    ]
+
+
+def extract_partial_json(chunk: str, stream: bool = False,
+                         on_entity: Callable[[Dict], None] = None,
+                         on_relationship: Callable[[Dict], None] = None,
+                         model: str = None) -> Dict:
     """
     Prompts the LLM to extract a structured JSON 'partial ontology' from a chunk.
     Example JSON schema:
@@ -47,191 +236,641 @@ def extract_partial_json(chunk: str) -> Dict:
       "notes": ...
     }
     Adapt the schema to your domain needs.
+
+    With `stream=True` the reply is parsed as it arrives: each finished
+    entity / relationship is passed to `on_entity` / `on_relationship`
+    immediately, and a reply that is clearly not the requested JSON is
+    aborted early. The items received before an abort are kept in the
+    returned partial, which also carries an "error" so the chunk is retried.
+
+    `model` defaults to EXTRACTION_MODEL; the chunk router passes a cheaper
+    one for low-value chunks.
     """
 
-    prompt = f"""
-    Instruction:
+    model = model or EXTRACTION_MODEL
+    messages = extraction_messages(chunk)
 
-    Please read and analyze the following document that explains an OWL ontology. Your task is to convert the ontology's structure and components into a well-organized JSON format. The JSON should comprehensively capture the ontology's classes, properties (both object and data properties), individuals, and their interrelationships. Ensure that hierarchical relationships, property domains and ranges, and any annotations or descriptions are accurately represented.
+    parser = None
+    if stream:
+        # Broken objects are left for the repair step rather than aborting
+        parser = JSONItemStreamParser(on_entity=on_entity, on_relationship=on_relationship,
+                                      on_invalid=lambda name, raw, error: None)
+        try:
+            raw_json_str = chat_completion_stream(model, messages, on_delta=parser.feed)
+        except MalformedStreamError as e:
+            print(f"[ERROR] Aborted malformed extraction stream: {e}")
+            metrics.incr("invalid_json_partials")
+            return dict(parser.items, error=f"Aborted malformed stream: {e}")
+    else:
+        raw_json_str = chat_completion(model=model, messages=messages)
 
-    **Requirements for the JSON Structure:**
+    def forward_repaired(name, obj):
+        # Well-formed items were streamed already; repaired ones follow
+        callback = on_entity if name == "entities" else on_relationship
+        if stream and callback is not None:
+            callback(obj)
 
-    1. **Classes:**
-        - **Name:** The name of the class.
-        - **Description:** A brief description or definition of the class.
-        - **Superclasses:** List of parent classes (if any).
-        - **Subclasses:** List of child classes (if any).
-        - **Properties:** Properties associated with the class.
+    # Parse JSON, repairing only the objects that are broken
+    try:
+        partial_data = clean_and_validate_json(raw_json_str, repair_fn=repair_fragment,
+                                               on_repaired=forward_repaired)
+    except ValidationError as e:
+        metrics.incr("invalid_json_partials")
+        # Streamed items were already handed on, so keep them in the partial
+        salvaged = parser.items if parser else {"entities": [], "relationships": []}
+        partial_data = dict(salvaged, error=str(e))
+    # print(cleaned_json)
+    return partial_data
 
-    2. **Properties:**
-        - **Type:** Specify whether it's an "Object Property" or "Data Property."
-        - **Domain:** The class to which the property belongs.
-        - **Range:** The class or datatype that the property points to.
-        - **Description:** A brief description of the property's purpose.
-        - **Restrictions:** Any cardinality or value restrictions applied to the property.
 
-    3. **Individuals:**
-        - **Name:** The name of the individual.
-        - **Class Membership:** The class or classes the individual belongs to.
-        - **Property Values:** Key-value pairs representing property assignments.
+#########################################
+#   Step 1a: Concurrent Chunk Extraction
+#########################################
+# Defaults can be overridden per call or through the environment so that
+# scheduled jobs can be tuned to the account's rate limits.
+MAX_CONCURRENT_REQUESTS = int(os.getenv("ONTOLOGY_MAX_CONCURRENCY", "4"))
+REQUESTS_PER_MINUTE = int(os.getenv("ONTOLOGY_RPM", "0")) or None
+TOKENS_PER_MINUTE = int(os.getenv("ONTOLOGY_TPM", "0")) or None
 
-    4. **Annotations:**
-        - **Label:** Human-readable labels for classes, properties, or individuals.
-        - **Comments:** Additional comments or notes providing more context.
+
+def estimate_tokens(text: str) -> int:
+    """
+    Token count of a chunk for the extraction model, used for rate limiting.
+    """
+    return count_tokens(text, EXTRACTION_MODEL)
 
 
-    Document chunk:{chunk}
+class RateLimiter:
+    """
+    Thread-safe sliding-window limiter for requests-per-minute and
+    tokens-per-minute. A limit of None disables that dimension.
     """
 
-    # having issue with this line. 
-    #   prompt issue? 
-    response = client.chat.completions.create(
-        model="o3-mini-2025-01-31",
-        messages=[
-            {"role": "system", "content": "You are an expert in domain knowledge extraction."},
-            {"role": "user", "content": prompt},
-        ],
-        stream=False
+    def __init__(self, requests_per_minute=None, tokens_per_minute=None, window=60.0):
+        self.requests_per_minute = requests_per_minute
+        self.tokens_per_minute = tokens_per_minute
+        self.window = window
+        self._events = deque()  # (timestamp, tokens)
+        self._tokens_in_window = 0
+        self._lock = threading.Lock()
+
+    def _prune(self, now):
+        while self._events and now - self._events[0][0] >= self.window:
+            _, tokens = self._events.popleft()
+            self._tokens_in_window -= tokens
+
+    def acquire(self, tokens=0):
+        """
+        Blocks until one request of `tokens` tokens fits in the current window.
+        A single request larger than the token budget is let through once the
+        window is empty, so oversized chunks cannot deadlock the run.
+        """
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._prune(now)
+                rpm_ok = (self.requests_per_minute is None
+                          or len(self._events) < self.requests_per_minute)
+                tpm_ok = (self.tokens_per_minute is None
+                          or not self._events
+                          or self._tokens_in_window + tokens <= self.tokens_per_minute)
+                if rpm_ok and tpm_ok:
+                    self._events.append((now, tokens))
+                    self._tokens_in_window += tokens
+                    return
+                wait = self.window - (now - self._events[0][0])
+            time.sleep(max(wait, 0.01))
+
+
+def extract_partials_concurrently(
+    chunks: List[str],
+    max_workers: int = None,
+    requests_per_minute: int = None,
+    tokens_per_minute: int = None,
+    extract_fn: Callable[[str], Dict] = None,
+) -> List[Dict]:
+    """
+    Runs `extract_fn` (default: extract_partial_json) over all chunks with at
+    most `max_workers` requests in flight, throttled by a shared RateLimiter.
+    Results are returned in chunk order so merge_partial_json sees the same
+    provenance indexes as a sequential run. A chunk that raises is recorded
+    as an empty partial with an "error" field instead of aborting the batch.
+    """
+    extract_fn = extract_fn or extract_partial_json
+    max_workers = max_workers or MAX_CONCURRENT_REQUESTS
+    limiter = RateLimiter(
+        requests_per_minute or REQUESTS_PER_MINUTE,
+        tokens_per_minute or TOKENS_PER_MINUTE,
     )
-    print(response)
 
-    raw_json_str = response.choices[0].message.content.strip()
+    def run(i, chunk):
+        with metrics.span("rate_limit_wait"):
+            limiter.acquire(estimate_tokens(chunk))
+        print(f"[INFO] Processing chunk {i + 1}/{len(chunks)} (length={len(chunk)} chars)")
+        with metrics.span("extract_chunk", chunk=i + 1, chars=len(chunk)):
+            return extract_fn(chunk)
 
-    cleaned_json = clean_and_validate_ttl(raw_json_str)
-    print(cleaned_json)
-    # Attempt to parse JSON
-    try:
-        partial_data = json.loads(cleaned_json)
-    except json.JSONDecodeError:
-        partial_data = {"entities": [], "relationships": [], "error": f"Invalid JSON returned: {cleaned_json[:200]}..."}
-    # print(cleaned_json)
-    return partial_data
+    results: List[Dict] = [None] * len(chunks)
+    with ThreadPoolExecutor(max_workers=max_workers) as pool:
+        futures = {pool.submit(run, i, c): i for i, c in enumerate(chunks)}
+        for future in as_completed(futures):
+            i = futures[future]
+            try:
+                results[i] = future.result()
+            except Exception as e:
+                print(f"[ERROR] Chunk {i + 1} failed: {e}")
+                results[i] = {"entities": [], "relationships": [], "error": str(e)}
+    return results
 
 
 #########################################
 #   Step 1b: Merge Partial Extractions
 #########################################
-from typing import List, Dict, Set
-from collections import defaultdict
+DESCRIPTION_SENTENCE_RE = re.compile(r"(?<=[.!?])\s+|\n+")
+# Optional entity fields from the extraction schema that are carried through
+# to the merged output (the TTL serializer relies on them)
+ENTITY_SCHEMA_FIELDS = ('type', 'superclasses', 'class_membership', 'domain', 'range')
+
+
+@lru_cache(maxsize=1 << 16)
+def normalize_name(name: str) -> str:
+    return name.strip().lower().replace(' ', '_')
+
+
+def freeze_value(value):
+    """
+    Canonical hashable form of a JSON value, so property dicts can be
+    compared by set/dict lookup instead of pairwise equality.
+    """
+    if isinstance(value, dict):
+        if not value:
+            return ()
+        return tuple(sorted([(str(k), freeze_value(v)) for k, v in value.items()]))
+    if isinstance(value, (list, tuple)):
+        return tuple(freeze_value(v) for v in value)
+    try:
+        hash(value)
+        return value
+    except TypeError:
+        return repr(value)
+
+
+class PartialMerger:
+    """
+    Incremental form of merge_partial_json. Every entity, relationship and
+    description sentence is looked up by a canonical key, so the total cost is
+    O(number of items) regardless of how many partials contributed to them.
+    Call add_partial() per partial (or add_entity()/add_relationship() per
+    item) and result() once at the end.
+    """
+
+    def __init__(self):
+        self.entities: Dict[str, Dict] = {}
+        # Per entity: description parts in arrival order + normalized sentence set
+        self._desc_parts: Dict[str, List[str]] = {}
+        self._desc_seen: Dict[str, Set[str]] = {}
+        # (relationship key, frozen properties) -> relationship
+        self.relationships: Dict[tuple, Dict] = {}
+        self.entity_provenance = defaultdict(set)
+        self.relationship_provenance = defaultdict(set)
+        # canonical name -> names folded into it by entity resolution
+        self.aliases: Dict[str, List[str]] = defaultdict(list)
+        self._next_idx = 0
+
+    def add_partial(self, partial: Dict, idx: int = None):
+        if idx is None:
+            idx = self._next_idx
+        self._next_idx = max(self._next_idx, idx + 1)
+        for entity in partial.get('entities', []):
+            self.add_entity(entity, idx)
+        for rel in partial.get('relationships', []):
+            self.add_relationship(rel, idx)
+
+    def _add_description(self, name: str, text: str):
+        seen = self._desc_seen.setdefault(name, set())
+        fresh = []
+        for sentence in DESCRIPTION_SENTENCE_RE.split(text.strip()):
+            key = " ".join(sentence.lower().split())
+            if key and key not in seen:
+                seen.add(key)
+                fresh.append(sentence.strip())
+        if fresh:
+            self._desc_parts.setdefault(name, []).append(" ".join(fresh))
+
+    def add_entity(self, entity: Dict, idx: int):
+        if not entity.get('name'):
+            return  # Skip invalid entities
+        name = normalize_name(entity['name'])
+
+        # Record provenance
+        self.entity_provenance[name].add(idx)
+
+        if name not in self.entities:
+            self.entities[name] = {k: v for k, v in entity.items() if k != 'description'}
+            self.entities[name]['sources'] = [idx]
+        else:
+            # Merge other properties (last partial wins)
+            for key in entity:
+                if key not in ('name', 'description'):
+                    self.entities[name][key] = entity[key]
+            self.entities[name]['sources'].append(idx)
+
+        # Merge descriptions from different sources, sentence by sentence
+        if isinstance(entity.get('description'), str):
+            self._add_description(name, entity['description'])
+
+    def add_relationship(self, rel: Dict, idx: int):
+        source, rel_type, target = rel.get('source'), rel.get('type'), rel.get('target')
+        if not (source and rel_type and target):
+            return  # Skip invalid relationships
+
+        key = (normalize_name(source), normalize_name(rel_type), normalize_name(target))
+        self.relationship_provenance[key].add(idx)
+
+        properties = rel.get('properties', {})
+        signature = (key, freeze_value(properties))
+        if signature not in self.relationships:
+            self.relationships[signature] = {
+                'source': key[0],
+                'target': key[2],
+                'type': rel['type'].strip(),
+                'properties': properties,
+                'sources': [idx]
+            }
+
+    def resolve_entities(self, resolver):
+        """
+        Folds entities that `resolver` (an entity_resolution.EntityResolver)
+        identifies as the same thing into one canonical entity, and rewrites
+        relationship endpoints -- including endpoints that had no entity of
+        their own -- so those relationships survive validation.
+        """
+        mentions = set()
+        for (key, _) in self.relationships:
+            for endpoint in (key[0], key[2]):
+                if endpoint not in self.entities:
+                    mentions.add(endpoint)
+        alias_map = resolver.resolve(self.entities, mentions)
+        if not alias_map:
+            return alias_map
+
+        for alias, canonical in alias_map.items():
+            target = self.entities[canonical]
+            self.entity_provenance[canonical] |= self.entity_provenance.pop(alias, set())
+            entity = self.entities.pop(alias, None)
+            if entity is None:
+                self.aliases[canonical].append(alias)
+                continue
+            self.aliases[canonical].append(entity['name'])
+            target['sources'].extend(entity['sources'])
+            # The canonical entity wins conflicts; the alias only fills gaps
+            for key, value in entity.items():
+                target.setdefault(key, value)
+            for part in self._desc_parts.pop(alias, []):
+                self._add_description(canonical, part)
+            self._desc_seen.pop(alias, None)
+
+        relationships: Dict[tuple, Dict] = {}
+        relationship_provenance = defaultdict(set)
+        for (key, props), rel in self.relationships.items():
+            source = alias_map.get(key[0], key[0])
+            target = alias_map.get(key[2], key[2])
+            new_key = (source, key[1], target)
+            if new_key != key:
+                rel = dict(rel, source=source, target=target)
+            relationships.setdefault((new_key, props), rel)
+        for key, idxs in self.relationship_provenance.items():
+            new_key = (alias_map.get(key[0], key[0]), key[1], alias_map.get(key[2], key[2]))
+            relationship_provenance[new_key] |= idxs
+        self.relationships = relationships
+        self.relationship_provenance = relationship_provenance
+        return alias_map
+
+    def result(self) -> Dict:
+        # Validate relationships against entities, keeping variants of the
+        # same (source, type, target) together in first-seen order
+        by_key: Dict[tuple, List[Dict]] = {}
+        for (key, _), rel in self.relationships.items():
+            if rel['source'] in self.entities and rel['target'] in self.entities:
+                by_key.setdefault(key, []).append(rel)
+        valid_relationships = [rel for rels in by_key.values() for rel in rels]
 
-def merge_partial_json(partials: List[Dict]) -> Dict:
+        # Convert entities to list format
+        final_entities = []
+        for name, data in self.entities.items():
+            entity = {
+                'id': name,
+                'name': data['name'],
+                'description': "\n".join(self._desc_parts.get(name, [])),
+                'properties': data.get('properties', {}),
+                'source_chunks': sorted(data['sources'])
+            }
+            for field in ENTITY_SCHEMA_FIELDS:
+                if data.get(field):
+                    entity[field] = data[field]
+            final_entities.append(entity)
+
+        relationship_types = set(r['type'] for r in valid_relationships)
+
+        return {
+            'entities': final_entities,
+            'relationships': valid_relationships,
+            'aliases': {self.entities[k]['name']: sorted(set(v)) for k, v in self.aliases.items()},
+            'provenance': {
+                'entity_sources': {k: sorted(v) for k, v in self.entity_provenance.items()},
+                # Keys are "source|type|target" so the result stays JSON-serializable
+                'relationship_sources': {"|".join(k): sorted(v)
+                                         for k, v in self.relationship_provenance.items()}
+            },
+            'stats': {
+                'total_entities': len(final_entities),
+                'total_relationships': len(valid_relationships),
+                'unique_relationship_types': len(relationship_types),
+                'resolved_aliases': sum(len(v) for v in self.aliases.values())
+            }
+        }
+
+
+class ConcurrentMerger(PartialMerger):
+    """
+    PartialMerger that extraction threads can feed directly while replies
+    are still streaming. Items of the lowest unfinished chunk are merged the
+    moment they are parsed; items of later chunks wait until every earlier
+    chunk is finished, so the result is identical to merging the partials
+    in chunk order. Call finish_chunk(idx) once per chunk position.
+    """
+
+    def __init__(self):
+        super().__init__()
+        self._lock = threading.Lock()
+        self._pending: Dict[int, List[tuple]] = defaultdict(list)
+        self._finished: Set[int] = set()
+        self._current = 0
+
+    def _merge(self, kind: str, item: Dict, idx: int):
+        if kind == 'entity':
+            PartialMerger.add_entity(self, item, idx)
+        else:
+            PartialMerger.add_relationship(self, item, idx)
+
+    def _add(self, kind: str, item: Dict, idx: int):
+        with self._lock:
+            if idx == self._current:
+                self._merge(kind, item, idx)
+            else:
+                self._pending[idx].append((kind, item))
+
+    def add_entity(self, entity: Dict, idx: int):
+        self._add('entity', entity, idx)
+
+    def add_relationship(self, rel: Dict, idx: int):
+        self._add('relationship', rel, idx)
+
+    def finish_chunk(self, idx: int):
+        with self._lock:
+            self._finished.add(idx)
+            while self._current in self._finished:
+                self._current += 1
+                for kind, item in self._pending.pop(self._current, []):
+                    self._merge(kind, item, self._current)
+
+    def flush(self):
+        """
+        Merges whatever is still buffered (chunks that never finished) in
+        chunk order; called before resolution and result().
+        """
+        with self._lock:
+            for idx in sorted(self._pending):
+                for kind, item in self._pending.pop(idx):
+                    self._merge(kind, item, idx)
+
+    def resolve_entities(self, resolver):
+        self.flush()
+        return super().resolve_entities(resolver)
+
+    def result(self) -> Dict:
+        self.flush()
+        return super().result()
+
+
+def merge_partial_json_stream(partials: Iterable[Dict], resolver=None) -> Dict:
+    """
+    Same as merge_partial_json but consumes any iterator of partials (e.g. a
+    generator reading partial_N.json files) without materializing the list.
+    """
+    merger = PartialMerger()
+    # The merge only allocates acyclic containers; pausing the cyclic GC
+    # avoids repeated full-heap scans that otherwise dominate large merges.
+    gc_was_enabled = gc.isenabled()
+    gc.disable()
+    try:
+        for idx, partial in enumerate(partials):
+            merger.add_partial(partial, idx)
+        if resolver is not None:
+            merger.resolve_entities(resolver)
+        return merger.result()
+    finally:
+        if gc_was_enabled:
+            gc.enable()
+
+
+def merge_partial_json(partials: List[Dict], resolver=None) -> Dict:
     """
     Combines partial ontologies with conflict resolution and consistency checks.
     Features:
     - Deduplicates entities based on name
-    - Merges entity descriptions from multiple sources
+    - Merges entity descriptions from multiple sources (sentence-level dedup)
     - Validates relationship references
     - Handles conflicting property values
     - Maintains provenance information
+    - Optionally folds name variants together via `resolver`
+      (entity_resolution.EntityResolver), recording them under 'aliases'
     """
-    
-    # Helper functions for normalization
-    def normalize_name(name: str) -> str:
-        return name.strip().lower().replace(' ', '_')
-    
-    def create_relationship_key(rel: Dict) -> tuple:
-        return (normalize_name(rel['source']), 
-                normalize_name(rel['type']),
-                normalize_name(rel['target']))
-
-    # Storage structures with provenance tracking
-    entities = defaultdict(dict)
-    relationships = defaultdict(list)
-    entity_provenance = defaultdict(set)
-    relationship_provenance = defaultdict(set)
-    
-    # First pass: collect all entities and relationships
-    for idx, partial in enumerate(partials):
-        # Process entities
-        for entity in partial.get('entities', []):
-            name = normalize_name(entity['name'])
-            
-            # Record provenance
-            entity_provenance[name].add(idx)
-            
-            # Merge properties with conflict resolution
-            if name not in entities:
-                entities[name] = entity
-                entities[name]['sources'] = [idx]
-            else:
-                # Merge descriptions from different sources
-                if 'description' in entity:
-                    existing_desc = entities[name].get('description', '')
-                    new_desc = entity['description'].strip()
-                    if new_desc and new_desc not in existing_desc:
-                        entities[name]['description'] = f"{existing_desc}\n{new_desc}".strip()
-                
-                # Merge other properties (last partial wins)
-                for key in [k for k in entity if k not in ('name', 'description')]:
-                    entities[name][key] = entity[key]
-                
-                entities[name]['sources'].append(idx)
-        
-        # Process relationships
-        for rel in partial.get('relationships', []):
-            if not all(key in rel for key in ['source', 'type', 'target']):
-                continue  # Skip invalid relationships
-            
-            key = create_relationship_key(rel)
-            relationship_provenance[key].add(idx)
-            
-            # Check if relationship already exists
-            exists = False
-            for existing in relationships[key]:
-                if existing['properties'] == rel.get('properties', {}):
-                    exists = True
-                    break
-            
-            if not exists:
-                relationships[key].append({
-                    'source': normalize_name(rel['source']),
-                    'target': normalize_name(rel['target']),
-                    'type': rel['type'].strip(),
-                    'properties': rel.get('properties', {}),
-                    'sources': [idx]
-                })
-    
-    # Second pass: validate relationships against entities
-    valid_relationships = []
-    for rel_list in relationships.values():
-        for rel in rel_list:
-            # Check if endpoints exist
-            source_exists = normalize_name(rel['source']) in entities
-            target_exists = normalize_name(rel['target']) in entities
-            
-            if source_exists and target_exists:
-                valid_relationships.append(rel)
+    return merge_partial_json_stream(partials, resolver=resolver)
+
+
+#########################################
+#   Step 1c: Chunk Manifest (incremental re-processing)
+#########################################
+MANIFEST_NAME = "manifest.json"
+
+
+def chunk_fingerprint(chunk: str) -> str:
+    """
+    Stable identity of a chunk's extraction: model, instructions and the
+    whitespace-normalized chunk text. Editing the prompt or switching model
+    invalidates every entry, which is what we want.
+    """
+    h = hashlib.sha256()
+    h.update(EXTRACTION_MODEL.encode("utf-8"))
+    h.update(b"\0")
+    h.update(EXTRACTION_INSTRUCTIONS.encode("utf-8"))
+    h.update(b"\0")
+    h.update(" ".join(chunk.split()).encode("utf-8"))
+    return h.hexdigest()
+
+
+def load_manifest(partials_dir: str) -> Dict:
+    path = os.path.join(partials_dir, MANIFEST_NAME)
+    if os.path.exists(path):
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    return {"chunks": {}, "order": []}
+
+
+def save_manifest(partials_dir: str, manifest: Dict):
+    path = os.path.join(partials_dir, MANIFEST_NAME)
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(manifest, f, indent=2)
+    os.replace(tmp_path, path)
+
+
+def make_router() -> ChunkRouter:
+    """
+    A ChunkRouter for extract_partial_json: full-model replies already in
+    the LLM cache are free, so those chunks are never downgraded.
+    """
+    return ChunkRouter(
+        EXTRACTION_MODEL,
+        prefix_tokens=count_tokens(EXTRACTION_INSTRUCTIONS, EXTRACTION_MODEL),
+        cached=lambda chunk: llm_cache.contains(make_cache_key(EXTRACTION_MODEL, extraction_messages(chunk))),
+    )
+
+
+def extract_partials_incrementally(chunks: List[str], partials_dir: str,
+                                   merger: PartialMerger = None, router: ChunkRouter = None,
+                                   **engine_kwargs) -> List[Dict]:
+    """
+    Returns one partial per chunk, in chunk order, re-extracting only chunks
+    whose fingerprint is not already in the manifest of `partials_dir`.
+    Partials that recorded an extraction error are retried. Files for chunks
+    that no longer occur in the document are removed, so the directory always
+    mirrors the current revision.
+
+    With a `merger` (a ConcurrentMerger) the new chunks are extracted in
+    streaming mode and every item is added to it as soon as it is parsed;
+    reused partials are added up front. Provenance indexes are chunk
+    positions, as in merge_partial_json.
+
+    With a `router` each new chunk is first routed (chunk_router.py):
+    skipped chunks get an empty partial with a "skipped" reason that is not
+    saved, so they are routed again next run; cheap-model partials record
+    their "model" and are re-extracted once routing is turned off.
+    """
+    os.makedirs(partials_dir, exist_ok=True)
+    manifest = load_manifest(partials_dir)
+    known = manifest["chunks"]
+    fingerprints = [chunk_fingerprint(c) for c in chunks]
+
+    partials: Dict[str, Dict] = {}
+    for fp in set(fingerprints):
+        fname = known.get(fp)
+        path = os.path.join(partials_dir, fname) if fname else None
+        if path and os.path.exists(path):
+            with open(path, "r", encoding="utf-8") as f:
+                partial = json.load(f)
+            if "error" not in partial and (router is not None or "model" not in partial):
+                partials[fp] = partial
+
+    todo, queued = [], set()
+    for i, fp in enumerate(fingerprints):
+        if fp not in partials and fp not in queued:
+            queued.add(fp)
+            todo.append((i, fp))
+    reused = len(chunks) - len(todo)
+
+    decisions = {}  # chunk text -> RouteDecision, for the chunks still to extract
+    if router is not None:
+        for i, fp in todo:
+            decision = router.route(chunks[i])
+            if decision.route == "skip":
+                print(f"[INFO] Skipping chunk {i + 1}/{len(chunks)}: {decision.reason}")
+                partials[fp] = {"entities": [], "relationships": [], "skipped": decision.reason}
+                router.record(decision, partials[fp])
             else:
-                # Optionally log missing entities here
-                pass
-    
-    # Convert entities to list format
-    final_entities = []
-    for name, data in entities.items():
-        entity = {
-            'name': data['name'],
-            'description': data.get('description', ''),
-            'properties': data.get('properties', {}),
-            'source_chunks': sorted(data['sources'])
-        }
-        final_entities.append(entity)
-    
-    # Add reverse relationships for validation
-    relationship_types = set(r['type'] for r in valid_relationships)
-    
-    return {
-        'entities': final_entities,
-        'relationships': valid_relationships,
-        'provenance': {
-            'entity_sources': {k: sorted(v) for k, v in entity_provenance.items()},
-            'relationship_sources': {k: sorted(v) for k, v in relationship_provenance.items()}
-        },
-        'stats': {
-            'total_entities': len(final_entities),
-            'total_relationships': len(valid_relationships),
-            'unique_relationship_types': len(relationship_types)
-        }
-    }
+                decisions[chunks[i]] = decision
+        todo = [(i, fp) for i, fp in todo if fp not in partials]
+    print(f"[INFO] Chunk manifest: {reused} reused, {len(chunks) - reused - len(todo)} skipped, "
+          f"{len(todo)} to extract")
+    metrics.incr("chunks_reused", reused)
+    metrics.incr("chunks_extracted", len(todo))
+
+    def extract(chunk, **kwargs):
+        decision = decisions.get(chunk)
+        if decision is None:
+            return extract_partial_json(chunk, **kwargs)
+        partial = extract_partial_json(chunk, model=decision.model, **kwargs)
+        if decision.model != EXTRACTION_MODEL:
+            partial["model"] = decision.model
+        router.record(decision, partial)
+        return partial
+
+    if merger is not None:
+        for i, fp in enumerate(fingerprints):
+            if fp in partials:
+                merger.add_partial(partials[fp], i)
+                merger.finish_chunk(i)
+        # Texts in `todo` are distinct (distinct fingerprints), so the chunk
+        # text identifies its position
+        position = {chunks[i]: i for i, _ in todo}
+        repeats = defaultdict(list)  # first position -> later positions of the same chunk
+        first_position = {fp: i for i, fp in todo}
+        for i, fp in enumerate(fingerprints):
+            if fp in first_position and i != first_position[fp]:
+                repeats[first_position[fp]].append(i)
+
+        def stream_into_merger(chunk):
+            idx = position[chunk]
+            partial = None
+            try:
+                partial = extract(
+                    chunk, stream=True,
+                    on_entity=lambda entity: merger.add_entity(entity, idx),
+                    on_relationship=lambda rel: merger.add_relationship(rel, idx),
+                )
+                return partial
+            finally:
+                merger.finish_chunk(idx)
+                for j in repeats.get(idx, ()):
+                    if partial is not None:
+                        merger.add_partial(partial, j)
+                    merger.finish_chunk(j)
+        engine_kwargs["extract_fn"] = stream_into_merger
+    else:
+        engine_kwargs["extract_fn"] = extract
+
+    if todo:
+        fresh = extract_partials_concurrently([chunks[i] for i, _ in todo], **engine_kwargs)
+        used = {int(n[len("partial_"):-len(".json")]) for n in known.values()}
+        next_n = max(used, default=0) + 1
+        for (_, fp), partial in zip(todo, fresh):
+            fname = known.get(fp)
+            if fname is None:
+                fname = f"partial_{next_n}.json"
+                next_n += 1
+            partial_path = os.path.join(partials_dir, fname)
+            with open(partial_path, "w") as f:
+                json.dump(partial, f, separators=(",", ":"))
+            metrics.incr("bytes_written", os.path.getsize(partial_path), artifact="partial")
+            print(f"Saved partial ontology to {partial_path}")
+            known[fp] = fname
+            partials[fp] = partial
+
+    # Drop entries (and files) for chunks that no longer exist
+    current = set(fingerprints)
+    for fp in [fp for fp in known if fp not in current]:
+        stale_path = os.path.join(partials_dir, known.pop(fp))
+        if os.path.exists(stale_path):
+            os.remove(stale_path)
+    manifest["order"] = fingerprints
+    save_manifest(partials_dir, manifest)
+    if router is not None:
+        router.report()
+
+    return [partials[fp] for fp in fingerprints]
+
+
 #########################################
 #   Step 2: Final Refinement to TTL
 #########################################
@@ -252,19 +891,62 @@ def combine_json_into_ttl(merged_data: Dict) -> str:
     {merged_json_str}
     """
 
-    response = client.chat.completions.create(
+    ttl_output = chat_completion(
         model="gpt-4o-mini-2024-07-18",
         messages=[
             {"role": "system", "content": "You are an ontology expert familiar with JSON -> Turtle conversions."},
             {"role": "user", "content": prompt},
         ],
-        stream=False
     )
-    ttl_output = response.choices[0].message.content.strip()
     return ttl_output
 
-def onepassllm(document_text):
-    
+
+# Turtle larger than this is never sent for LLM polishing
+POLISH_MAX_CHARS = 40000
+
+
+def polish_ttl_with_llm(ttl: str, max_chars: int = POLISH_MAX_CHARS) -> str:
+    """
+    Optional last step after serialize_merged_to_ttl: asks the LLM to improve
+    labels and comments of an already valid, locally generated ontology.
+    Skipped (returns `ttl` unchanged) when the ontology exceeds `max_chars`.
+    """
+    if len(ttl) > max_chars:
+        print(f"[INFO] Skipping LLM polish: {len(ttl)} chars exceeds {max_chars}")
+        return ttl
+
+    prompt = f"""
+    Below is a valid OWL/Turtle ontology generated from extracted JSON.
+    Improve the wording of rdfs:label and rdfs:comment values where they are unclear.
+    Do not remove, rename or add any subject, predicate or class.
+    Return valid .ttl with no extra text.
+
+    Turtle:
+    {ttl}
+    """
+
+    polished = chat_completion(
+        model="gpt-4o-mini-2024-07-18",
+        messages=[
+            {"role": "system", "content": "You are an ontology expert familiar with OWL/Turtle."},
+            {"role": "user", "content": prompt},
+        ],
+    )
+    polished, report = validate_ttl(polished, repair_fn=repair_fragment)
+    if report["dropped"]:
+        print(f"[INFO] Polished Turtle lost {report['dropped']} statements; keeping the unpolished ontology")
+        return ttl
+    return polished
+
+def onepassllm(document_text, stream=False, on_statement: Callable[[str], None] = None):
+    """
+    Single-prompt document -> Turtle. With `stream=True` the reply is split
+    into statements as it arrives; each is syntax-checked (and passed to
+    `on_statement`), and the request is aborted with MalformedStreamError
+    after STREAM_MAX_BAD_STATEMENTS invalid statements in a row or a
+    statement longer than STREAM_MAX_STATEMENT_CHARS.
+    """
+
     prompt = f"""
     Instruction:
 
@@ -302,17 +984,31 @@ def onepassllm(document_text):
     Document chunk:{document_text}
     """
 
-    # having issue with this line. 
-    #   prompt issue? 
-    response = client.chat.completions.create(
-        model="o3-mini-2025-01-31",
-        messages=[
-            {"role": "system", "content": "You are an expert in domain knowledge extraction."},
-            {"role": "user", "content": prompt},
-        ],
-        stream=False
+    messages = [
+        {"role": "system", "content": "You are an expert in domain knowledge extraction."},
+        {"role": "user", "content": prompt},
+    ]
+    if not stream:
+        return chat_completion(model="o3-mini-2025-01-31", messages=messages)
+
+    splitter = TurtleStatementSplitter(STREAM_MAX_STATEMENT_CHARS)
+    checker = TurtleStatementChecker(STREAM_MAX_BAD_STATEMENTS)
+
+    def handle(statements):
+        for statement in statements:
+            checker.check(statement)
+            if on_statement is not None:
+                on_statement(statement)
+
+    ttl_output = chat_completion_stream(
+        "o3-mini-2025-01-31", messages,
+        on_delta=lambda delta: handle(splitter.feed(delta)),
     )
-    print(response)
+    handle(splitter.close())
+    if checker.errors:
+        print(f"[INFO] {checker.errors}/{checker.statements} streamed Turtle statements failed to parse")
+    metrics.incr("invalid_ttl_statements", checker.errors)
+    return ttl_output
 
 
 
@@ -321,52 +1017,156 @@ def onepassllm(document_text):
 #########################################
 # New constants for output directories
 PARTIALS_DIR = "data/partial_ontologies"
-MERGED_PATH = "data/merged_ontology.json"
+MERGED_PATH = "data/merged_ontology.json"  # file name reused inside each document's partials dir
+
+def generate_ontology_for_document(document_text: str, output_ttl="final_ontology.ttl",
+                                   use_chunks=False, max_workers=None,
+                                   requests_per_minute=None, tokens_per_minute=None,
+                                   partials_dir=None, polish_with_llm=False, merged_path=None,
+                                   stream=None, target_concepts=None, pages=None, top_k=None,
+                                   filter_boilerplate=None, merge_into=None, tables=None,
+                                   route_chunks=None, resolve_entities=None):
+    # `stream` (default: ONTOLOGY_STREAM) parses LLM replies as they arrive
+    # and merges extracted items immediately; see extract_partials_incrementally
+    # With `target_concepts`, only the top-k BM25 passages per concept are
+    # extracted from (retrieval.py); `pages` = [(page_number, text)] keeps page
+    # numbers in the passages, otherwise document_text is treated as one page
+    if stream is None:
+        stream = STREAM_RESPONSES
+    # `merge_into` names an existing ontology (e.g. ground.ttl) the result is
+    # folded into, with a delta next to it (incremental_merge.py)
+    # Recurring headers/footers and duplicated blocks are removed before
+    # anything is chunked (boilerplate.py; default: BOILERPLATE_FILTER)
+    # `tables` (parse_manual.extract_pages_and_tables) were parsed without the
+    # LLM; their rows are merged as one more partial, document_text should
+    # then be the prose only
+    if filter_boilerplate is None:
+        filter_boilerplate = BOILERPLATE_FILTER
+    # `route_chunks` (default: CHUNK_ROUTING) sends low-value chunks to a
+    # cheaper model or skips them (chunk_router.py)
+    if route_chunks is None:
+        route_chunks = CHUNK_ROUTING
+    # `resolve_entities` (default: ENTITY_RESOLUTION) folds name variants of
+    # one entity together in the merge (entity_resolution.py)
+    if resolve_entities is None:
+        resolve_entities = ENTITY_RESOLUTION
+    # Each document keeps its own partials + manifest so revisions of one
+    # manual only re-extract the chunks that changed
+    if partials_dir is None:
+        doc_name = os.path.splitext(os.path.basename(output_ttl))[0]
+        partials_dir = os.path.join(PARTIALS_DIR, doc_name)
+    if merged_path is None:
+        merged_path = os.path.join(partials_dir, os.path.basename(MERGED_PATH))
 
-def generate_ontology_for_document(document_text: str, output_ttl="final_ontology.ttl"):
     # Create directories if they don't exist
-    os.makedirs(PARTIALS_DIR, exist_ok=True)
+    os.makedirs(partials_dir, exist_ok=True)
     os.makedirs(os.path.dirname(output_ttl), exist_ok=True)
 
-    # # --(1) Split doc--
-    # chunks = chunk_text(document_text)
-
-    # # --(2) Extract partial JSON per chunk--
-    # partial_ontologies = []
-    # for i, c in enumerate(chunks, start=1):
-    #     print(f"[INFO] Processing chunk {i}/{len(chunks)} (length={len(c)} chars)")
-    #     partial = extract_partial_json(c)
-        
-    #     # Save partial JSON to file
-    #     partial_path = os.path.join(PARTIALS_DIR, f"partial_{i}.json")
-    #     with open(partial_path, "w") as f:
-    #         json.dump(partial, f, indent=2)
-    #     print(f"Saved partial ontology to {partial_path}")
-        
-    #     partial_ontologies.append(partial)
-
-    # # --(3) Merge partial JSONs--
-    # merged_data = merge_partial_json(partial_ontologies)
-    
-    # # Save merged JSON
-    # with open(MERGED_PATH, "w") as f:
-    #     json.dump(merged_data, f, indent=2)
-    # print(f"Saved merged JSON to {MERGED_PATH}")
-
-    # print("[INFO] Merged partial JSON. Entities:", len(merged_data["entities"]), 
-    #       "Relationships:", len(merged_data["relationships"]))
-
-    # # --(4) Final LLM call to produce TTL--
-    # final_ttl = combine_json_into_ttl(merged_data)
-
-
-    final_ttl = onepassllm(document_text)
-    # Clean or validate if you have a function for TTL
-    final_ttl = clean_and_validate_ttl(final_ttl)
+    if filter_boilerplate:
+        cleaned = clean_pages(pages or [(None, document_text)])
+        pages, document_text = cleaned.pages, cleaned.text
+        # Offsets into the cleaned text -> source page, for provenance
+        report = dict(cleaned.report, page_offsets=[
+            [offset, page] for offset, (page, _) in zip(cleaned.page_offsets, cleaned.pages)])
+        with open(os.path.join(partials_dir, "boilerplate.json"), "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+
+    table_partial = None
+    if tables:
+        table_partial = tables_to_partial(tables)
+        with open(os.path.join(partials_dir, "tables.json"), "w", encoding="utf-8") as f:
+            json.dump({"tables": tables, "partial": table_partial}, f, indent=2)
+
+    if target_concepts:
+        document_text, report = build_focused_document(
+            pages or [(None, document_text)], list(target_concepts),
+            k=top_k or TOP_K, model=EXTRACTION_MODEL)
+        with open(os.path.join(partials_dir, "retrieval.json"), "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+        if not document_text:
+            raise ValueError(f"No passage of the document matches any of {list(target_concepts)}")
+
+    if use_chunks:
+        # --(1) Split doc--
+        with metrics.span("chunking"):
+            chunks = chunk_text_by_tokens(document_text, model=EXTRACTION_MODEL)
+        metrics.incr("chunks", len(chunks))
+
+        # --(2) Extract partial JSON for new/changed chunks (concurrently, order preserved)--
+        merger = ConcurrentMerger() if stream else None
+        with metrics.span("extraction"):
+            partial_ontologies = extract_partials_incrementally(
+                chunks,
+                partials_dir,
+                merger=merger,
+                router=make_router() if route_chunks else None,
+                max_workers=max_workers,
+                requests_per_minute=requests_per_minute,
+                tokens_per_minute=tokens_per_minute,
+            )
+
+        failed = sum(1 for p in partial_ontologies if "error" in p)
+        if partial_ontologies and failed == len(partial_ontologies):
+            raise RuntimeError(f"All {failed} chunks failed extraction; see {partials_dir}")
+        if table_partial:
+            # Merged after every chunk, so table values win over anything the
+            # LLM read from the prose around the table
+            if merger is not None:
+                merger.add_partial(table_partial, len(chunks))
+                merger.finish_chunk(len(chunks))
+            else:
+                partial_ontologies.append(table_partial)
+
+        # --(3) Merge partial JSONs--
+        resolver = EntityResolver() if resolve_entities else None
+        with metrics.span("merge"):
+            if merger is not None:
+                # Items are already merged; only entity resolution is left
+                if resolver is not None:
+                    merger.resolve_entities(resolver)
+                merged_data = merger.result()
+            else:
+                merged_data = merge_partial_json(partial_ontologies, resolver=resolver)
+
+        # Save merged JSON (compact) and the memory-mappable binary store
+        with open(merged_path, "w") as f:
+            json.dump(merged_data, f, separators=(",", ":"))
+        metrics.incr("bytes_written", os.path.getsize(merged_path), artifact="merged_json")
+        store_path = os.path.splitext(merged_path)[0] + STORE_SUFFIX
+        metrics.incr("bytes_written", save_merged(merged_data, store_path), artifact="merged_store")
+        print(f"Saved merged JSON to {merged_path} and {store_path}")
+
+        print("[INFO] Merged partial JSON. Entities:", len(merged_data["entities"]),
+              "Relationships:", len(merged_data["relationships"]))
+
+        # --(4) Serialize merged JSON to TTL locally (LLM only polishes, if asked)--
+        with metrics.span("serialize"):
+            final_ttl = serialize_merged_to_ttl(merged_data)
+        if polish_with_llm:
+            with metrics.span("polish"):
+                final_ttl = polish_ttl_with_llm(final_ttl)
+    else:
+        with metrics.span("onepass"):
+            final_ttl = onepassllm(document_text, stream=stream)
+        # Parse the TTL; broken statements are re-prompted one by one
+        final_ttl = clean_and_validate_ttl(final_ttl, repair_fn=repair_fragment)
+        if table_partial:
+            graph = rdflib.Graph().parse(data=final_ttl, format="turtle")
+            graph += merged_json_to_graph(table_partial, base_iri=graph_base_iri(graph))
+            final_ttl = graph.serialize(format="turtle")
 
     # --(5) Save final TTL--
     with open(output_ttl, "w", encoding="utf-8") as f:
         f.write(final_ttl)
+    metrics.incr("bytes_written", os.path.getsize(output_ttl), artifact="ttl")
     print(f"[DONE] Wrote final ontology to {output_ttl}")
 
+    if merge_into:
+        document = os.path.splitext(os.path.basename(output_ttl))[0]
+        with metrics.span("incremental_merge"):
+            if use_chunks:
+                apply_merged(merge_into, merged_data, document)
+            else:
+                apply_fragment(merge_into, rdflib.Graph().parse(data=final_ttl, format="turtle"), document)
+
     return output_ttl
@@ -0,0 +1,193 @@
+# scripts/graph_cache.py
+import os
+import json
+import pickle
+import hashlib
+from array import array
+from typing import List, Optional, Tuple
+
+import rdflib
+from rdflib import URIRef, Literal, BNode
+from rdflib.util import guess_format
+
+from metrics import metrics
+
+#########################################
+#  Parsed-graph cache
+#########################################
+# rdflib's Turtle parser is the slowest step of every consumer of a TTL file.
+# The first parse of a file stores its triples as an interned term table plus
+# a flat uint32 triple array; later loads rebuild the terms from that (tens of
+# milliseconds) instead of parsing. Entries are keyed by the file's SHA-256,
+# so copies and touched-but-unchanged files still hit. A small index remembers
+# (size, mtime) -> hash per path so unchanged files are not even re-hashed.
+
+GRAPH_CACHE_DIR = os.getenv("GRAPH_CACHE_DIR", "data/graph_cache")
+GRAPH_CACHE_MAX_BYTES = int(os.getenv("GRAPH_CACHE_MAX_BYTES", str(256 * 1024 * 1024)))
+# Bump when the dump layout changes; the rdflib version is part of the key too
+CACHE_FORMAT = 1
+INDEX_NAME = "index.json"
+
+Triple = Tuple[rdflib.term.Node, rdflib.term.Node, rdflib.term.Node]
+# Format aliases that parse identically share one cache entry
+_FORMAT_ALIASES = {"ttl": "turtle", "nt": "nt11", "ntriples": "nt11"}
+
+
+def _file_sha256(path: str) -> str:
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            h.update(block)
+    return h.hexdigest()
+
+
+def _load_index(cache_dir: str) -> dict:
+    path = os.path.join(cache_dir, INDEX_NAME)
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def _save_index(cache_dir: str, index: dict):
+    path = os.path.join(cache_dir, INDEX_NAME)
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(index, f)
+    os.replace(tmp_path, path)
+
+
+def content_hash(path: str, cache_dir: str = GRAPH_CACHE_DIR) -> str:
+    """
+    SHA-256 of `path`, reusing the recorded hash while size and mtime are
+    unchanged.
+    """
+    st = os.stat(path)
+    real = os.path.realpath(path)
+    index = _load_index(cache_dir)
+    entry = index.get(real)
+    if entry and entry["size"] == st.st_size and entry["mtime_ns"] == st.st_mtime_ns:
+        return entry["sha256"]
+    digest = _file_sha256(path)
+    index[real] = {"size": st.st_size, "mtime_ns": st.st_mtime_ns, "sha256": digest}
+    os.makedirs(cache_dir, exist_ok=True)
+    _save_index(cache_dir, index)
+    return digest
+
+
+def _dump_path(digest: str, fmt: str, cache_dir: str) -> str:
+    return os.path.join(cache_dir, f"{digest}-{fmt}-rdflib{rdflib.__version__}-v{CACHE_FORMAT}.pickle")
+
+
+def _encode(graph: rdflib.Graph) -> dict:
+    ids, terms, flat = {}, [], array("I")
+    for triple in graph:
+        for term in triple:
+            tid = ids.get(term)
+            if tid is None:
+                tid = ids[term] = len(terms)
+                if isinstance(term, Literal):
+                    terms.append(("L", str(term), term.datatype and str(term.datatype), term.language))
+                elif isinstance(term, BNode):
+                    terms.append(("B", str(term), None, None))
+                else:
+                    terms.append(("U", str(term), None, None))
+            flat.append(tid)
+    return {"terms": terms, "triples": flat,
+            "namespaces": [(prefix, str(ns)) for prefix, ns in graph.namespaces()]}
+
+
+def _decode_triples(dump: dict) -> List[Triple]:
+    nodes = []
+    for kind, value, datatype, lang in dump["terms"]:
+        if kind == "U":
+            nodes.append(URIRef(value))
+        elif kind == "B":
+            nodes.append(BNode(value))
+        else:
+            nodes.append(Literal(value, datatype=datatype, lang=lang))
+    flat = dump["triples"]
+    return [(nodes[flat[i]], nodes[flat[i + 1]], nodes[flat[i + 2]]) for i in range(0, len(flat), 3)]
+
+
+def _evict(cache_dir: str, max_bytes: int):
+    dumps = [os.path.join(cache_dir, n) for n in os.listdir(cache_dir) if n.endswith(".pickle")]
+    sizes = {p: os.path.getsize(p) for p in dumps}
+    total = sum(sizes.values())
+    for p in sorted(dumps, key=os.path.getmtime):
+        if total <= max_bytes:
+            break
+        total -= sizes[p]
+        try:
+            os.remove(p)
+        except OSError:
+            pass
+
+
+def _normalize_format(format: Optional[str], path: str) -> str:
+    fmt = format or guess_format(path) or "turtle"
+    return _FORMAT_ALIASES.get(fmt, fmt)
+
+
+def _load_dump(path: str, fmt: str, use_cache: bool, cache_dir: str):
+    """
+    Returns (dump, graph): the cached dump on a hit, else the freshly parsed
+    graph (whose dump has been written to the cache).
+    """
+    if not use_cache:
+        with metrics.span("graph_parse", format=fmt):
+            return None, rdflib.Graph().parse(path, format=fmt)
+
+    dump_path = _dump_path(content_hash(path, cache_dir), fmt, cache_dir)
+    if os.path.exists(dump_path):
+        try:
+            with open(dump_path, "rb") as f:
+                dump = pickle.load(f)
+            os.utime(dump_path, None)
+            metrics.incr("graph_cache_hits")
+            return dump, None
+        except (OSError, pickle.UnpicklingError, EOFError):
+            pass
+
+    metrics.incr("graph_cache_misses")
+    with metrics.span("graph_parse", format=fmt):
+        graph = rdflib.Graph().parse(path, format=fmt)
+    tmp_path = f"{dump_path}.{os.getpid()}.tmp"
+    with open(tmp_path, "wb") as f:
+        pickle.dump(_encode(graph), f, protocol=pickle.HIGHEST_PROTOCOL)
+    os.replace(tmp_path, dump_path)
+    _evict(cache_dir, GRAPH_CACHE_MAX_BYTES)
+    return None, graph
+
+
+def load_triples(path: str, format: Optional[str] = None, use_cache: bool = True,
+                 cache_dir: str = GRAPH_CACHE_DIR) -> List[Triple]:
+    """
+    All triples of an RDF file, for consumers that only iterate the graph
+    (e.g. visualize_ontology.GraphIndex). Fastest path: no rdflib store.
+    """
+    fmt = _normalize_format(format, path)
+    dump, graph = _load_dump(path, fmt, use_cache, cache_dir)
+    if graph is not None:
+        return list(graph)
+    with metrics.span("graph_cache_load"):
+        return _decode_triples(dump)
+
+
+def load_graph(path: str, format: Optional[str] = None, use_cache: bool = True,
+               cache_dir: str = GRAPH_CACHE_DIR) -> rdflib.Graph:
+    """
+    Drop-in for rdflib.Graph().parse(path, format=...) backed by the cache;
+    the namespace bindings of the file are restored as well.
+    """
+    fmt = _normalize_format(format, path)
+    dump, graph = _load_dump(path, fmt, use_cache, cache_dir)
+    if graph is not None:
+        return graph
+    with metrics.span("graph_cache_load"):
+        graph = rdflib.Graph()
+        graph.addN((s, p, o, graph) for s, p, o in _decode_triples(dump))
+        for prefix, ns in dump["namespaces"]:
+            graph.bind(prefix, ns, override=True, replace=True)
+    return graph
@@ -0,0 +1,354 @@
+# scripts/incremental_merge.py
+import os
+import json
+import argparse
+from collections import defaultdict
+from typing import Dict, List, Optional, Set
+
+import rdflib
+from rdflib import BNode, Literal, URIRef
+from rdflib.namespace import OWL, RDF, RDFS, SKOS
+
+from graph_cache import load_graph
+from metrics import metrics
+from ontology_store import STORE_SUFFIX, load_merged
+from ttl_serializer import merged_json_to_graph, DEFAULT_BASE_IRI, _key
+from validation import validate_ttl
+
+#########################################
+#  Incremental merge into an existing ontology
+#########################################
+# Folds one document's extraction into a curated graph (e.g. ground.ttl)
+# instead of producing yet another standalone TTL:
+#   - the existing graph is loaded once (through graph_cache) and indexed by
+#     label and local name, so extracted entities land on the existing IRIs
+#   - every extracted entity is tagged :sourceDocument "<document>"
+#   - entities that only this document ever contributed are *owned*: their
+#     triples are replaced by the new extraction, and owned entities the new
+#     extraction no longer mentions are removed
+#   - everything else (curated or shared with other documents) is add-only:
+#     new superclasses, types, domains/ranges and assertions are added, but
+#     curated labels and comments are never overwritten
+#   - blank-node structures (owl:Restriction) have no identity of their own;
+#     they are compared by content, so re-applying an extraction never
+#     duplicates them, and are always added or removed as a whole subtree
+# The result is written as the updated graph plus a delta: a TriG file with
+# <urn:delta:added> / <urn:delta:removed> graphs and a JSON summary.
+
+DELTA_ADDED = URIRef("urn:delta:added")
+DELTA_REMOVED = URIRef("urn:delta:removed")
+# Annotations that describe an entity rather than relate it to something
+DESCRIPTIVE_PREDICATES = (RDFS.label, RDFS.comment, SKOS.altLabel)
+
+
+def local_name(uri) -> str:
+    return uri.split('#')[-1] or uri.rsplit('/', 1)[-1]
+
+
+class OntologyIndex:
+    """
+    Label / local-name lookup over an existing graph, plus the document
+    provenance recorded by earlier incremental merges.
+    """
+
+    def __init__(self, graph: rdflib.Graph, source_document: URIRef):
+        self.by_label: Dict[str, URIRef] = {}
+        self.by_local: Dict[str, URIRef] = {}
+        self.documents = defaultdict(set)  # subject -> {document name}
+        self.subjects: Set[URIRef] = set()
+
+        for s, p, o in graph:
+            if not isinstance(s, URIRef):
+                continue
+            self.subjects.add(s)
+            if p == RDFS.label:
+                self.by_label.setdefault(_key(str(o)), s)
+            elif p == source_document:
+                self.documents[s].add(str(o))
+        for s in self.subjects:
+            self.by_local.setdefault(local_name(s).lower(), s)
+
+    def find(self, label: Optional[str], uri: URIRef) -> Optional[URIRef]:
+        if label:
+            match = self.by_label.get(_key(label))
+            if match is not None:
+                return match
+        return self.by_local.get(local_name(uri).lower())
+
+    def owned_by(self, document: str) -> Set[URIRef]:
+        return {s for s, docs in self.documents.items() if docs == {document}}
+
+
+def load_existing(path: str, use_cache: bool = True) -> rdflib.Graph:
+    """
+    The existing ontology. Hand-edited files sometimes contain a statement
+    rdflib rejects; those are commented out (validation.validate_ttl) and
+    the rest is loaded rather than refusing the whole merge.
+    """
+    try:
+        return load_graph(path, format="turtle", use_cache=use_cache)
+    except Exception as e:
+        with open(path, "r", encoding="utf-8") as f:
+            text, report = validate_ttl(f.read())
+        print(f"[INFO] {path} does not parse ({type(e).__name__}); "
+              f"ignoring {report['dropped']} invalid statement(s)")
+        return rdflib.Graph().parse(data=text, format="turtle")
+
+
+class BlankNodeIndex:
+    """
+    The blank-node structures of a graph, keyed by content: each link from
+    a named subject to a blank node, (s, p, _:b), is identified as (s, p,
+    signature of _:b), where the signature is the set of the node's
+    (predicate, object) pairs with nested blank nodes replaced by their own
+    signatures.
+    """
+
+    def __init__(self, graph: rdflib.Graph):
+        self.graph = graph
+        self._signatures: Dict[BNode, frozenset] = {}
+        self.links: Dict[tuple, tuple] = {}  # (s, p, signature) -> (s, p, _:b)
+        self.owner: Dict[BNode, tuple] = {}  # blank node -> link it hangs from
+        for s, p, o in graph:
+            if isinstance(o, BNode) and not isinstance(s, BNode):
+                link = (s, p, o)
+                self.links.setdefault((s, p, self.signature(o)), link)
+                for node in self.nodes(o):
+                    self.owner[node] = link
+
+    def signature(self, node: BNode, seen: frozenset = frozenset()) -> frozenset:
+        if node in self._signatures:
+            return self._signatures[node]
+        if node in seen:
+            return frozenset()  # cycle: the content is already being described
+        seen = seen | {node}
+        signature = frozenset(
+            (p, self.signature(o, seen) if isinstance(o, BNode) else o)
+            for p, o in self.graph.predicate_objects(node))
+        self._signatures[node] = signature
+        return signature
+
+    def key(self, triple) -> tuple:
+        s, p, o = triple
+        return (s, p, self.signature(o))
+
+    def nodes(self, node: BNode) -> Set[BNode]:
+        found, stack = set(), [node]
+        while stack:
+            current = stack.pop()
+            if current not in found:
+                found.add(current)
+                stack.extend(o for o in self.graph.objects(current) if isinstance(o, BNode))
+        return found
+
+    def subtree(self, link) -> List[tuple]:
+        """
+        The link triple and every triple of the structure below it.
+        """
+        triples = [link]
+        for node in self.nodes(link[2]):
+            triples.extend((node, p, o) for p, o in self.graph.predicate_objects(node))
+        return triples
+
+
+def graph_base_iri(graph: rdflib.Graph) -> str:
+    for prefix, ns in graph.namespaces():
+        if prefix == "":
+            return str(ns)
+    return DEFAULT_BASE_IRI
+
+
+def reconcile_fragment(fragment: rdflib.Graph, index: OntologyIndex) -> rdflib.Graph:
+    """
+    Rewrites the IRIs of `fragment` onto the existing entities they match
+    (by label, then local name). Ontology headers and per-chunk provenance of
+    the fragment are dropped; they mean nothing in the target graph.
+    """
+    drop = set(fragment.subjects(RDF.type, OWL.Ontology))
+    chunk_props = {s for s in fragment.subjects(RDF.type, OWL.AnnotationProperty)
+                   if local_name(s) == "sourceChunk"}
+    drop |= chunk_props
+
+    mapping = {}
+    for s in set(fragment.subjects()):
+        if isinstance(s, URIRef) and s not in drop:
+            label = fragment.value(s, RDFS.label)
+            target = index.find(str(label) if label is not None else None, s)
+            if target is not None and target != s:
+                mapping[s] = target
+
+    out = rdflib.Graph()
+    for s, p, o in fragment:
+        if s in drop or p in chunk_props:
+            continue
+        out.add((mapping.get(s, s), mapping.get(p, p), mapping.get(o, o)))
+    return out
+
+
+def apply_fragment(existing_ttl: str, fragment: rdflib.Graph, document: str,
+                   output_ttl: Optional[str] = None, use_cache: bool = True,
+                   graph: Optional[rdflib.Graph] = None) -> Dict:
+    """
+    Merges `fragment` (the graph of one document's extraction) into the
+    ontology at `existing_ttl` and writes the updated graph to `output_ttl`
+    (default: in place) plus <output stem>.delta.trig / .delta.json.
+    `graph` is the already loaded existing ontology, if the caller has it.
+    Returns the delta summary.
+    """
+    output_ttl = output_ttl or existing_ttl
+    if graph is None:
+        with metrics.span("incremental_load"):
+            graph = load_existing(existing_ttl, use_cache)
+    ns = rdflib.Namespace(graph_base_iri(graph))
+    source_document = ns.sourceDocument
+
+    with metrics.span("incremental_diff"):
+        index = OntologyIndex(graph, source_document)
+        fragment = reconcile_fragment(fragment, index)
+        doc_literal = Literal(document)
+
+        new_subjects = {s for s in fragment.subjects() if isinstance(s, URIRef)}
+        owned = index.owned_by(document)
+        added, removed = rdflib.Graph(), rdflib.Graph()
+        blanks, new_blanks = BlankNodeIndex(graph), BlankNodeIndex(fragment)
+
+        if (source_document, RDF.type, OWL.AnnotationProperty) not in graph:
+            added.add((source_document, RDF.type, OWL.AnnotationProperty))
+            added.add((source_document, RDFS.label, Literal("source document")))
+
+        # Owned entities: the new extraction replaces what this document said
+        for s in owned:
+            keep = s in new_subjects
+            for p, o in graph.predicate_objects(s):
+                if isinstance(o, BNode):
+                    if not keep or blanks.key((s, p, o)) not in new_blanks.links:
+                        for triple in blanks.subtree((s, p, o)):
+                            removed.add(triple)
+                elif not keep or ((s, p, o) not in fragment and (p, o) != (source_document, doc_literal)):
+                    removed.add((s, p, o))
+            if not keep:
+                for s2, p2 in graph.subject_predicates(s):
+                    if isinstance(s2, BNode):
+                        # e.g. a restriction on another class pointing here
+                        if s2 in blanks.owner:
+                            for triple in blanks.subtree(blanks.owner[s2]):
+                                removed.add(triple)
+                    else:
+                        removed.add((s2, p2, s))
+
+        for s, p, o in fragment:
+            if isinstance(s, BNode):
+                continue  # added with the link above it
+            if isinstance(o, BNode):
+                if new_blanks.key((s, p, o)) not in blanks.links:
+                    for triple in new_blanks.subtree((s, p, o)):
+                        added.add(triple)
+                continue
+            if (s, p, o) in graph:
+                continue
+            if s in index.subjects and s not in owned and p in DESCRIPTIVE_PREDICATES:
+                # Curated / shared entity: fill gaps, never overwrite
+                if p == RDFS.label or graph.value(s, p) is not None:
+                    continue
+            added.add((s, p, o))
+        # Curated entities (no provenance yet) stay untagged, so they can
+        # never become owned by a document and be rewritten by it
+        for s in new_subjects:
+            if s not in index.subjects or s in index.documents:
+                if (s, source_document, doc_literal) not in graph:
+                    added.add((s, source_document, doc_literal))
+
+    changed = ({s for s, _, _ in added} | {s for s, _, _ in removed}) & index.subjects
+    summary = {
+        "document": document,
+        "graph": output_ttl,
+        "triples_before": len(graph),
+        "added": len(added),
+        "removed": len(removed),
+        "added_entities": sorted(str(s) for s in new_subjects - index.subjects),
+        "changed_entities": sorted(str(s) for s in changed - owned.difference(new_subjects) - {source_document}),
+        "removed_entities": sorted(str(s) for s in owned - new_subjects),
+    }
+
+    with metrics.span("incremental_write"):
+        for triple in removed:
+            graph.remove(triple)
+        for triple in added:
+            graph.add(triple)
+        summary["triples_after"] = len(graph)
+        _write_graph(graph, existing_ttl, output_ttl, added, removed)
+
+        stem = os.path.splitext(output_ttl)[0]
+        delta = rdflib.Dataset()
+        for prefix, namespace in graph.namespaces():
+            delta.bind(prefix, namespace)
+        delta.graph(DELTA_ADDED).addN((s, p, o, delta.graph(DELTA_ADDED)) for s, p, o in added)
+        delta.graph(DELTA_REMOVED).addN((s, p, o, delta.graph(DELTA_REMOVED)) for s, p, o in removed)
+        delta.serialize(destination=f"{stem}.delta.trig", format="trig")
+        with open(f"{stem}.delta.json", "w", encoding="utf-8") as f:
+            json.dump(summary, f, indent=2)
+
+    metrics.incr("incremental_triples_added", len(added))
+    metrics.incr("incremental_triples_removed", len(removed))
+    print(f"[INFO] Merged '{document}' into {output_ttl}: +{len(added)} / -{len(removed)} triples, "
+          f"{len(summary['added_entities'])} new, {len(summary['changed_entities'])} changed, "
+          f"{len(summary['removed_entities'])} removed entities")
+    return summary
+
+
+def _write_graph(graph: rdflib.Graph, existing_ttl: str, output_ttl: str,
+                 added: rdflib.Graph, removed: rdflib.Graph):
+    """
+    Pure additions to the same file are appended as a Turtle block (prefix
+    redeclarations are legal mid-document), so a large curated file is not
+    re-serialized for a handful of new triples. Anything else is rewritten.
+    """
+    if not len(removed) and os.path.abspath(output_ttl) == os.path.abspath(existing_ttl):
+        if not len(added):
+            return
+        for prefix, namespace in graph.namespaces():
+            added.bind(prefix, namespace, override=True, replace=True)
+        with open(output_ttl, "a", encoding="utf-8") as f:
+            f.write("\n" + added.serialize(format="turtle"))
+        return
+    tmp_path = f"{output_ttl}.{os.getpid()}.tmp"
+    graph.serialize(destination=tmp_path, format="turtle")
+    os.replace(tmp_path, output_ttl)
+
+
+def apply_merged(existing_ttl: str, merged: Dict, document: str,
+                 output_ttl: Optional[str] = None, use_cache: bool = True) -> Dict:
+    """
+    apply_fragment for merge_partial_json output; new IRIs are minted in the
+    existing graph's default namespace.
+    """
+    with metrics.span("incremental_load"):
+        graph = load_existing(existing_ttl, use_cache)
+    fragment = merged_json_to_graph(merged, base_iri=graph_base_iri(graph))
+    return apply_fragment(existing_ttl, fragment, document, output_ttl, use_cache, graph=graph)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Merge one document's extraction into an existing ontology")
+    parser.add_argument("existing_ttl", help="ontology to update, e.g. ground.ttl")
+    parser.add_argument("extraction", help="merged_ontology.json / .ontb, or a .ttl produced for one document")
+    parser.add_argument("--document", default=None, help="provenance name (default: extraction's parent dir or stem)")
+    parser.add_argument("--output", default=None, help="write the updated graph here instead of in place")
+    args = parser.parse_args()
+
+    document = args.document
+    if document is None:
+        stem = os.path.splitext(os.path.basename(args.extraction))[0]
+        parent = os.path.basename(os.path.dirname(os.path.abspath(args.extraction)))
+        document = parent if stem.startswith("merged_ontology") else stem
+
+    if args.extraction.endswith(".ttl"):
+        fragment = rdflib.Graph().parse(args.extraction, format="turtle")
+        apply_fragment(args.existing_ttl, fragment, document, args.output)
+    else:
+        if args.extraction.endswith(STORE_SUFFIX):
+            merged = load_merged(args.extraction)
+        else:
+            with open(args.extraction, "r", encoding="utf-8") as f:
+                merged = json.load(f)
+        apply_merged(args.existing_ttl, merged, document, args.output)
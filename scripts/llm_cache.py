@@ -0,0 +1,141 @@
+# scripts/llm_cache.py
+import os
+import json
+import hashlib
+import threading
+from typing import Dict, List, Optional
+
+#########################################
+#  Cache configuration
+#########################################
+CACHE_DIR = os.getenv("LLM_CACHE_DIR", "data/llm_cache")
+CACHE_MAX_BYTES = int(os.getenv("LLM_CACHE_MAX_BYTES", str(512 * 1024 * 1024)))
+# When set, lookups always miss but fresh responses are still written,
+# which is how a stale entry gets refreshed.
+CACHE_BYPASS = os.getenv("LLM_CACHE_BYPASS", "").lower() in ("1", "true", "yes")
+
+
+def make_cache_key(model: str, messages: List[Dict], **params) -> str:
+    """
+    Content address for one chat completion: a SHA-256 over the model, the
+    full message list (system + user prompts) and any request parameters.
+    """
+    payload = json.dumps(
+        {"model": model, "messages": messages, "params": params},
+        sort_keys=True,
+        ensure_ascii=False,
+    )
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class LLMCache:
+    """
+    Persistent, size-bounded response cache. Each entry is one JSON file at
+    <cache_dir>/<key[:2]>/<key>.json; a hit refreshes the file's mtime so the
+    oldest mtime is always the least recently used entry when evicting.
+    """
+
+    def __init__(self, cache_dir=CACHE_DIR, max_bytes=CACHE_MAX_BYTES, bypass=CACHE_BYPASS):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.bypass = bypass
+        self.hits = 0
+        self.misses = 0
+        self.bytes_saved = 0
+        self.evictions = 0
+        self._lock = threading.Lock()
+        self._sizes = None  # path -> size, loaded lazily on first write
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.cache_dir, key[:2], f"{key}.json")
+
+    def get(self, key: str) -> Optional[str]:
+        """
+        Returns the cached response content for `key`, or None on a miss.
+        """
+        path = self._path(key)
+        if self.bypass or not os.path.exists(path):
+            with self._lock:
+                self.misses += 1
+            return None
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                entry = json.load(f)
+            os.utime(path, None)
+        except (OSError, json.JSONDecodeError):
+            with self._lock:
+                self.misses += 1
+            return None
+        content = entry["content"]
+        with self._lock:
+            self.hits += 1
+            self.bytes_saved += len(content.encode("utf-8"))
+        return content
+
+    def contains(self, key: str) -> bool:
+        """
+        Whether get(key) would hit, without reading the entry or counting it.
+        """
+        return not self.bypass and os.path.exists(self._path(key))
+
+    def put(self, key: str, content: str, model: str = None):
+        """
+        Stores `content` under `key` and evicts least recently used entries
+        until the cache fits within max_bytes.
+        """
+        path = self._path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.{threading.get_ident()}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({"model": model, "content": content}, f, ensure_ascii=False)
+        os.replace(tmp_path, path)
+
+        with self._lock:
+            sizes = self._load_sizes()
+            sizes[path] = os.path.getsize(path)
+            self._evict(sizes)
+
+    def _load_sizes(self) -> Dict[str, int]:
+        if self._sizes is None:
+            self._sizes = {}
+            for root, _, files in os.walk(self.cache_dir):
+                for name in files:
+                    if name.endswith(".json"):
+                        p = os.path.join(root, name)
+                        self._sizes[p] = os.path.getsize(p)
+        return self._sizes
+
+    def _evict(self, sizes: Dict[str, int]):
+        total = sum(sizes.values())
+        if total <= self.max_bytes:
+            return
+        by_age = sorted(sizes, key=lambda p: os.path.getmtime(p) if os.path.exists(p) else 0)
+        for p in by_age:
+            if total <= self.max_bytes:
+                break
+            total -= sizes.pop(p)
+            try:
+                os.remove(p)
+            except OSError:
+                pass
+            self.evictions += 1
+
+    def stats(self) -> Dict:
+        with self._lock:
+            sizes = self._load_sizes()
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "bytes_saved": self.bytes_saved,
+                "evictions": self.evictions,
+                "entries": len(sizes),
+                "cache_bytes": sum(sizes.values()),
+                "bypass": self.bypass,
+            }
+
+    def report(self) -> str:
+        s = self.stats()
+        return (f"[CACHE] hits={s['hits']} misses={s['misses']} "
+                f"bytes_saved={s['bytes_saved']} entries={s['entries']} "
+                f"size={s['cache_bytes']}/{self.max_bytes} evictions={s['evictions']}"
+                + (" (bypass)" if s["bypass"] else ""))
@@ -0,0 +1,302 @@
+# scripts/llm_client.py
+import os
+import time
+import random
+import threading
+from typing import Optional
+
+from openai import OpenAI, APIStatusError, APITimeoutError, APIConnectionError
+
+from metrics import metrics
+
+try:
+    import httpx
+except ImportError:  # optional: the SDK's own default pool is used instead
+    httpx = None
+
+#########################################
+#  Resilient shared LLM client
+#########################################
+# One OpenAI client (one pooled HTTP connection pool) for every call site,
+# with our own retry policy instead of the SDK's:
+#   - 429 / 5xx / timeouts / connection errors are retried with full-jitter
+#     exponential backoff; a Retry-After header wins over the computed delay
+#   - in-flight requests are capped by an AIMD limit: halved on a 429,
+#     raised by one after a window of successes, so concurrency settles just
+#     under the provider's limit instead of hammering it
+#   - a circuit breaker stops sending after a run of 5xx / connection
+#     failures and lets a single probe through once the cool-down has
+#     passed; callers queue behind it rather than fail. Rate limiting (429,
+#     or any reply with Retry-After) is not a failure: the provider is up
+#     and the AIMD limit already backs off
+
+LLM_TIMEOUT = float(os.getenv("LLM_TIMEOUT", "600"))
+LLM_CONNECT_TIMEOUT = float(os.getenv("LLM_CONNECT_TIMEOUT", "10"))
+LLM_MAX_RETRIES = int(os.getenv("LLM_MAX_RETRIES", "6"))
+LLM_BACKOFF_BASE = float(os.getenv("LLM_BACKOFF_BASE", "1.0"))
+LLM_BACKOFF_MAX = float(os.getenv("LLM_BACKOFF_MAX", "60"))
+# Upper bound of the adaptive limit; the pool is sized to match
+LLM_MAX_IN_FLIGHT = int(os.getenv("LLM_MAX_IN_FLIGHT", "16"))
+LLM_BREAKER_FAILURES = int(os.getenv("LLM_BREAKER_FAILURES", "8"))
+LLM_BREAKER_COOLDOWN = float(os.getenv("LLM_BREAKER_COOLDOWN", "30"))
+# Callers give up (CircuitOpenError) after waiting this long for the circuit
+LLM_BREAKER_MAX_WAIT = float(os.getenv("LLM_BREAKER_MAX_WAIT", "600"))
+
+RETRYABLE_STATUS = {408, 409, 429, 500, 502, 503, 504}
+
+
+class CircuitOpenError(RuntimeError):
+    """The circuit stayed open for longer than a caller is willing to wait."""
+
+
+def retry_after_seconds(error) -> Optional[float]:
+    """
+    Delay requested by the server (retry-after-ms / retry-after, seconds
+    only), or None.
+    """
+    response = getattr(error, "response", None)
+    headers = getattr(response, "headers", None)
+    if not headers:
+        return None
+    for name, scale in (("retry-after-ms", 0.001), ("retry-after", 1.0)):
+        value = headers.get(name)
+        if value is None:
+            continue
+        try:
+            return max(0.0, float(value) * scale)
+        except ValueError:
+            continue  # HTTP-date form: fall back to our own backoff
+    return None
+
+
+def is_retryable(error) -> bool:
+    if isinstance(error, (APITimeoutError, APIConnectionError)):
+        return True
+    if isinstance(error, APIStatusError):
+        return error.status_code in RETRYABLE_STATUS
+    return False
+
+
+def is_breaker_failure(error) -> bool:
+    """
+    Failures that say the provider is down: 5xx, timeouts and connection
+    errors. Rate limiting and replies that name a retry delay do not count.
+    """
+    if isinstance(error, (APITimeoutError, APIConnectionError)):
+        return True
+    if isinstance(error, APIStatusError):
+        return error.status_code >= 500 and retry_after_seconds(error) is None
+    return False
+
+
+def backoff_delay(attempt: int, base: float = LLM_BACKOFF_BASE, cap: float = LLM_BACKOFF_MAX) -> float:
+    """Full jitter: uniform in [0, min(cap, base * 2**attempt)]."""
+    return random.uniform(0, min(cap, base * (2 ** attempt)))
+
+
+class AdaptiveConcurrency:
+    """
+    Additive-increase / multiplicative-decrease cap on in-flight requests.
+    Decreases are rate limited to one per `cooldown` seconds, so a burst of
+    429s from requests that were already in flight halves the limit once.
+    """
+
+    def __init__(self, maximum: int = LLM_MAX_IN_FLIGHT, minimum: int = 1,
+                 initial: int = None, cooldown: float = 5.0):
+        self.maximum = maximum
+        self.minimum = minimum
+        self.limit = initial or maximum
+        self.cooldown = cooldown
+        self.in_flight = 0
+        self._successes = 0
+        self._last_decrease = 0.0
+        self._cond = threading.Condition()
+
+    def acquire(self):
+        with self._cond:
+            while self.in_flight >= self.limit:
+                self._cond.wait()
+            self.in_flight += 1
+
+    def release(self):
+        with self._cond:
+            self.in_flight -= 1
+            self._cond.notify()
+
+    def on_success(self):
+        with self._cond:
+            self._successes += 1
+            if self._successes >= self.limit and self.limit < self.maximum:
+                self.limit += 1
+                self._successes = 0
+                self._cond.notify()
+
+    def on_rate_limited(self):
+        with self._cond:
+            now = time.monotonic()
+            if now - self._last_decrease < self.cooldown:
+                return
+            self._last_decrease = now
+            self._successes = 0
+            self.limit = max(self.minimum, self.limit // 2)
+            metrics.incr("llm_concurrency_decreases")
+            print(f"[INFO] Rate limited: concurrency limit lowered to {self.limit}")
+
+
+class CircuitBreaker:
+    """
+    closed -> open after `failures` consecutive failed requests; open ->
+    half-open after `cooldown` seconds, where one probe request decides
+    between closed and open again. While the circuit is not closed,
+    before_request blocks; it only raises after `max_wait` seconds.
+    """
+
+    def __init__(self, failures: int = LLM_BREAKER_FAILURES, cooldown: float = LLM_BREAKER_COOLDOWN,
+                 max_wait: float = LLM_BREAKER_MAX_WAIT):
+        self.failures = failures
+        self.cooldown = cooldown
+        self.max_wait = max_wait
+        self.state = "closed"
+        self._consecutive = 0
+        self._opened_at = 0.0
+        self._cond = threading.Condition()
+
+    def before_request(self):
+        deadline = time.monotonic() + self.max_wait
+        waited = False
+        with self._cond:
+            while True:
+                now = time.monotonic()
+                if self.state == "closed":
+                    return
+                if self.state == "open" and now - self._opened_at >= self.cooldown:
+                    self.state = "half-open"
+                    return  # this caller is the probe
+                if now >= deadline:
+                    metrics.incr("llm_circuit_rejections")
+                    raise CircuitOpenError(
+                        f"LLM circuit still open after waiting {self.max_wait:.0f}s "
+                        f"({self._consecutive} consecutive failures)")
+                if not waited:
+                    waited = True
+                    metrics.incr("llm_circuit_waits")
+                if self.state == "open":
+                    remaining = self.cooldown - (now - self._opened_at)
+                else:
+                    remaining = self.cooldown  # half-open: woken by the probe's outcome
+                self._cond.wait(min(remaining, deadline - now))
+
+    def record_success(self):
+        with self._cond:
+            self._consecutive = 0
+            self.state = "closed"
+            self._cond.notify_all()
+
+    def record_failure(self):
+        with self._cond:
+            self._consecutive += 1
+            if self.state == "half-open" or self._consecutive >= self.failures:
+                if self.state != "open":
+                    metrics.incr("llm_circuit_opened")
+                    print(f"[ERROR] LLM circuit opened after {self._consecutive} consecutive failures")
+                self.state = "open"
+                self._opened_at = time.monotonic()
+            self._cond.notify_all()
+
+    def record_neutral(self):
+        """
+        A reply that says nothing about the provider's health (e.g. a 429).
+        A probe that gets one frees the probe slot for the next caller.
+        """
+        with self._cond:
+            if self.state == "half-open":
+                self.state = "open"
+                self._opened_at = time.monotonic() - self.cooldown
+                self._cond.notify_all()
+
+
+class _ReleasingStream:
+    """
+    Wraps an SDK Stream so the concurrency slot is held until the caller has
+    consumed or closed it.
+    """
+
+    def __init__(self, stream, release):
+        self._stream = stream
+        self._release = release
+
+    def __iter__(self):
+        return iter(self._stream)
+
+    def close(self):
+        try:
+            self._stream.close()
+        finally:
+            release, self._release = self._release, None
+            if release is not None:
+                release()
+
+
+class LLMClient:
+    """
+    Thread-safe wrapper around one OpenAI client; create() takes the same
+    arguments as client.chat.completions.create.
+    """
+
+    def __init__(self, api_key: str = None, base_url: str = None, max_retries: int = LLM_MAX_RETRIES,
+                 max_in_flight: int = LLM_MAX_IN_FLIGHT, sleep=time.sleep):
+        timeout = LLM_TIMEOUT
+        http_client = None
+        if httpx is not None:
+            timeout = httpx.Timeout(LLM_TIMEOUT, connect=LLM_CONNECT_TIMEOUT)
+            http_client = httpx.Client(
+                timeout=timeout,
+                limits=httpx.Limits(max_connections=max_in_flight,
+                                    max_keepalive_connections=max_in_flight))
+        kwargs = {"http_client": http_client} if http_client is not None else {}
+        self.openai = OpenAI(api_key=api_key or os.getenv("OPENAI_API_KEY"),
+                             base_url=base_url or os.getenv("OPENAI_BASE_URL") or None,
+                             timeout=timeout, max_retries=0, **kwargs)
+        self.max_retries = max_retries
+        self.concurrency = AdaptiveConcurrency(maximum=max_in_flight)
+        self.breaker = CircuitBreaker()
+        self._sleep = sleep
+
+    def create(self, **params):
+        model = params.get("model")
+        attempt = 0
+        while True:
+            self.breaker.before_request()
+            self.concurrency.acquire()
+            try:
+                result = self.openai.chat.completions.create(**params)
+            except Exception as e:
+                self.concurrency.release()
+                retryable = is_retryable(e)
+                if is_breaker_failure(e):
+                    self.breaker.record_failure()
+                elif retryable:
+                    self.breaker.record_neutral()
+                else:
+                    # e.g. a 400: the provider is up, the request is at fault
+                    self.breaker.record_success()
+                if getattr(e, "status_code", None) == 429:
+                    self.concurrency.on_rate_limited()
+                if not retryable or attempt >= self.max_retries:
+                    raise
+                delay = retry_after_seconds(e)
+                if delay is None:
+                    delay = backoff_delay(attempt)
+                reason = getattr(e, "status_code", None) or type(e).__name__
+                metrics.incr("llm_retries", model=model, reason=str(reason))
+                metrics.observe("llm_retry_wait", delay, model=model)
+                attempt += 1
+                self._sleep(delay)
+                continue
+
+            self.breaker.record_success()
+            self.concurrency.on_success()
+            if params.get("stream"):
+                return _ReleasingStream(result, self.concurrency.release)
+            self.concurrency.release()
+            return result
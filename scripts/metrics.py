@@ -0,0 +1,161 @@
+# scripts/metrics.py
+import os
+import json
+import time
+import uuid
+import threading
+from collections import defaultdict
+from contextlib import contextmanager
+from typing import Dict
+
+#########################################
+#  Run metrics (spans + counters)
+#########################################
+# One process-wide RunMetrics collects span timings (per stage, per chunk)
+# and counters (tokens, cache hits, bytes written, ...). The pipeline resets
+# it per document and exports JSON and Prometheus text files at the end.
+
+METRIC_PREFIX = "ontology"
+
+
+def _label_key(labels: Dict) -> tuple:
+    return tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+
+def _escape_label(value) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+class RunMetrics:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self, **run_labels):
+        with self._lock:
+            self.run_id = uuid.uuid4().hex[:12]
+            self.started_at = time.time()
+            self.run_labels = run_labels
+            self.spans = []
+            self.counters = defaultdict(float)
+
+    @contextmanager
+    def span(self, name: str, **labels):
+        """
+        Times the enclosed block. Spans are recorded even when the block
+        raises, with error=<exception type> added to the labels.
+        """
+        start = time.perf_counter()
+        wall_start = time.time()
+        error = None
+        try:
+            yield
+        except BaseException as e:
+            error = type(e).__name__
+            raise
+        finally:
+            seconds = time.perf_counter() - start
+            if error:
+                labels = dict(labels, error=error)
+            with self._lock:
+                self.spans.append({"name": name, "labels": labels,
+                                   "start": round(wall_start - self.started_at, 4),
+                                   "seconds": round(seconds, 6)})
+
+    def observe(self, name: str, seconds: float, **labels):
+        """
+        Records a duration measured elsewhere (e.g. time to first token)
+        alongside the spans.
+        """
+        with self._lock:
+            self.spans.append({"name": name, "labels": labels,
+                               "start": round(time.time() - seconds - self.started_at, 4),
+                               "seconds": round(seconds, 6)})
+
+    def incr(self, name: str, value: float = 1, **labels):
+        with self._lock:
+            self.counters[(name, _label_key(labels))] += value
+
+    def record_usage(self, usage, model: str):
+        """
+        Adds prompt/completion token counts from an OpenAI `usage` object.
+        """
+        if usage is None:
+            return
+        self.incr("llm_prompt_tokens", getattr(usage, "prompt_tokens", 0) or 0, model=model)
+        self.incr("llm_completion_tokens", getattr(usage, "completion_tokens", 0) or 0, model=model)
+
+    def span_summary(self) -> Dict[str, Dict]:
+        by_name = defaultdict(list)
+        for s in self.spans:
+            by_name[s["name"]].append(s["seconds"])
+        summary = {}
+        for name, values in by_name.items():
+            values.sort()
+            summary[name] = {
+                "count": len(values),
+                "total_s": round(sum(values), 4),
+                "p50_s": round(values[len(values) // 2], 4),
+                "max_s": round(values[-1], 4),
+            }
+        return summary
+
+    def to_dict(self) -> Dict:
+        with self._lock:
+            return {
+                "run_id": self.run_id,
+                "labels": self.run_labels,
+                "started_at": time.strftime("%Y-%m-%dT%H:%M:%S", time.localtime(self.started_at)),
+                "wall_seconds": round(time.time() - self.started_at, 3),
+                "stages": self.span_summary(),
+                "counters": [{"name": name, "labels": dict(labels), "value": value}
+                             for (name, labels), value in sorted(self.counters.items())],
+                "spans": list(self.spans),
+            }
+
+    def to_prometheus(self) -> str:
+        """
+        Prometheus text exposition: counters as <prefix>_<name>_total and
+        spans aggregated per name as a summary (_seconds_sum/_count).
+        Per-chunk span labels are left out to keep cardinality bounded.
+        """
+        def fmt(labels):
+            labels = dict(self.run_labels, **dict(labels))
+            if not labels:
+                return ""
+            inner = ",".join(f'{k}="{_escape_label(v)}"' for k, v in sorted(labels.items()))
+            return "{" + inner + "}"
+
+        lines = []
+        with self._lock:
+            names = sorted({name for name, _ in self.counters})
+            for name in names:
+                metric = f"{METRIC_PREFIX}_{name}_total"
+                lines.append(f"# TYPE {metric} counter")
+                for (n, labels), value in sorted(self.counters.items()):
+                    if n == name:
+                        lines.append(f"{metric}{fmt(labels)} {value:g}")
+            summary = self.span_summary()
+        if summary:
+            metric = f"{METRIC_PREFIX}_stage_seconds"
+            lines.append(f"# TYPE {metric} summary")
+            for name, s in sorted(summary.items()):
+                lines.append(f"{metric}_sum{fmt({'stage': name})} {s['total_s']:g}")
+                lines.append(f"{metric}_count{fmt({'stage': name})} {s['count']}")
+        return "\n".join(lines) + "\n"
+
+    def export(self, path_prefix: str):
+        """
+        Writes <path_prefix>.json and <path_prefix>.prom; returns both paths.
+        """
+        if os.path.dirname(path_prefix):
+            os.makedirs(os.path.dirname(path_prefix), exist_ok=True)
+        json_path, prom_path = f"{path_prefix}.json", f"{path_prefix}.prom"
+        with open(json_path, "w", encoding="utf-8") as f:
+            json.dump(self.to_dict(), f, indent=2)
+        with open(prom_path, "w", encoding="utf-8") as f:
+            f.write(self.to_prometheus())
+        return json_path, prom_path
+
+
+metrics = RunMetrics()
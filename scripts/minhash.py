@@ -0,0 +1,108 @@
+# scripts/minhash.py
+import re
+import zlib
+import random
+from collections import defaultdict
+from typing import Dict, Hashable, Iterable, List, Set, Tuple
+
+#########################################
+#  Shingling
+#########################################
+_WORD_RE = re.compile(r"[a-z0-9]+")
+_MERSENNE_PRIME = (1 << 61) - 1
+_MAX_HASH = (1 << 32) - 1
+
+
+def normalize_text(text: str) -> str:
+    return " ".join(_WORD_RE.findall(text.lower().replace("_", " ")))
+
+
+def char_shingles(text: str, n: int = 3) -> Set[str]:
+    """
+    Character n-grams of the normalized text, padded so short names still
+    produce a few shingles.
+    """
+    text = f" {normalize_text(text)} "
+    if len(text) <= n:
+        return {text}
+    return {text[i:i + n] for i in range(len(text) - n + 1)}
+
+
+def word_shingles(text: str, n: int = 3) -> Set[str]:
+    words = normalize_text(text).split()
+    if len(words) <= n:
+        return {" ".join(words)} if words else set()
+    return {" ".join(words[i:i + n]) for i in range(len(words) - n + 1)}
+
+
+def jaccard(a: Set, b: Set) -> float:
+    if not a or not b:
+        return 0.0
+    return len(a & b) / len(a | b)
+
+
+#########################################
+#  MinHash + LSH banding
+#########################################
+class MinHasher:
+    """
+    Deterministic MinHash over string shingles: crc32 base hashes mixed
+    through `num_perm` universal hash functions (a*x + b mod 2^61-1).
+    """
+
+    def __init__(self, num_perm: int = 64, seed: int = 1):
+        rng = random.Random(seed)
+        self.num_perm = num_perm
+        self._perms = [(rng.randrange(1, _MERSENNE_PRIME), rng.randrange(0, _MERSENNE_PRIME))
+                       for _ in range(num_perm)]
+
+    def signature(self, shingles: Iterable[str]) -> Tuple[int, ...]:
+        hashes = [zlib.crc32(s.encode("utf-8")) for s in shingles]
+        if not hashes:
+            return tuple([_MAX_HASH] * self.num_perm)
+        p = _MERSENNE_PRIME
+        return tuple(min(((a * h + b) % p) & _MAX_HASH for h in hashes) for a, b in self._perms)
+
+
+class LSHIndex:
+    """
+    Banded LSH over MinHash signatures: items whose signatures agree on all
+    rows of at least one band land in the same bucket. With b bands of r rows
+    the pair-detection probability is 1 - (1 - s^r)^b for Jaccard s.
+    """
+
+    def __init__(self, num_perm: int = 64, bands: int = 16):
+        if num_perm % bands:
+            raise ValueError("num_perm must be divisible by bands")
+        self.bands = bands
+        self.rows = num_perm // bands
+        self._buckets: Dict[Tuple[int, Tuple[int, ...]], List[Hashable]] = defaultdict(list)
+
+    def add(self, key: Hashable, signature: Tuple[int, ...]):
+        r = self.rows
+        for band in range(self.bands):
+            self._buckets[(band, signature[band * r:(band + 1) * r])].append(key)
+
+    def query(self, signature: Tuple[int, ...]) -> Set[Hashable]:
+        r = self.rows
+        found = set()
+        for band in range(self.bands):
+            found.update(self._buckets.get((band, signature[band * r:(band + 1) * r]), ()))
+        return found
+
+    def candidate_pairs(self, max_bucket_size: int = 200) -> Set[Tuple[Hashable, Hashable]]:
+        """
+        All pairs sharing a bucket. Buckets larger than `max_bucket_size` are
+        skipped: they come from degenerate shingles and would reintroduce
+        all-pairs cost.
+        """
+        pairs = set()
+        for members in self._buckets.values():
+            if len(members) < 2 or len(members) > max_bucket_size:
+                continue
+            for i in range(len(members)):
+                for j in range(i + 1, len(members)):
+                    a, b = members[i], members[j]
+                    if a != b:
+                        pairs.add((a, b) if str(a) < str(b) else (b, a))
+        return pairs
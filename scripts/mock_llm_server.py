@@ -0,0 +1,226 @@
+# scripts/mock_llm_server.py
+import re
+import json
+import time
+import random
+import argparse
+import threading
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+#########################################
+#  Local OpenAI-compatible stand-in
+#########################################
+# Only POST /v1/chat/completions is implemented -- the one endpoint the
+# pipeline uses -- both as a single JSON body and, for "stream": true, as
+# server-sent events. Responses are synthesized from the prompt so every stage
+# downstream of the LLM (JSON parsing, merge, TTL, visualization) gets
+# realistic input without spending API credits.
+
+_CAPITALIZED_RE = re.compile(r"\b([A-Z][a-z]+(?: [A-Z][a-z]+){0,2})\b")
+# Characters per streamed delta (roughly a few tokens, like the real API)
+STREAM_DELTA_CHARS = 16
+
+
+class MockConfig:
+    def __init__(self, latency=0.2, jitter=0.05, tokens_per_second=200.0,
+                 error_rate=0.0, rate_limit_rate=0.0, retry_after=1.0,
+                 max_entities=20, seed=None):
+        self.latency = latency                    # fixed time-to-first-token (s)
+        self.jitter = jitter                      # +/- uniform jitter on latency (s)
+        self.tokens_per_second = tokens_per_second  # generation throughput; 0 = instant
+        self.error_rate = error_rate              # fraction of 500 responses
+        self.rate_limit_rate = rate_limit_rate    # fraction of 429 responses
+        self.retry_after = retry_after            # Retry-After header on 429s
+        self.max_entities = max_entities
+        self.rng = random.Random(seed)
+        self.lock = threading.Lock()
+        self.requests = 0
+        self.errors = 0
+
+
+def _estimate_tokens(text):
+    return len(text) // 4 + 1
+
+
+def synthesize_partial(chunk):
+    """
+    A plausible partial ontology for `chunk`: capitalized phrases become
+    classes, consecutive ones are linked by a relationship.
+    """
+    names = []
+    seen = set()
+    for match in _CAPITALIZED_RE.findall(chunk):
+        if match.lower() not in seen:
+            seen.add(match.lower())
+            names.append(match)
+    entities = [{"name": n, "type": "Class", "description": f"{n} as described in the manual."}
+                for n in names]
+    relationships = [{"source": a["name"], "type": "related to", "target": b["name"], "properties": {}}
+                     for a, b in zip(entities, entities[1:])]
+    return {"entities": entities, "relationships": relationships}
+
+
+def synthesize_turtle(text):
+    names = list(dict.fromkeys(_CAPITALIZED_RE.findall(text)))[:50] or ["Thing"]
+    lines = ["@prefix : <http://www.example.org/ontology#> .",
+             "@prefix owl: <http://www.w3.org/2002/07/owl#> .",
+             "@prefix rdfs: <http://www.w3.org/2000/01/rdf-schema#> .", ""]
+    for i, n in enumerate(names):
+        local = re.sub(r"\W", "", n.title())
+        lines.append(f":{local} a owl:Class ; rdfs:label \"{n}\" .")
+        if i:
+            parent = re.sub(r"\W", "", names[0].title())
+            lines.append(f":{local} rdfs:subClassOf :{parent} .")
+    return "\n".join(lines)
+
+
+def synthesize_reply(prompt, config):
+    """
+    Reply text shaped like the real model's: fenced, because the pipeline's
+    cleaners strip the first and last line.
+    """
+    if "Document chunk:" in prompt and "JSON" in prompt:
+        chunk = prompt.rsplit("Document chunk:", 1)[-1]
+        partial = synthesize_partial(chunk)
+        partial["entities"] = partial["entities"][:config.max_entities]
+        partial["relationships"] = partial["relationships"][:config.max_entities]
+        return "```json\n" + json.dumps(partial) + "\n```"
+    return "```turtle\n" + synthesize_turtle(prompt) + "\n```"
+
+
+class MockHandler(BaseHTTPRequestHandler):
+    config: MockConfig = None
+
+    def log_message(self, format, *args):  # keep benchmark output clean
+        pass
+
+    def _send_json(self, status, payload, headers=None):
+        body = json.dumps(payload).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        for k, v in (headers or {}).items():
+            self.send_header(k, v)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_POST(self):
+        if not self.path.rstrip("/").endswith("/chat/completions"):
+            self._send_json(404, {"error": {"message": "not found"}})
+            return
+        length = int(self.headers.get("Content-Length", 0))
+        request = json.loads(self.rfile.read(length) or b"{}")
+        config = self.config
+
+        with config.lock:
+            config.requests += 1
+            roll = config.rng.random()
+            delay = max(0.0, config.latency + config.rng.uniform(-config.jitter, config.jitter))
+        if roll < config.rate_limit_rate:
+            with config.lock:
+                config.errors += 1
+            self._send_json(429, {"error": {"message": "Rate limit reached", "type": "rate_limit_error"}},
+                            {"Retry-After": str(config.retry_after)})
+            return
+        if roll < config.rate_limit_rate + config.error_rate:
+            with config.lock:
+                config.errors += 1
+            time.sleep(delay)
+            self._send_json(500, {"error": {"message": "Internal server error", "type": "server_error"}})
+            return
+
+        prompt = "\n".join(m.get("content", "") for m in request.get("messages", []))
+        reply = synthesize_reply(prompt, config)
+        completion_tokens = _estimate_tokens(reply)
+        usage = {
+            "prompt_tokens": _estimate_tokens(prompt),
+            "completion_tokens": completion_tokens,
+            "total_tokens": _estimate_tokens(prompt) + completion_tokens,
+        }
+        if request.get("stream"):
+            time.sleep(delay)
+            include_usage = (request.get("stream_options") or {}).get("include_usage")
+            self._send_stream(request, reply, usage if include_usage else None)
+            return
+        if config.tokens_per_second:
+            delay += completion_tokens / config.tokens_per_second
+        time.sleep(delay)
+
+        self._send_json(200, {
+            "id": f"chatcmpl-mock-{config.requests}",
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": request.get("model", "mock"),
+            "choices": [{
+                "index": 0,
+                "message": {"role": "assistant", "content": reply},
+                "finish_reason": "stop",
+            }],
+            "usage": usage,
+        })
+
+    def _send_stream(self, request, reply, usage):
+        """
+        Sends `reply` as chat.completion.chunk events paced at the configured
+        tokens_per_second, then an optional usage event and [DONE]. A client
+        that closes the connection early simply ends the stream.
+        """
+        config = self.config
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Cache-Control", "no-cache")
+        self.end_headers()
+        base = {"id": f"chatcmpl-mock-{config.requests}", "object": "chat.completion.chunk",
+                "created": int(time.time()), "model": request.get("model", "mock")}
+
+        def event(choices, **extra):
+            payload = dict(base, choices=choices, **extra)
+            self.wfile.write(b"data: " + json.dumps(payload).encode("utf-8") + b"\n\n")
+            self.wfile.flush()
+
+        try:
+            event([{"index": 0, "delta": {"role": "assistant", "content": ""}, "finish_reason": None}])
+            for i in range(0, len(reply), STREAM_DELTA_CHARS):
+                piece = reply[i:i + STREAM_DELTA_CHARS]
+                if config.tokens_per_second:
+                    time.sleep(_estimate_tokens(piece) / config.tokens_per_second)
+                event([{"index": 0, "delta": {"content": piece}, "finish_reason": None}])
+            event([{"index": 0, "delta": {}, "finish_reason": "stop"}])
+            if usage is not None:
+                event([], usage=usage)
+            self.wfile.write(b"data: [DONE]\n\n")
+            self.wfile.flush()
+        except (BrokenPipeError, ConnectionResetError):
+            pass
+
+
+def start_mock_server(host="127.0.0.1", port=0, **config_kwargs):
+    """
+    Starts the server on a daemon thread. Returns (server, base_url); point
+    the OpenAI client at it with OPENAI_BASE_URL=base_url.
+    """
+    handler = type("ConfiguredMockHandler", (MockHandler,), {"config": MockConfig(**config_kwargs)})
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://{host}:{server.server_address[1]}/v1"
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Local OpenAI-compatible mock for offline runs")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--latency", type=float, default=0.2)
+    parser.add_argument("--jitter", type=float, default=0.05)
+    parser.add_argument("--tokens-per-second", type=float, default=200.0)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--rate-limit-rate", type=float, default=0.0)
+    args = parser.parse_args()
+
+    server, url = start_mock_server(port=args.port, latency=args.latency, jitter=args.jitter,
+                                    tokens_per_second=args.tokens_per_second,
+                                    error_rate=args.error_rate, rate_limit_rate=args.rate_limit_rate)
+    print(f"[INFO] Mock LLM listening on {url} (export OPENAI_BASE_URL={url})")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        server.shutdown()
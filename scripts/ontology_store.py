@@ -0,0 +1,464 @@
+# scripts/ontology_store.py
+import os
+import sys
+import json
+import mmap
+import struct
+import argparse
+from array import array
+from typing import Dict, Iterator, List, Optional
+
+#########################################
+#  Compact ontology store
+#########################################
+# The merged ontology as interned strings plus flat uint32 columns instead of
+# dicts of dicts: entity and relationship records are rows in `array`s, list
+# fields (source chunks) are CSR offset/value pairs, and outgoing/incoming
+# relationships per entity are CSR adjacency indexes. The same columns are
+# written to a binary file that load() memory-maps, so reopening a merged
+# corpus is a few page faults instead of a JSON parse.
+#
+# Entity schema fields and property dicts are stored as interned compact JSON
+# strings; most entities share the same few ({"type":"Class"}, {}), so they
+# cost one id each. Relationship provenance keys are kept verbatim (names
+# may contain the "|" that joins them).
+#
+# The merge itself still runs on dicts (generate_ontology.PartialMerger);
+# the store changes the size of the saved result and the time to reopen it,
+# not the memory the merge needs.
+
+MAGIC = b"ONTB"
+FORMAT_VERSION = 2
+STORE_SUFFIX = ".ontb"
+_HEADER = struct.Struct("<4sIII")        # magic, version, section count, reserved
+_SECTION = struct.Struct("<16sQQ")       # name, offset, length
+_COMPACT = {"separators": (",", ":"), "ensure_ascii": False}
+
+assert array("I").itemsize == 4, "uint32 columns need a 4-byte array('I')"
+
+# Keep in sync with generate_ontology.ENTITY_SCHEMA_FIELDS
+ENTITY_SCHEMA_FIELDS = ('type', 'superclasses', 'class_membership', 'domain', 'range')
+
+
+def _u32(values=()) -> array:
+    return array("I", values)
+
+
+class StringPool:
+    """
+    Interned strings addressed by id. Built in memory with intern(); a
+    loaded pool decodes from the mapped blob on first access per id.
+    """
+    __slots__ = ("_ids", "_strings", "_offsets", "_blob")
+
+    def __init__(self):
+        self._ids: Optional[Dict[str, int]] = {}
+        self._strings: List[Optional[str]] = []
+        self._offsets = None
+        self._blob = None
+
+    @classmethod
+    def from_buffers(cls, offsets, blob) -> "StringPool":
+        pool = cls()
+        pool._ids = None  # built lazily by id_of()
+        pool._strings = [None] * (len(offsets) - 1)
+        pool._offsets, pool._blob = offsets, blob
+        return pool
+
+    def intern(self, s: str) -> int:
+        ids = self._index()
+        sid = ids.get(s)
+        if sid is None:
+            sid = ids[s] = len(self._strings)
+            self._strings.append(s)
+        return sid
+
+    def id_of(self, s: str) -> Optional[int]:
+        return self._index().get(s)
+
+    def _index(self) -> Dict[str, int]:
+        if self._ids is None:
+            self._ids = {self[i]: i for i in range(len(self._strings))}
+        return self._ids
+
+    def __getitem__(self, sid: int) -> str:
+        s = self._strings[sid]
+        if s is None:
+            s = self._strings[sid] = str(self._blob[self._offsets[sid]:self._offsets[sid + 1]], "utf-8")
+        return s
+
+    def __len__(self):
+        return len(self._strings)
+
+    def encode(self):
+        """(offsets array, utf-8 blob) for the binary format."""
+        offsets, parts, end = _u32([0]), [], 0
+        for i in range(len(self._strings)):
+            data = self[i].encode("utf-8")
+            parts.append(data)
+            end += len(data)
+            offsets.append(end)
+        return offsets, b"".join(parts)
+
+
+class CSR:
+    """
+    Compressed sparse rows: row i is values[offsets[i]:offsets[i + 1]].
+    """
+    __slots__ = ("offsets", "values")
+
+    def __init__(self, offsets=None, values=None):
+        self.offsets = offsets if offsets is not None else _u32([0])
+        self.values = values if values is not None else _u32()
+
+    def append_row(self, row):
+        self.values.extend(row)
+        self.offsets.append(len(self.values))
+
+    def row(self, i: int):
+        return self.values[self.offsets[i]:self.offsets[i + 1]]
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    @classmethod
+    def group(cls, keys, n_rows: int) -> "CSR":
+        """Row k lists the positions j with keys[j] == k, in ascending order."""
+        counts = [0] * (n_rows + 1)
+        for k in keys:
+            counts[k + 1] += 1
+        for i in range(n_rows):
+            counts[i + 1] += counts[i]
+        offsets = _u32(counts)
+        values = _u32(bytes(4 * len(keys)))
+        fill = list(counts[:-1])
+        for j, k in enumerate(keys):
+            values[fill[k]] = j
+            fill[k] += 1
+        return cls(offsets, values)
+
+
+class EntityView:
+    __slots__ = ("store", "index")
+
+    def __init__(self, store: "OntologyStore", index: int):
+        self.store, self.index = store, index
+
+    @property
+    def key(self) -> str:
+        return self.store.strings[self.store.ent_key[self.index]]
+
+    @property
+    def name(self) -> str:
+        return self.store.strings[self.store.ent_name[self.index]]
+
+    @property
+    def description(self) -> str:
+        return self.store.strings[self.store.ent_desc[self.index]]
+
+    @property
+    def properties(self) -> Dict:
+        return json.loads(self.store.strings[self.store.ent_props[self.index]])
+
+    @property
+    def fields(self) -> Dict:
+        return json.loads(self.store.strings[self.store.ent_fields[self.index]])
+
+    @property
+    def source_chunks(self) -> List[int]:
+        return list(self.store.ent_sources.row(self.index))
+
+    def outgoing(self) -> Iterator["RelationshipView"]:
+        return (RelationshipView(self.store, r) for r in self.store.adj_out.row(self.index))
+
+    def incoming(self) -> Iterator["RelationshipView"]:
+        return (RelationshipView(self.store, r) for r in self.store.adj_in.row(self.index))
+
+    def to_dict(self) -> Dict:
+        entity = {
+            'id': self.key,
+            'name': self.name,
+            'description': self.description,
+            'properties': self.properties,
+            'source_chunks': self.source_chunks,
+        }
+        entity.update(self.fields)
+        return entity
+
+    def __repr__(self):
+        return f"EntityView({self.key!r})"
+
+
+class RelationshipView:
+    __slots__ = ("store", "index")
+
+    def __init__(self, store: "OntologyStore", index: int):
+        self.store, self.index = store, index
+
+    @property
+    def source(self) -> EntityView:
+        return EntityView(self.store, self.store.rel_src[self.index])
+
+    @property
+    def target(self) -> EntityView:
+        return EntityView(self.store, self.store.rel_tgt[self.index])
+
+    @property
+    def type(self) -> str:
+        return self.store.strings[self.store.rel_type[self.index]]
+
+    @property
+    def properties(self) -> Dict:
+        return json.loads(self.store.strings[self.store.rel_props[self.index]])
+
+    def to_dict(self) -> Dict:
+        return {
+            'source': self.source.key,
+            'target': self.target.key,
+            'type': self.type,
+            'properties': self.properties,
+            'sources': list(self.store.rel_sources.row(self.index)),
+        }
+
+    def __repr__(self):
+        return f"RelationshipView({self.source.key!r} -{self.type}-> {self.target.key!r})"
+
+
+# Binary section name -> OntologyStore attribute (uint32 columns and CSRs)
+_COLUMNS = ("ent_key", "ent_name", "ent_desc", "ent_props", "ent_fields",
+            "rel_src", "rel_tgt", "rel_type", "rel_props",
+            "prov_key")
+# Version 1 split provenance keys on "|" into three columns
+_V1_PROVENANCE = ("prov_src", "prov_type", "prov_tgt")
+_CSRS = ("ent_sources", "rel_sources", "adj_out", "adj_in", "prov_sources")
+
+
+class OntologyStore:
+    """
+    Column store for the output of generate_ontology.merge_partial_json.
+    from_merged()/to_merged() round-trip the merged dict exactly;
+    save()/load() use the memory-mapped binary format.
+    """
+
+    def __init__(self):
+        self.strings = StringPool()
+        for name in _COLUMNS:
+            setattr(self, name, _u32())
+        for name in _CSRS:
+            setattr(self, name, CSR())
+        self.meta: Dict = {}
+        self._key_index: Optional[Dict[int, int]] = None
+        self._mmap = None
+
+    # ---- building ----
+    @classmethod
+    def from_merged(cls, merged: Dict) -> "OntologyStore":
+        store = cls()
+        intern = store.strings.intern
+        index_of = {}
+        for entity in merged.get('entities', []):
+            index_of[entity['id']] = len(store.ent_key)
+            store.ent_key.append(intern(entity['id']))
+            store.ent_name.append(intern(entity['name']))
+            store.ent_desc.append(intern(entity.get('description', "")))
+            store.ent_props.append(intern(json.dumps(entity.get('properties', {}), **_COMPACT)))
+            fields = {f: entity[f] for f in ENTITY_SCHEMA_FIELDS if f in entity}
+            store.ent_fields.append(intern(json.dumps(fields, **_COMPACT)))
+            store.ent_sources.append_row(entity.get('source_chunks', []))
+
+        for rel in merged.get('relationships', []):
+            store.rel_src.append(index_of[rel['source']])
+            store.rel_tgt.append(index_of[rel['target']])
+            store.rel_type.append(intern(rel['type']))
+            store.rel_props.append(intern(json.dumps(rel.get('properties', {}), **_COMPACT)))
+            store.rel_sources.append_row(rel.get('sources', []))
+        store.build_adjacency()
+
+        provenance = merged.get('provenance', {})
+        for key, sources in provenance.get('relationship_sources', {}).items():
+            store.prov_key.append(intern(key))
+            store.prov_sources.append_row(sources)
+
+        store.meta = {k: v for k, v in merged.items()
+                      if k not in ('entities', 'relationships', 'provenance')}
+        return store
+
+    def build_adjacency(self):
+        n = len(self.ent_key)
+        self.adj_out = CSR.group(self.rel_src, n)
+        self.adj_in = CSR.group(self.rel_tgt, n)
+
+    # ---- access ----
+    def __len__(self):
+        return len(self.ent_key)
+
+    @property
+    def relationship_count(self) -> int:
+        return len(self.rel_src)
+
+    def entity(self, index: int) -> EntityView:
+        return EntityView(self, index)
+
+    def entities(self) -> Iterator[EntityView]:
+        return (EntityView(self, i) for i in range(len(self.ent_key)))
+
+    def relationships(self) -> Iterator[RelationshipView]:
+        return (RelationshipView(self, i) for i in range(len(self.rel_src)))
+
+    def find(self, key: str) -> Optional[EntityView]:
+        """Entity by normalized name (the merged 'id')."""
+        sid = self.strings.id_of(key)
+        if sid is None:
+            return None
+        if self._key_index is None:
+            self._key_index = {k: i for i, k in enumerate(self.ent_key)}
+        index = self._key_index.get(sid)
+        return None if index is None else EntityView(self, index)
+
+    def to_merged(self) -> Dict:
+        entities = [e.to_dict() for e in self.entities()]
+        s = self.strings
+        merged = {
+            'entities': entities,
+            'relationships': [r.to_dict() for r in self.relationships()],
+        }
+        merged.update({k: v for k, v in self.meta.items() if k == 'aliases'})
+        merged['provenance'] = {
+            'entity_sources': {e['id']: sorted(set(e['source_chunks'])) for e in entities},
+            'relationship_sources': {
+                s[self.prov_key[i]]: list(self.prov_sources.row(i))
+                for i in range(len(self.prov_key))
+            },
+        }
+        merged.update({k: v for k, v in self.meta.items() if k != 'aliases'})
+        return merged
+
+    def nbytes(self) -> int:
+        """Approximate size of the columns and string data."""
+        total = sum(len(getattr(self, n)) * 4 for n in _COLUMNS)
+        total += sum((len(c.offsets) + len(c.values)) * 4 for c in (getattr(self, n) for n in _CSRS))
+        offsets, blob = self.strings.encode()
+        return total + len(offsets) * 4 + len(blob)
+
+    # ---- binary format ----
+    def save(self, path: str) -> int:
+        """
+        Writes the store atomically; returns the file size in bytes.
+        """
+        offsets, blob = self.strings.encode()
+        sections = [("strings.off", offsets.tobytes()), ("strings.dat", blob)]
+        for name in _COLUMNS:
+            sections.append((name, getattr(self, name).tobytes()))
+        for name in _CSRS:
+            csr = getattr(self, name)
+            sections.append((name + ".off", csr.offsets.tobytes()))
+            sections.append((name + ".val", csr.values.tobytes()))
+        sections.append(("meta", json.dumps(self.meta, **_COMPACT).encode("utf-8")))
+
+        if sys.byteorder != "little":
+            sections = [(n, _swap(d) if n not in ("strings.dat", "meta") else d) for n, d in sections]
+
+        table_end = _HEADER.size + _SECTION.size * len(sections)
+        layout, pos = [], table_end
+        for name, data in sections:
+            pos += -pos % 8  # 8-byte alignment keeps the mapped casts cheap
+            layout.append((name, pos, len(data)))
+            pos += len(data)
+
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(_HEADER.pack(MAGIC, FORMAT_VERSION, len(sections), 0))
+            for name, offset, length in layout:
+                f.write(_SECTION.pack(name.encode("ascii"), offset, length))
+            for (name, offset, length), (_, data) in zip(layout, sections):
+                f.write(b"\0" * (offset - f.tell()))
+                f.write(data)
+            size = f.tell()
+        os.replace(tmp_path, path)
+        return size
+
+    @classmethod
+    def load(cls, path: str) -> "OntologyStore":
+        """
+        Memory-maps a file written by save(). Columns are zero-copy views of
+        the mapping; strings are decoded on first use.
+        """
+        with open(path, "rb") as f:
+            mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, count, _ = _HEADER.unpack_from(mm, 0)
+        if magic != MAGIC:
+            raise ValueError(f"{path} is not an ontology store")
+        if version not in (1, FORMAT_VERSION):
+            raise ValueError(f"{path} has format version {version}, expected {FORMAT_VERSION}")
+
+        view = memoryview(mm)
+        sections = {}
+        for i in range(count):
+            name, offset, length = _SECTION.unpack_from(mm, _HEADER.size + i * _SECTION.size)
+            sections[name.rstrip(b"\0").decode("ascii")] = view[offset:offset + length]
+
+        def column(name):
+            data = sections[name]
+            if sys.byteorder != "little":
+                return _u32(_swap(bytes(data)))
+            return data.cast("I")
+
+        store = cls()
+        store._mmap = mm
+        store.strings = StringPool.from_buffers(column("strings.off"), sections["strings.dat"])
+        for name in _COLUMNS:
+            if name in sections:
+                setattr(store, name, column(name))
+        if version == 1:
+            src, rel_type, tgt = (column(name) for name in _V1_PROVENANCE)
+            strings = store.strings
+            store.prov_key = _u32(strings.intern(f"{strings[a]}|{strings[b]}|{strings[c]}")
+                                  for a, b, c in zip(src, rel_type, tgt))
+        for name in _CSRS:
+            setattr(store, name, CSR(column(name + ".off"), column(name + ".val")))
+        store.meta = json.loads(bytes(sections["meta"]))
+        return store
+
+
+def _swap(data: bytes) -> bytes:
+    values = array("I", data)
+    values.byteswap()
+    return values.tobytes()
+
+
+def save_merged(merged: Dict, path: str) -> int:
+    """Builds a store from a merged dict and writes it; returns bytes written."""
+    return OntologyStore.from_merged(merged).save(path)
+
+
+def load_merged(path: str) -> Dict:
+    """Merged dict from either a binary store or a merged JSON file."""
+    if path.endswith(STORE_SUFFIX):
+        return OntologyStore.load(path).to_merged()
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Convert merged ontology JSON to the binary store and inspect it")
+    parser.add_argument("source", help="merged_ontology.json or a .ontb store")
+    parser.add_argument("output", nargs="?", help="write a .ontb store (or .json when reading a store)")
+    args = parser.parse_args()
+
+    if args.source.endswith(STORE_SUFFIX):
+        store = OntologyStore.load(args.source)
+    else:
+        with open(args.source, "r", encoding="utf-8") as f:
+            store = OntologyStore.from_merged(json.load(f))
+    print(f"[INFO] {len(store)} entities, {store.relationship_count} relationships, "
+          f"{len(store.strings)} distinct strings, ~{store.nbytes() / 1e6:.2f}MB")
+    if args.output:
+        if args.output.endswith(STORE_SUFFIX):
+            size = store.save(args.output)
+        else:
+            with open(args.output, "w", encoding="utf-8") as f:
+                json.dump(store.to_merged(), f, **_COMPACT)
+            size = os.path.getsize(args.output)
+        print(f"[DONE] Wrote {args.output} ({size} bytes)")
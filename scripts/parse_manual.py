@@ -1,14 +1,492 @@
 # scripts/parse_manual.py
+import os
+import re
+import json
+import hashlib
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, Iterator, List, Optional, Tuple
 import PyPDF2
+from metrics import metrics
 
-def extract_text_from_pdf(pdf_path):
-    text = []
+# Extracted page text is cached per PDF content hash, so re-running the
+# pipeline on an unchanged manual skips PDF parsing entirely.
+PAGE_CACHE_DIR = os.getenv("PAGE_CACHE_DIR", "data/page_cache")
+# Below this many pages the process-pool start-up costs more than it saves.
+MIN_PAGES_FOR_POOL = 16
+# Bumped whenever the cached page record (text + detected tables) changes
+LAYOUT_VERSION = 2
+
+
+def file_sha256(path: str) -> str:
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            h.update(block)
+    return h.hexdigest()
+
+
+def _extract_page_range(pdf_path: str, start: int, end: int,
+                        detect: bool = False) -> List[Tuple[int, str, List[Dict]]]:
+    """
+    Worker: extracts pages [start, end) and returns (1-based page number,
+    text, tables detected on the page). Without `detect` the layout is not
+    collected and the table list is empty. Each worker opens its own reader
+    since PdfReader objects are not picklable.
+    """
+    pages = []
     with open(pdf_path, 'rb') as file:
         reader = PyPDF2.PdfReader(file)
-        for page in reader.pages:
-            page_text = page.extract_text()
-            if page_text:
-                text.append(page_text)
-    return "\n".join(text)
+        for i in range(start, end):
+            if not detect:
+                pages.append((i + 1, reader.pages[i].extract_text() or "", []))
+                continue
+            text, fragments = _page_fragments(reader.pages[i])
+            tables = [dict(table, page=i + 1) for table in detect_tables(fragments)]
+            pages.append((i + 1, text, tables))
+    return pages
+
+
+def _page_cache_path(pdf_path: str, cache_dir: str, detect: bool = False) -> str:
+    # Table records depend on the detection thresholds, so they are part of the key
+    tables = f"tables{MIN_TABLE_ROWS}x{MIN_TABLE_COLUMNS}" if detect else "text"
+    key = f"{file_sha256(pdf_path)}-pypdf2-{PyPDF2.__version__}-layout{LAYOUT_VERSION}-{tables}"
+    return os.path.join(cache_dir, f"{key}.jsonl")
+
+
+def iter_pdf_pages(pdf_path, workers=None, pages_per_task=None,
+                   use_cache=True, cache_dir=PAGE_CACHE_DIR, with_tables=False) -> Iterator[Tuple]:
+    """
+    Lazily yields (page_number, page_text) for every page in order, or
+    (page_number, page_text, tables) with `with_tables`. Tables are only
+    detected with `with_tables` and TABLE_EXTRACTION on; otherwise the
+    list is empty and the layout pass is skipped.
+    Page ranges are extracted in a process pool; pages are yielded as soon as
+    their range is done, and the full result is written to the page cache
+    once the iterator has been consumed to the end.
+    """
+    detect = with_tables and TABLE_EXTRACTION
+    cache_path = _page_cache_path(pdf_path, cache_dir, detect) if use_cache else None
+    if cache_path and os.path.exists(cache_path):
+        metrics.incr("page_cache_hits")
+        with open(cache_path, "r", encoding="utf-8") as f:
+            for line in f:
+                page = json.loads(line)
+                yield tuple(page) if with_tables else tuple(page[:2])
+        return
+
+    with open(pdf_path, 'rb') as file:
+        num_pages = len(PyPDF2.PdfReader(file).pages)
+    metrics.incr("page_cache_misses")
+    metrics.incr("pages_extracted", num_pages)
+
+    workers = workers or os.cpu_count() or 1
+    if pages_per_task is None:
+        # A few tasks per worker keeps the pool busy when page cost is uneven
+        pages_per_task = max(1, -(-num_pages // (workers * 4)))
+    ranges = [(s, min(s + pages_per_task, num_pages)) for s in range(0, num_pages, pages_per_task)]
+
+    cache_file = None
+    if cache_path:
+        os.makedirs(cache_dir, exist_ok=True)
+        tmp_path = f"{cache_path}.{os.getpid()}.tmp"
+        cache_file = open(tmp_path, "w", encoding="utf-8")
+
+    try:
+        if workers == 1 or num_pages < MIN_PAGES_FOR_POOL:
+            results = (_extract_page_range(pdf_path, s, e, detect) for s, e in ranges)
+            for page_range in results:
+                for page in page_range:
+                    if cache_file:
+                        cache_file.write(json.dumps(page) + "\n")
+                    yield page if with_tables else page[:2]
+        else:
+            with ProcessPoolExecutor(max_workers=workers) as pool:
+                futures = [pool.submit(_extract_page_range, pdf_path, s, e, detect) for s, e in ranges]
+                try:
+                    for future in futures:
+                        for page in future.result():
+                            if cache_file:
+                                cache_file.write(json.dumps(page) + "\n")
+                            yield page if with_tables else page[:2]
+                finally:
+                    for future in futures:
+                        future.cancel()
+        if cache_file:
+            cache_file.close()
+            os.replace(tmp_path, cache_path)
+            cache_file = None
+    finally:
+        # Iterator abandoned or failed part-way: never leave a partial cache
+        if cache_file:
+            cache_file.close()
+            os.remove(tmp_path)
+
+
+def extract_pages_from_pdf(pdf_path, workers=None, use_cache=True) -> List[Tuple[int, str]]:
+    """
+    (page_number, text) for every non-empty page, e.g. for retrieval.
+    """
+    with metrics.span("parse_manual", pdf=os.path.basename(pdf_path)):
+        return [(page_number, page_text)
+                for page_number, page_text in iter_pdf_pages(pdf_path, workers=workers, use_cache=use_cache)
+                if page_text]
+
+
+def extract_text_from_pdf(pdf_path, workers=None, use_cache=True):
+    return "\n".join(text for _, text in extract_pages_from_pdf(pdf_path, workers, use_cache))
+
+
+def extract_pages_and_tables(pdf_path, workers=None, use_cache=True) -> Tuple[List[Tuple[int, str]], List[Dict]]:
+    """
+    (pages, tables): the prose of every non-empty page, with the lines of
+    detected tables removed, and the tables themselves (see detect_tables).
+    With TABLE_EXTRACTION off, pages hold the full text and tables is empty.
+    """
+    pages, tables = [], []
+    with metrics.span("parse_manual", pdf=os.path.basename(pdf_path)):
+        for page_number, text, page_tables in iter_pdf_pages(pdf_path, workers=workers, use_cache=use_cache,
+                                                             with_tables=True):
+            if page_tables:
+                text = strip_tables(text, page_tables)
+                tables.extend(page_tables)
+            if text:
+                pages.append((page_number, text))
+    if tables:
+        rows = sum(len(table["rows"]) for table in tables)
+        metrics.incr("tables_extracted", len(tables))
+        metrics.incr("table_rows_extracted", rows)
+        print(f"[INFO] Extracted {len(tables)} tables ({rows} rows) from '{pdf_path}' without the LLM")
+    return pages, tables
+
+
+#########################################
+#  Deterministic table extraction
+#########################################
+# Specification tables (weights, dimensions, capacities) are expensive to send
+# to the LLM and often come back mangled. They are found from the page layout
+# instead: PyPDF2 reports where every text fragment starts, fragments are
+# grouped into rows by y and into columns by x, and a run of rows with several
+# aligned, mostly numeric cells is a table. The header is the stack of rows
+# above it, the caption the line above that ("Table B1" + title). Each row
+# becomes an individual whose cells are data-property assertions
+# (tables_to_partial), in the same partial format the LLM produces, so it
+# goes straight into merge_partial_json; the table lines are removed from
+# the prose that is still extracted by the LLM. A table whose caption or
+# column titles do not read as labels (OCR debris, statistics printouts) is
+# rejected and its text stays in the prose.
+# Off by default until the detector has been validated on more manuals.
+
+TABLE_EXTRACTION = os.getenv("TABLE_EXTRACTION", "0").lower() in ("1", "true", "yes")
+MIN_TABLE_ROWS = int(os.getenv("MIN_TABLE_ROWS", "3"))
+MIN_TABLE_COLUMNS = int(os.getenv("MIN_TABLE_COLUMNS", "3"))
+# Fragments whose baselines differ by at most this much (points) share a row;
+# scanned pages are often slightly skewed
+ROW_TOLERANCE = 3.0
+# Cell starts closer than this (points) belong to the same column
+COLUMN_TOLERANCE = 8.0
+MAX_HEADER_ROWS = 6
+
+_NUMBER_RE = re.compile(r"^[-+]?(\d[\d,]*(\.\d+)?|\.\d+)%?$")
+_CELL_GAP_RE = re.compile(r"[ \t]{2,}")
+_LINE_BREAK_RE = re.compile(r"[ \t]*\n[ \t]*")
+_TABLE_LABEL_RE = re.compile(r"^(table|tab\.)\s*[\w.-]+$", re.IGNORECASE)
+_EDGE_PUNCT_RE = re.compile(r"^[^\w(]+|[^\w)%]+$")
+_WORD_RE = re.compile(r"[A-Za-z]{2,}")
+# Captions, column titles and row labels of statistics printouts (ANOVA,
+# regression estimates): aligned numbers, but nothing the ontology can name
+_STATISTICS_RE = re.compile(
+    r"analysis of variance|sum of squares|mean square|std\.? error|\b[ft] ratio\b|prob\s*>|"
+    r"\bnparm\b|\bdf\b|\bc total\b|\bintercept\b", re.IGNORECASE)
+
+
+def _page_fragments(page) -> Tuple[str, List[Tuple[float, float, str, float]]]:
+    """
+    The page text plus its fragments as (x, y, text, font size) in page
+    coordinates. PyPDF2 reports one position for all fragments of a text
+    object, so a multi-line cell stays in one row; a data row merged that
+    way is no longer numeric and simply stays in the prose.
+    """
+    fragments = []
+
+    def visit(text, cm, tm, font_dict, font_size):
+        if text.strip():
+            fragments.append((tm[4] * cm[0] + tm[5] * cm[2] + cm[4],
+                              tm[4] * cm[1] + tm[5] * cm[3] + cm[5],
+                              text, font_size or 0))
+
+    text = page.extract_text(visitor_text=visit) or ""
+    return text, fragments
+
+
+def _skew(fragments) -> float:
+    """
+    Page slope (dy/dx) of text lines on a skewed scan: the median slope
+    between consecutive fragments that continue the same line.
+    """
+    slopes = sorted((b[1] - a[1]) / (b[0] - a[0]) for a, b in zip(fragments, fragments[1:])
+                    if b[0] - a[0] >= 10 and abs(b[1] - a[1]) <= ROW_TOLERANCE)
+    if not slopes:
+        return 0.0
+    return max(-0.05, min(0.05, slopes[len(slopes) // 2]))
+
+
+def _group_rows(fragments) -> List[Tuple[float, List[List]]]:
+    """
+    Top-to-bottom rows of cells [x, text, font size, width], after
+    deskewing; width is estimated from the longest fragment. Fragments
+    starting at the same x continue one cell ("Ll1A1" "1" "*" "3"); runs of
+    2+ spaces inside a fragment separate cells whose position is unknown
+    (x None).
+    """
+    skew = _skew(fragments)
+    rows = []
+    for x, y, text, size in sorted(((x, y - skew * x, t, s) for x, y, t, s in fragments), key=lambda f: -f[1]):
+        if rows and rows[-1][0] - y <= ROW_TOLERANCE:
+            rows[-1][1].append((x, text, size))
+        else:
+            rows.append((y, [(x, text, size)]))
+
+    result = []
+    for y, items in rows:
+        raw = []
+        for x, text, size in sorted(items, key=lambda item: item[0]):
+            width = len(text.strip()) * size * 0.5
+            text = _LINE_BREAK_RE.sub(" ", text)
+            if raw and abs(raw[-1][0] - x) < 1.0:
+                raw[-1][1] += text.lstrip() if raw[-1][1][-1:].isspace() else text
+                raw[-1][2] = max(raw[-1][2], size)
+                raw[-1][3] = max(raw[-1][3], width)
+            else:
+                raw.append([x, text, size, width])
+        cells = []
+        for x, text, size, width in raw:
+            parts = [p for p in _CELL_GAP_RE.split(text.strip()) if p]
+            for i, part in enumerate(parts):
+                cells.append([x if i == 0 else None, " ".join(part.split()), size,
+                              width if len(parts) == 1 else len(part) * size * 0.5])
+        if cells:
+            result.append((y, cells))
+    return result
+
+
+def _is_number(text: str) -> bool:
+    return bool(_NUMBER_RE.match(text))
+
+
+def _is_label(text: str) -> bool:
+    """
+    Whether a caption or column title reads as words rather than OCR debris
+    ('"', a lone letter, a bracket that is never closed).
+    """
+    text = _clean_label(text)
+    if text.startswith("(") and ")" not in text:
+        return False
+    return bool(_WORD_RE.search(text))
+
+
+def _is_data_row(cells) -> bool:
+    if len(cells) < MIN_TABLE_COLUMNS:
+        return False
+    numeric = sum(1 for cell in cells[1:] if _is_number(cell[1]))
+    return numeric >= 2 and 2 * numeric >= len(cells) - 1
+
+
+def _columns(rows) -> List[Tuple[float, float]]:
+    """
+    (start, centre) per column: cell starts of the data rows clustered by
+    x. Clusters too sparse to be a column (a stray fragment) are dropped.
+    """
+    cells = sorted((cell for _, row in rows for cell in row if cell[0] is not None), key=lambda c: c[0])
+    clusters = []
+    for cell in cells:
+        if clusters and cell[0] - clusters[-1][-1][0] <= COLUMN_TOLERANCE:
+            clusters[-1].append(cell)
+        else:
+            clusters.append([cell])
+    needed = max(2, len(rows) // 4)
+    return [(cluster[0][0], sum(c[0] + c[3] / 2 for c in cluster) / len(cluster))
+            for cluster in clusters if len(cluster) >= needed]
+
+
+def _place_cells(cells, columns, by_centre=False) -> Dict[int, List[str]]:
+    """
+    column index -> texts. Data cells go to the nearest column start; header
+    titles (`by_centre`) to the nearest centre, since titles are usually
+    centred or left aligned over right-aligned numbers. Cells without a
+    position take the column after the previous cell.
+    """
+    placed, col = {}, -1
+    for x, text, _, width in cells:
+        if x is None:
+            col += 1
+        elif by_centre:
+            col = min(range(len(columns)), key=lambda c: abs(columns[c][1] - (x + width / 2)))
+        else:
+            col = min(range(len(columns)), key=lambda c: abs(columns[c][0] - x))
+        placed.setdefault(col, []).append(text)
+    return placed
+
+
+def _build_table(rows, start: int, end: int, previous: Optional[Dict] = None) -> Optional[Dict]:
+    data = rows[start:end]
+    columns = _columns(data)
+    if len(columns) < 2:
+        return None
+    spacing = (data[0][0] - data[-1][0]) / max(1, len(data) - 1)
+    sizes = sorted(cell[2] for _, cells in data for cell in cells)
+    body_size = sizes[len(sizes) // 2] or 1
+
+    # Header: the stacked rows right above the data, up to a line that starts
+    # at the label column on its own or is set larger (caption, prose)
+    header_rows, top = [], data[0][0]
+    k = start - 1
+    while k >= 0 and len(header_rows) < MAX_HEADER_ROWS:
+        y, cells = rows[k]
+        if y - top > 2 * spacing or _is_data_row(cells):
+            break
+        if len(cells) < 2 and (cells[0][0] is None or cells[0][0] < columns[0][0] + COLUMN_TOLERANCE):
+            break
+        if any(cell[2] > 1.2 * body_size for cell in cells):
+            break
+        header_rows.insert(0, cells)
+        top = y
+        k -= 1
+
+    caption = []
+    if k >= 0 and rows[k][0] - top <= 3 * spacing and (len(rows[k][1]) == 1 or rows[k][1][0][2] > 1.2 * body_size):
+        caption.append(" ".join(cell[1] for cell in rows[k][1]))
+        above = rows[k - 1] if k > 0 else None
+        if (above and len(above[1]) == 1 and not _TABLE_LABEL_RE.match(caption[0])
+                and _TABLE_LABEL_RE.match(above[1][0][1]) and above[0] - rows[k][0] <= 3 * spacing):
+            caption.insert(0, above[1][0][1])
+
+    placed_rows = [_place_cells(cells, columns) for _, cells in data]
+    n_columns = max(len(columns), max(max(p) + 1 for p in placed_rows))
+    header = [[] for _ in range(n_columns)]
+    for cells in header_rows:
+        for col, texts in _place_cells(cells, columns, by_centre=True).items():
+            if col < n_columns:
+                header[col].extend(texts)
+    header = [" ".join(texts) for texts in header]
+    caption = " ".join(caption)
+    if not any(header) and previous is not None and len(previous["header"]) == n_columns:
+        # Continuation block of the table above (e.g. split by a group row)
+        header, caption = previous["header"], previous["caption"]
+    # Without column titles the cells cannot be named (e.g. statistics
+    # printouts); leave those to the LLM
+    if 2 * sum(1 for title in header[1:] if title) < n_columns - 1:
+        return None
+    # The rows are named by the first column's title or the caption
+    if (caption and not _is_label(caption)) or (header[0] and not _is_label(header[0])):
+        return None
+    if not header[0] and not caption:
+        return None
+    table_rows = [[" ".join(p.get(col, [])) for col in range(n_columns)] for p in placed_rows]
+    if _STATISTICS_RE.search(" | ".join([caption] + header + [row[0] for row in table_rows])):
+        return None
+    return {
+        "caption": caption,
+        "header": header,
+        "rows": table_rows,
+    }
+
+
+def detect_tables(fragments) -> List[Dict]:
+    """
+    Tables among positioned page fragments (see _page_fragments): runs of at
+    least MIN_TABLE_ROWS rows with MIN_TABLE_COLUMNS+ cells, most of them
+    numeric after the first (label) column. Each table is {"caption",
+    "header": [column title], "rows": [[cell]]}, cells aligned to the header.
+    """
+    rows = _group_rows(fragments)
+    tables = []
+    i = 0
+    while i < len(rows):
+        if not _is_data_row(rows[i][1]):
+            i += 1
+            continue
+        j = i
+        while j < len(rows) and _is_data_row(rows[j][1]):
+            j += 1
+        table = None
+        if j - i >= MIN_TABLE_ROWS:
+            table = _build_table(rows, i, j, previous=tables[-1] if tables else None)
+        if table is not None:
+            tables.append(table)
+        i = j
+    return tables
+
+
+def strip_tables(text: str, tables: List[Dict]) -> str:
+    """
+    Page text without the lines that belong to `tables`: lines made up
+    only of header/cell words. The caption stays, so the prose still says
+    which table was there.
+    """
+    words = set()
+    for table in tables:
+        for cell in table["header"] + [cell for row in table["rows"] for cell in row]:
+            words.update(cell.split())
+    kept = [line for line in text.splitlines() if not line.split() or not set(line.split()) <= words]
+    return "\n".join(kept).strip()
+
+
+def _table_value(text: str):
+    if _is_number(text) and not text.endswith("%"):
+        number = text.replace(",", "")
+        try:
+            return float(number) if "." in number else int(number)
+        except ValueError:
+            pass
+    return text
+
+
+def _clean_label(text: str) -> str:
+    return _EDGE_PUNCT_RE.sub("", text).strip()
 
 
+def tables_to_partial(tables: List[Dict]) -> Dict:
+    """
+    Partial ontology (the JSON the LLM produces per chunk) for extracted
+    tables: one Individual per row, named by its first cell and typed by the
+    first column's title (or the caption), with the other cells as
+    properties keyed by column title. A row with a blank first cell
+    continues the row above (rows before the first label go to the first
+    labelled row); a column with several values becomes a list. Rows
+    repeated across tables are combined into one individual.
+    """
+    entities: Dict[str, Dict] = {}
+    classes: Dict[str, Dict] = {}
+    for table in tables:
+        header = table["header"]
+        where = f"{table['caption'] or 'a table'} (page {table.get('page')})"
+        class_name = _clean_label(header[0]) or _clean_label(_TABLE_LABEL_RE.sub("", table["caption"])) \
+            or "Table Row"
+        classes.setdefault(class_name.lower(), {"name": class_name, "type": "Class"})
+        groups, leading = [], []
+        for row in table["rows"]:
+            name = _clean_label(row[0])
+            if name:
+                groups.append((name, leading + [row]))
+                leading = []
+            elif groups:
+                groups[-1][1].append(row)
+            else:
+                leading.append(row)
+        for name, rows in groups:
+            if _is_number(name):
+                continue
+            entity = entities.setdefault(name.lower(), {
+                "name": name, "type": "Individual", "class_membership": [],
+                "description": "", "properties": {}})
+            if class_name not in entity["class_membership"]:
+                entity["class_membership"].append(class_name)
+            sentence = f"Listed in {where}."
+            if sentence not in entity["description"]:
+                entity["description"] = f"{entity['description']} {sentence}".strip()
+            for col in range(1, max(len(row) for row in rows)):
+                values = [_table_value(row[col]) for row in rows if col < len(row) and row[col]]
+                if values:
+                    key = _clean_label(header[col]) if col < len(header) else ""
+                    entity["properties"][key or f"column {col + 1}"] = values[0] if len(values) == 1 else values
+    return {"entities": list(classes.values()) + list(entities.values()), "relationships": []}
@@ -1,32 +1,69 @@
 # pipeline.py
 import os
+import sys
+import glob
+import json
+import time
+import argparse
+import traceback
 import subprocess
+from concurrent.futures import ProcessPoolExecutor, as_completed
 
-from parse_manual import extract_text_from_pdf
-from generate_ontology import generate_ontology_for_document
+from parse_manual import extract_pages_and_tables, file_sha256
+from generate_ontology import (generate_ontology_for_document, llm_cache,
+                               REQUESTS_PER_MINUTE, TOKENS_PER_MINUTE)
 from visualize_ontology import visualize_ontology
+from render_graphs import render_ontology
+from metrics import metrics
+
+DATA_FOLDER = "data/primary_documents"
+ONTOLOGY_DIR = "ontologies"
+GRAPH_DIR = os.path.join(ONTOLOGY_DIR, "graphs")
+BATCH_STATE_PATH = os.path.join(ONTOLOGY_DIR, "batch_state.json")
+BATCH_REPORT_PATH = os.path.join(ONTOLOGY_DIR, "batch_report.json")
+METRICS_DIR = os.path.join(ONTOLOGY_DIR, "metrics")
 
 def process_pdf_to_ontology_and_visualize(
-    pdf_path, 
-    output_ttl, 
-    output_dot):
+    pdf_path,
+    output_ttl,
+    output_dot,
+    page_workers=None,
+    **generate_kwargs):
     """
     1) Extract text from PDF
     2) Generate an ontology TTL from that text via LLM
     3) Visualize the TTL (producing a .dot)
+    `page_workers` sizes the PDF page pool (default: CPU count).
+    Extra keyword arguments are passed to generate_ontology_for_document.
+    Run metrics are exported to ontologies/metrics/<name>_<timestamp>.json/.prom;
+    returns the JSON metrics path.
     """
-    # ---- (1) Extract text from PDF ----
-    extracted_text = extract_text_from_pdf(pdf_path)
-    print(f"[INFO] Extracted {len(extracted_text)} characters from '{pdf_path}'")
-    
-    # ---- (2) Generate TTL file via LLM ----
-    generate_ontology_for_document(extracted_text, output_ttl=output_ttl)
-    print(f"[INFO] Turtle file saved to '{output_ttl}'")
-    
-    
-    # ---- (3) Visualize (TTL -> DOT) ----
-    visualize_ontology(turtle_file=output_ttl, output_dot=output_dot)
-    print(f"[INFO] DOT file saved to '{output_dot}'")
+    base_name = os.path.splitext(os.path.basename(pdf_path))[0]
+    metrics.reset(document=base_name)
+    try:
+        with metrics.span("pipeline"):
+            # ---- (1) Extract text from PDF ----
+            pages, tables = extract_pages_and_tables(pdf_path, workers=page_workers)
+            extracted_text = "\n".join(text for _, text in pages)
+            print(f"[INFO] Extracted {len(extracted_text)} characters from '{pdf_path}'")
+            # Page boundaries are needed for boilerplate filtering and retrieval;
+            # tables are mapped to individuals without the LLM
+            generate_kwargs.setdefault("pages", pages)
+            generate_kwargs.setdefault("tables", tables)
+
+            # ---- (2) Generate TTL file via LLM ----
+            generate_ontology_for_document(extracted_text, output_ttl=output_ttl, **generate_kwargs)
+            print(f"[INFO] Turtle file saved to '{output_ttl}'")
+
+
+            # ---- (3) Visualize (TTL -> DOT) ----
+            visualize_ontology(turtle_file=output_ttl, output_dot=output_dot)
+            print(f"[INFO] DOT file saved to '{output_dot}'")
+    finally:
+        stamp = time.strftime("%Y%m%d-%H%M%S")
+        metrics_path, _ = metrics.export(os.path.join(METRICS_DIR, f"{base_name}_{stamp}"))
+        print(f"[INFO] Run metrics saved to '{metrics_path}'")
+    return metrics_path
 
 def process_ttl_to_visualize(ttl_path, output_dot):
     """
@@ -36,11 +73,171 @@ def process_ttl_to_visualize(ttl_path, output_dot):
     print(f"[INFO] DOT file saved to '{output_dot}'")
 
 
-if __name__ == "__main__":
+def output_paths(pdf_path):
+    """
+    Matching TTL/DOT filenames under ontologies/ for a PDF.
+    """
+    base_name = os.path.splitext(os.path.basename(pdf_path))[0]  # removes ".pdf"
+    ttl_file = f"{ONTOLOGY_DIR}/{base_name}_ontology.ttl"
+    dot_file = f"{GRAPH_DIR}/{base_name}_ontology.dot"
+    return ttl_file, dot_file
+
+
+#########################################
+#   Batch mode
+#########################################
+def _load_batch_state(path=BATCH_STATE_PATH):
+    if os.path.exists(path):
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    return {}
+
+
+def _save_batch_state(state, path=BATCH_STATE_PATH):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(state, f, indent=2)
+    os.replace(tmp_path, path)
+
+
+# LLM cache counters that accumulate over a worker's lifetime
+CACHE_COUNTERS = ("hits", "misses", "bytes_saved", "evictions")
+
+
+def _process_document_safely(pdf_path, generate_kwargs, page_workers=None):
+    """
+    Worker entry point: runs the full pipeline for one PDF and reports the
+    outcome instead of raising, so one bad manual cannot stop the batch.
+    Cache counters are reported for this document only; a worker process
+    handles several documents with the same cache.
+    """
+    ttl_file, dot_file = output_paths(pdf_path)
+    start = time.time()
+    cache_before = llm_cache.stats()
+    result = {"pdf": pdf_path, "ttl": ttl_file, "dot": dot_file}
+    try:
+        result["metrics"] = process_pdf_to_ontology_and_visualize(
+            pdf_path, ttl_file, dot_file, page_workers=page_workers, **generate_kwargs)
+        result["status"] = "done"
+    except Exception as e:
+        result["status"] = "failed"
+        result["error"] = f"{type(e).__name__}: {e}"
+        result["traceback"] = traceback.format_exc()
+    result["seconds"] = round(time.time() - start, 2)
+    cache = llm_cache.stats()
+    for counter in CACHE_COUNTERS:
+        cache[counter] -= cache_before[counter]
+    result["cache"] = cache
+    return result
+
+
+def render_outputs(ttl_files, formats):
+    """
+    Graphviz drawings for finished TTLs (render_graphs.py). Failures are
+    reported, not raised: the ontologies themselves are already written.
+    """
+    for ttl_file in ttl_files:
+        try:
+            render_ontology(ttl_file, formats=formats)
+        except Exception as e:
+            print(f"[ERROR] Rendering '{ttl_file}' failed: {type(e).__name__}: {e}")
+
+
+def run_batch(pattern=os.path.join(DATA_FOLDER, "*.pdf"), workers=None, force=False,
+              use_chunks=True, stream=None, target_concepts=None, render_formats=None):
+    """
+    Processes every PDF matching `pattern` in a process pool, one document
+    per worker. Progress is recorded in ontologies/batch_state.json after each
+    document, so an interrupted run resumes where it left off: documents whose
+    PDF hash is unchanged and whose outputs exist are skipped unless `force`.
+    Writes a summary to ontologies/batch_report.json and returns it.
+    """
+    pdf_files = sorted(p for p in glob.glob(pattern) if p.lower().endswith(".pdf"))
+    if not pdf_files:
+        print(f"[ERROR] No PDF files match '{pattern}'.")
+        return None
+
+    workers = workers or min(len(pdf_files), os.cpu_count() or 1)
+    state = _load_batch_state()
+    todo, skipped = [], []
+    for pdf_path in pdf_files:
+        digest = file_sha256(pdf_path)
+        entry = state.get(pdf_path, {})
+        ttl_file, dot_file = output_paths(pdf_path)
+        if (not force and entry.get("status") == "done" and entry.get("sha256") == digest
+                and os.path.exists(ttl_file) and os.path.exists(dot_file)):
+            skipped.append(pdf_path)
+        else:
+            todo.append((pdf_path, digest))
+    print(f"[INFO] Batch: {len(todo)} to process, {len(skipped)} already up to date, {workers} workers")
+
+    # Every worker process runs its own rate limiter, so split the budget
+    generate_kwargs = {"use_chunks": use_chunks, "stream": stream, "target_concepts": target_concepts}
+    if REQUESTS_PER_MINUTE:
+        generate_kwargs["requests_per_minute"] = max(1, REQUESTS_PER_MINUTE // workers)
+    if TOKENS_PER_MINUTE:
+        generate_kwargs["tokens_per_minute"] = max(1, TOKENS_PER_MINUTE // workers)
+    # ...and the CPUs: each worker's page pool gets its share, not cpu_count
+    page_workers = max(1, (os.cpu_count() or 1) // workers)
+
+    start = time.time()
+    results = []
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = {pool.submit(_process_document_safely, pdf_path, generate_kwargs, page_workers): (pdf_path, digest)
+                   for pdf_path, digest in todo}
+        for future in as_completed(futures):
+            pdf_path, digest = futures[future]
+            try:
+                result = future.result()
+            except Exception as e:  # worker process died
+                result = {"pdf": pdf_path, "status": "failed", "error": f"{type(e).__name__}: {e}"}
+            results.append(result)
+            state[pdf_path] = {
+                "sha256": digest,
+                "status": result["status"],
+                "seconds": result.get("seconds"),
+                "error": result.get("error"),
+                "finished_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            }
+            _save_batch_state(state)
+            print(f"[{result['status'].upper()}] {pdf_path}" +
+                  (f" ({result['seconds']}s)" if "seconds" in result else "") +
+                  (f": {result['error']}" if result.get("error") else ""))
+
+    report = {
+        "pattern": pattern,
+        "workers": workers,
+        "wall_seconds": round(time.time() - start, 2),
+        "processed": len(results),
+        "succeeded": sum(r["status"] == "done" for r in results),
+        "failed": sum(r["status"] == "failed" for r in results),
+        "skipped": skipped,
+        "cache_hits": sum(r.get("cache", {}).get("hits", 0) for r in results),
+        "cache_misses": sum(r.get("cache", {}).get("misses", 0) for r in results),
+        "documents": sorted(results, key=lambda r: r["pdf"]),
+    }
+    os.makedirs(ONTOLOGY_DIR, exist_ok=True)
+    with open(BATCH_REPORT_PATH, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2)
+
+    print(f"\n[DONE] Batch finished in {report['wall_seconds']}s: "
+          f"{report['succeeded']} succeeded, {report['failed']} failed, {len(skipped)} skipped")
+    for r in report["documents"]:
+        if r["status"] == "failed":
+            print(f"  FAILED {r['pdf']}: {r.get('error')}")
+    print(f"Report written to {BATCH_REPORT_PATH}")
+    if render_formats:
+        # Rendering runs its own pool of Graphviz processes, one TTL at a time
+        render_outputs([r["ttl"] for r in report["documents"] if r["status"] == "done"], render_formats)
+    return report
+
+
+def run_interactive(use_chunks=True, stream=None, target_concepts=None, merge_into=None, render_formats=None):
     # 1) List all PDFs in data/ folder
-    data_folder = "data/primary_documents"
+    data_folder = DATA_FOLDER
     pdf_files = [f for f in os.listdir(data_folder) if f.lower().endswith(".pdf")]
-    
+
     if not pdf_files:
         print(f"[ERROR] No PDF files found in '{data_folder}' folder.")
         exit(1)
@@ -61,20 +258,67 @@ if __name__ == "__main__":
 
     chosen_pdf = pdf_files[choice_idx]
     pdf_path = os.path.join(data_folder, chosen_pdf)
-    
+
     # 3) Generate matching filenames
-    base_name = os.path.splitext(chosen_pdf)[0]  # removes ".pdf"
-    ttl_file = f"ontologies/{base_name}_ontology.ttl"
-    dot_file = f"ontologies/graphs/{base_name}_ontology.dot"
+    ttl_file, dot_file = output_paths(pdf_path)
 
     # 4) Run the pipeline
     process_pdf_to_ontology_and_visualize(
         pdf_path=pdf_path,
         output_ttl=ttl_file,
-        output_dot=dot_file    )
-    
+        output_dot=dot_file,
+        use_chunks=use_chunks,
+        stream=stream,
+        target_concepts=target_concepts,
+        merge_into=merge_into)
+
+    if render_formats:
+        render_outputs([merge_into or ttl_file], render_formats)
+
     print("\n[DONE] Full pipeline executed.")
     print(f"Generated files:\n  TTL: {ttl_file}\n  DOT: {dot_file}\n")
+    print(llm_cache.report())
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="PDF manual -> ontology TTL -> DOT graph")
+    parser.add_argument("--batch", action="store_true",
+                        help="process every matching PDF without prompting")
+    parser.add_argument("--glob", default=os.path.join(DATA_FOLDER, "*.pdf"),
+                        help="PDF glob for --batch (default: %(default)s)")
+    parser.add_argument("--workers", type=int, default=None,
+                        help="documents processed in parallel (default: CPU count)")
+    parser.add_argument("--force", action="store_true",
+                        help="reprocess documents already marked done")
+    parser.add_argument("--one-pass", action="store_true",
+                        help="use the single-prompt path instead of chunked extraction")
+    parser.add_argument("--stream", action="store_true", default=None,
+                        help="stream LLM replies and parse them incrementally (default: $ONTOLOGY_STREAM)")
+    parser.add_argument("--concepts", default=None,
+                        help="comma-separated target concepts (or @file, one per line): extract only "
+                             "from the passages most relevant to them")
+    parser.add_argument("--merge-into", default=None,
+                        help="fold the result into this existing ontology (e.g. ground.ttl) and write a delta")
+    parser.add_argument("--render", default=None, metavar="FORMATS",
+                        help="also draw the graphs with Graphviz, e.g. svg or svg,png (render_graphs.py)")
+    args = parser.parse_args()
+    if args.batch and args.merge_into:
+        # Workers would race on the same file
+        parser.error("--merge-into cannot be combined with --batch")
 
+    render_formats = [f for f in args.render.split(",") if f] if args.render else None
+    target_concepts = None
+    if args.concepts:
+        if args.concepts.startswith("@"):
+            with open(args.concepts[1:], "r", encoding="utf-8") as f:
+                target_concepts = [line.strip() for line in f if line.strip()]
+        else:
+            target_concepts = [c.strip() for c in args.concepts.split(",") if c.strip()]
 
-    
\ No newline at end of file
+    if args.batch:
+        report = run_batch(args.glob, workers=args.workers, force=args.force,
+                           use_chunks=not args.one_pass, stream=args.stream,
+                           target_concepts=target_concepts, render_formats=render_formats)
+        sys.exit(1 if report is None or report["failed"] else 0)
+    run_interactive(use_chunks=not args.one_pass, stream=args.stream, target_concepts=target_concepts,
+                    merge_into=args.merge_into, render_formats=render_formats)
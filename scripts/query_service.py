@@ -0,0 +1,410 @@
+# scripts/query_service.py
+import os
+import glob
+import json
+import time
+import argparse
+import threading
+from collections import OrderedDict, defaultdict, deque
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from typing import Dict, List, Optional, Set, Tuple
+from urllib.parse import urlparse, parse_qs
+
+import rdflib
+from rdflib import URIRef
+from rdflib.namespace import OWL, RDF, RDFS
+
+from graph_cache import load_triples
+from incremental_merge import load_existing
+from metrics import metrics
+
+#########################################
+#  Local ontology query service
+#########################################
+# Loads every TTL under ontologies/ once (parses come from graph_cache),
+# precomputes what downstream tools keep asking for and answers over HTTP:
+#
+#   GET /subclasses?class=GroundVehicle[&direct=1]
+#   GET /superclasses?class=...[&direct=1]
+#   GET /instances?class=...[&direct=1]       (includes subclass instances)
+#   GET /properties?domain=...  |  ?range=...
+#   GET /label?q=tracked vehicle              (exact label, else prefix)
+#   GET or POST /sparql?query=...             (passthrough to rdflib)
+#   GET /stats
+#
+# A class may be given as a full IRI, a local name or a label. Results are
+# kept in an LRU cache; the files are re-stat'ed at most once per
+# QUERY_RELOAD_INTERVAL and any change rebuilds the indexes in the background
+# and clears the cache, while the old snapshot keeps answering meanwhile.
+
+QUERY_ONTOLOGY_GLOB = os.getenv("QUERY_ONTOLOGY_GLOB", "ontologies/**/*.ttl")
+QUERY_CACHE_SIZE = int(os.getenv("QUERY_CACHE_SIZE", "4096"))
+QUERY_RELOAD_INTERVAL = float(os.getenv("QUERY_RELOAD_INTERVAL", "2.0"))
+QUERY_MAX_RESULTS = int(os.getenv("QUERY_MAX_RESULTS", "10000"))
+
+
+def local_name(uri) -> str:
+    return uri.split('#')[-1] or uri.rsplit('/', 1)[-1]
+
+
+def files_signature(paths: List[str]) -> Tuple:
+    signature = []
+    for path in paths:
+        try:
+            st = os.stat(path)
+        except OSError:
+            continue
+        signature.append((path, st.st_mtime_ns, st.st_size))
+    return tuple(signature)
+
+
+class OntologySnapshot:
+    """
+    The triples of all ontologies plus the precomputed indexes: transitive
+    subClassOf closure in both directions, domain / range / rdf:type indexes
+    and a label index. The rdflib graph is only built for the first SPARQL
+    query, so a reload that nobody queries with SPARQL stays cheap.
+    """
+
+    def __init__(self, paths: List[str], use_cache: bool = True):
+        self.paths = paths
+        self.signature = files_signature(paths)
+        self.triples = []
+        self.errors = {}
+        for path in paths:
+            try:
+                self.triples.extend(self._load(path, use_cache))
+            except Exception as e:
+                self.errors[path] = f"{type(e).__name__}: {e}"
+                print(f"[ERROR] Skipping {path}: {type(e).__name__}")
+
+        self.parents = defaultdict(set)
+        self.children = defaultdict(set)
+        self.domain_of = defaultdict(set)    # class -> properties with that domain
+        self.range_of = defaultdict(set)     # class -> properties with that range
+        self.instances = defaultdict(set)    # class -> direct instances
+        self.labels: Dict[URIRef, str] = {}
+        self.by_label = defaultdict(set)     # lowercased label -> uris
+        self.by_local = defaultdict(set)     # lowercased local name -> uris
+        self.classes: Set[URIRef] = set()
+        self.subjects: Set[URIRef] = set()
+        restricted, on_property, some_values = [], {}, {}
+
+        for s, p, o in self.triples:
+            if p == RDFS.subClassOf and isinstance(o, URIRef):
+                self.parents[s].add(o)
+                self.children[o].add(s)
+                self.classes.update((s, o))
+            elif p == RDFS.subClassOf:
+                restricted.append((s, o))
+            elif p == OWL.onProperty:
+                on_property[s] = o
+            elif p == OWL.someValuesFrom:
+                some_values[s] = o
+            elif p == RDF.type:
+                if o in (OWL.Class, RDFS.Class):
+                    self.classes.add(s)
+                elif isinstance(o, URIRef) and not str(o).startswith(str(OWL)):
+                    self.instances[o].add(s)
+            elif p == RDFS.domain:
+                self.domain_of[o].add(s)
+            elif p == RDFS.range:
+                self.range_of[o].add(s)
+            elif p == RDFS.label:
+                self.labels.setdefault(s, str(o))
+                self.by_label[str(o).lower()].add(s)
+            if isinstance(s, URIRef) and s not in self.subjects:
+                self.subjects.add(s)
+                self.by_local[local_name(s).lower()].add(s)
+        # "C subClassOf [owl:onProperty p ; owl:someValuesFrom D]" relates C
+        # and D through p just like a domain / range does
+        for cls, node in restricted:
+            if node in on_property and isinstance(some_values.get(node), URIRef):
+                self.domain_of[cls].add(on_property[node])
+                self.range_of[some_values[node]].add(on_property[node])
+
+        self.ancestors = {c: self._closure(c, self.parents) for c in self.classes}
+        self.descendants = defaultdict(set)
+        for cls, ancestors in self.ancestors.items():
+            for ancestor in ancestors:
+                self.descendants[ancestor].add(cls)
+        self._graph = None
+        self._sparql_lock = threading.Lock()
+
+    @staticmethod
+    def _load(path: str, use_cache: bool):
+        try:
+            return load_triples(path, format="turtle", use_cache=use_cache)
+        except Exception:
+            # Skips the statements rdflib rejects instead of the whole file
+            return list(load_existing(path, use_cache))
+
+    @staticmethod
+    def _closure(start, edges) -> Set[URIRef]:
+        seen, queue = set(), deque(edges.get(start, ()))
+        while queue:
+            node = queue.popleft()
+            if node in seen or node == start:
+                continue
+            seen.add(node)
+            queue.extend(edges.get(node, ()))
+        return seen
+
+    def resolve(self, name: str) -> Optional[URIRef]:
+        """IRI, local name or label -> IRI (None when unknown)."""
+        uri = URIRef(name) if ":" in name and " " not in name else None
+        if uri is not None and (uri in self.subjects or uri in self.classes):
+            return uri
+        key = name.strip().lower()
+        for index in (self.by_local, self.by_label):
+            matches = index.get(key) or index.get(key.replace(" ", "")) or index.get(key.replace("_", " "))
+            if matches:
+                # Prefer a class when a name is shared
+                return sorted(matches, key=lambda u: (u not in self.classes, str(u)))[0]
+        return None
+
+    def describe(self, uris) -> List[Dict]:
+        out = [{"iri": str(u), "label": self.labels.get(u, local_name(u))} for u in uris]
+        out.sort(key=lambda item: item["label"].lower())
+        return out[:QUERY_MAX_RESULTS]
+
+    def sparql(self, query: str) -> Dict:
+        with self._sparql_lock:
+            if self._graph is None:
+                with metrics.span("query_sparql_graph"):
+                    self._graph = rdflib.Graph()
+                    self._graph.addN((s, p, o, self._graph) for s, p, o in self.triples)
+            result = self._graph.query(query)
+        if result.type == "ASK":
+            return {"boolean": bool(result.askAnswer)}
+        if result.type == "SELECT":
+            names = [str(v) for v in result.vars]
+            rows = []
+            for row in result:
+                rows.append({n: (None if v is None else str(v)) for n, v in zip(names, row)})
+                if len(rows) >= QUERY_MAX_RESULTS:
+                    break
+            return {"vars": names, "bindings": rows}
+        # CONSTRUCT / DESCRIBE
+        return {"turtle": result.serialize(format="turtle").decode("utf-8")}
+
+
+class LRUCache:
+    def __init__(self, maxsize: int = QUERY_CACHE_SIZE):
+        self.maxsize = maxsize
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            if key not in self._data:
+                return None
+            self._data.move_to_end(key)
+            return self._data[key]
+
+    def put(self, key, value):
+        with self._lock:
+            self._data[key] = value
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self):
+        return len(self._data)
+
+
+class OntologyQueryService:
+    """
+    Owns the current snapshot and the result cache; answer() is safe to call
+    from many handler threads at once.
+    """
+
+    def __init__(self, pattern: str = QUERY_ONTOLOGY_GLOB, use_cache: bool = True,
+                 reload_interval: float = QUERY_RELOAD_INTERVAL, cache_size: int = QUERY_CACHE_SIZE):
+        self.pattern = pattern
+        self.use_cache = use_cache
+        self.reload_interval = reload_interval
+        self.cache = LRUCache(cache_size)
+        self._reload_lock = threading.Lock()
+        self._reloading = False
+        self._last_check = time.monotonic()
+        with metrics.span("query_index_build"):
+            self.snapshot = OntologySnapshot(self._paths(), use_cache)
+        self.generation = 1
+
+    def _paths(self) -> List[str]:
+        return sorted(glob.glob(self.pattern, recursive=True))
+
+    def _maybe_reload(self):
+        now = time.monotonic()
+        if now - self._last_check < self.reload_interval:
+            return
+        with self._reload_lock:
+            if self._reloading or now - self._last_check < self.reload_interval:
+                return
+            self._last_check = now
+            paths = self._paths()
+            if files_signature(paths) == self.snapshot.signature:
+                return
+            self._reloading = True
+        threading.Thread(target=self._reload, args=(paths,), daemon=True).start()
+
+    def _reload(self, paths):
+        try:
+            with metrics.span("query_index_build"):
+                snapshot = OntologySnapshot(paths, self.use_cache)
+            self.snapshot = snapshot
+            self.generation += 1
+            self.cache.clear()
+            metrics.incr("query_reloads")
+            print(f"[INFO] Ontologies changed: reloaded {len(paths)} files, {len(snapshot.triples)} triples")
+        finally:
+            with self._reload_lock:
+                self._reloading = False
+
+    def answer(self, endpoint: str, params: Dict[str, str]) -> Tuple[int, bytes]:
+        """
+        (HTTP status, JSON body). Successful answers are cached already
+        encoded, so a hot query costs a dict lookup.
+        """
+        self._maybe_reload()
+        key = (endpoint, tuple(sorted(params.items())))
+        cached = self.cache.get(key)
+        if cached is not None and cached[0] == self.generation:
+            metrics.incr("query_cache_hits", endpoint=endpoint)
+            return cached[1], cached[2]
+        metrics.incr("query_cache_misses", endpoint=endpoint)
+        generation, snapshot = self.generation, self.snapshot
+        status, payload = self._compute(snapshot, endpoint, params)
+        body = json.dumps(payload).encode("utf-8")
+        if status == 200 and endpoint != "stats":
+            self.cache.put(key, (generation, status, body))
+        return status, body
+
+    def _compute(self, snap: OntologySnapshot, endpoint: str, params: Dict[str, str]) -> Tuple[int, Dict]:
+        direct = params.get("direct", "0").lower() in ("1", "true", "yes")
+
+        def need(name):
+            value = params.get(name)
+            if not value:
+                raise KeyError(f"missing parameter '{name}'")
+            uri = snap.resolve(value)
+            if uri is None:
+                raise LookupError(f"unknown entity '{value}'")
+            return uri
+
+        try:
+            if endpoint == "subclasses":
+                cls = need("class")
+                found = snap.children.get(cls, set()) if direct else snap.descendants.get(cls, set())
+                return 200, {"class": str(cls), "results": snap.describe(found)}
+            if endpoint == "superclasses":
+                cls = need("class")
+                found = snap.parents.get(cls, set()) if direct else snap.ancestors.get(cls, set())
+                return 200, {"class": str(cls), "results": snap.describe(found)}
+            if endpoint == "instances":
+                cls = need("class")
+                classes = {cls} if direct else {cls} | snap.descendants.get(cls, set())
+                found = set().union(*(snap.instances.get(c, set()) for c in classes))
+                return 200, {"class": str(cls), "results": snap.describe(found)}
+            if endpoint == "properties":
+                if "domain" in params:
+                    cls, index = need("domain"), snap.domain_of
+                else:
+                    cls, index = need("range"), snap.range_of
+                # A property on a superclass applies to the subclass as well
+                classes = {cls} if direct else {cls} | snap.ancestors.get(cls, set())
+                found = set().union(*(index.get(c, set()) for c in classes))
+                return 200, {"class": str(cls), "results": snap.describe(found)}
+            if endpoint == "label":
+                q = params.get("q", "").strip().lower()
+                if not q:
+                    raise KeyError("missing parameter 'q'")
+                found = snap.by_label.get(q)
+                if not found:
+                    found = {u for label, uris in snap.by_label.items() if label.startswith(q) for u in uris}
+                return 200, {"q": q, "results": snap.describe(found)}
+            if endpoint == "sparql":
+                if not params.get("query"):
+                    raise KeyError("missing parameter 'query'")
+                return 200, snap.sparql(params["query"])
+            if endpoint == "stats":
+                return 200, {"files": [p for p, _, _ in snap.signature], "errors": snap.errors,
+                             "triples": len(snap.triples), "classes": len(snap.classes),
+                             "generation": self.generation, "cached_results": len(self.cache)}
+        except KeyError as e:
+            return 400, {"error": str(e).strip("'\"")}
+        except LookupError as e:
+            return 404, {"error": str(e)}
+        except Exception as e:
+            return 400, {"error": f"{type(e).__name__}: {e}"}
+        return 404, {"error": f"unknown endpoint '/{endpoint}'"}
+
+
+class QueryHandler(BaseHTTPRequestHandler):
+    service: OntologyQueryService = None
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send_body(self, status, body):
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _handle(self, extra_params=None):
+        url = urlparse(self.path)
+        params = {k: v[-1] for k, v in parse_qs(url.query).items()}
+        params.update(extra_params or {})
+        endpoint = url.path.strip("/")
+        with metrics.span("query", endpoint=endpoint):
+            status, body = self.service.answer(endpoint, params)
+        self._send_body(status, body)
+
+    def do_GET(self):
+        self._handle()
+
+    def do_POST(self):
+        # SPARQL protocol: the query as the raw body or form-encoded
+        length = int(self.headers.get("Content-Length", 0))
+        body = self.rfile.read(length).decode("utf-8") if length else ""
+        if self.headers.get("Content-Type", "").startswith("application/x-www-form-urlencoded"):
+            extra = {k: v[-1] for k, v in parse_qs(body).items()}
+        else:
+            extra = {"query": body} if body else {}
+        self._handle(extra)
+
+
+def start_query_server(host="127.0.0.1", port=0, **service_kwargs):
+    """
+    Starts the service on a daemon thread. Returns (server, base_url).
+    """
+    service = OntologyQueryService(**service_kwargs)
+    handler = type("ConfiguredQueryHandler", (QueryHandler,), {"service": service})
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://{host}:{server.server_address[1]}"
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Serve subclass/property/instance/label/SPARQL queries over the ontologies")
+    parser.add_argument("--port", type=int, default=8770)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--glob", default=QUERY_ONTOLOGY_GLOB, help="TTL files to load (default: %(default)s)")
+    args = parser.parse_args()
+
+    server, url = start_query_server(host=args.host, port=args.port, pattern=args.glob)
+    snapshot = server.RequestHandlerClass.service.snapshot
+    print(f"[INFO] Query service on {url}: {len(snapshot.paths)} files, {len(snapshot.triples)} triples, "
+          f"{len(snapshot.classes)} classes")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        server.shutdown()
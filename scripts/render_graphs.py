@@ -0,0 +1,413 @@
+# scripts/render_graphs.py
+import os
+import re
+import json
+import time
+import shutil
+import hashlib
+import argparse
+import threading
+import subprocess
+from collections import defaultdict, deque
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import Dict, List, Optional, Sequence, Tuple
+
+from metrics import metrics
+from graph_cache import load_triples
+from visualize_ontology import GraphIndex, build_dot_model, dot_quote, _dot_attrs
+
+#########################################
+#  Parallel Graphviz rendering
+#########################################
+# visualize_ontology stops at one .dot for the whole ontology; laying that out
+# with Graphviz is single threaded and starts from scratch on every change.
+# This stage renders the same model in pieces instead:
+#   1. the graph is partitioned by top-level class (a class subtree plus its
+#      individuals); subtrees over RENDER_MAX_NODES are split one level down,
+#      clusters under RENDER_MIN_NODES are packed together. Edges to another
+#      cluster keep a dashed stub of the far node.
+#   2. every cluster is laid out once with `dot -Tdot`; the positioned DOT is
+#      cached under the SHA-256 of the cluster's (sorted, deterministic) DOT
+#      text and the Graphviz version, so unchanged clusters are never laid
+#      out again
+#   3. each output format is drawn from the cached layout with `neato -n2`,
+#      which only renders the given positions
+# Clusters run in a pool of Graphviz subprocesses, largest first. An overview
+# graph (one node per cluster, linked to its rendering) is rendered alongside.
+
+RENDER_DIR = os.getenv("RENDER_DIR", "ontologies/graphs/rendered")
+LAYOUT_CACHE_DIR = os.getenv("LAYOUT_CACHE_DIR", "ontologies/graphs/layout_cache")
+RENDER_FORMATS = tuple(f for f in os.getenv("RENDER_FORMATS", "svg").split(",") if f)
+RENDER_MAX_NODES = int(os.getenv("RENDER_MAX_NODES", "2000"))
+RENDER_MIN_NODES = int(os.getenv("RENDER_MIN_NODES", "25"))
+RENDER_TIMEOUT = float(os.getenv("RENDER_TIMEOUT", "900"))
+DOT_BINARY = os.getenv("GRAPHVIZ_DOT", "dot")
+NEATO_BINARY = os.getenv("GRAPHVIZ_NEATO", "neato")
+MANIFEST_NAME = "render_manifest.json"
+
+_SLUG_RE = re.compile(r"[^0-9A-Za-z]+")
+
+
+def graphviz_version(binary: str = DOT_BINARY) -> str:
+    """`dot -V` output; part of the layout cache key. Raises if missing."""
+    if shutil.which(binary) is None:
+        raise RuntimeError(f"Graphviz '{binary}' not found on PATH (install graphviz or set GRAPHVIZ_DOT)")
+    result = subprocess.run([binary, "-V"], capture_output=True, text=True, timeout=30)
+    return (result.stderr or result.stdout).strip()
+
+
+def _local(uri: str) -> str:
+    return uri.split('#')[-1] or uri.rsplit('/', 1)[-1]
+
+
+#########################################
+#  Partitioning
+#########################################
+def partition(index: GraphIndex, nodes: Dict[str, Dict], edges: List[Tuple],
+              max_nodes: int = None, min_nodes: int = None) -> Dict[str, List[str]]:
+    """
+    cluster name -> node ids. Every class belongs to the subtree of its first
+    top-level ancestor (breadth-first over subClassOf), every individual to
+    the cluster of its first class, anything else to the cluster of a node it
+    is linked to.
+    """
+    max_nodes = max_nodes or RENDER_MAX_NODES
+    min_nodes = RENDER_MIN_NODES if min_nodes is None else min_nodes
+
+    classes = sorted(n for n, attrs in nodes.items() if attrs.get("shape") == "box")
+    class_set = set(classes)
+    children = defaultdict(list)
+    has_parent = set()
+    for sub, sup in sorted((str(s), str(o)) for s, o in index.subclass_of):
+        if sub in class_set and sup in class_set and sub != sup:
+            children[sup].append(sub)
+            has_parent.add(sub)
+
+    # Spanning tree: each class hangs under the first parent that reaches it
+    parent: Dict[str, Optional[str]] = {}
+    order: List[str] = []
+    roots = [c for c in classes if c not in has_parent]
+    for start in roots + classes:  # classes only on a subClassOf cycle come last
+        if start in parent:
+            continue
+        parent[start] = None
+        queue = deque([start])
+        while queue:
+            node = queue.popleft()
+            order.append(node)
+            for child in children.get(node, ()):
+                if child not in parent:
+                    parent[child] = node
+                    queue.append(child)
+
+    types = {str(s): t for s, t in index.types.items()}
+    members = defaultdict(list)  # class -> individuals typed by it
+    placed = set(class_set)
+    for node_id in sorted(nodes):
+        if node_id in placed:
+            continue
+        for cls in sorted(str(t) for t in types.get(node_id, ())):
+            if cls in class_set:
+                members[cls].append(node_id)
+                placed.add(node_id)
+                break
+
+    size = {c: 1 + len(members[c]) for c in order}
+    for node in reversed(order):
+        if parent[node] is not None:
+            size[parent[node]] += size[node]
+
+    # Cluster heads: a subtree that fits is one cluster; a larger one keeps
+    # its root (and direct individuals) and recurses into its children
+    head_of: Dict[str, str] = {}
+    for node in order:
+        up = parent[node]
+        if up is None or (head_of[up] == up and size[up] > max_nodes):
+            head_of[node] = node
+        else:
+            head_of[node] = head_of[up]
+
+    clusters = defaultdict(list)
+    for cls in order:
+        clusters[head_of[cls]].append(cls)
+        clusters[head_of[cls]].extend(members[cls])
+
+    # Untyped nodes (e.g. objects of instance-level properties) follow an edge
+    cluster_of = {n: head for head, ids in clusters.items() for n in ids}
+    for _ in range(2):
+        for src, dst, _attrs in edges:
+            if src in cluster_of and dst not in cluster_of:
+                cluster_of[dst] = cluster_of[src]
+            elif dst in cluster_of and src not in cluster_of:
+                cluster_of[src] = cluster_of[dst]
+    unattached = "unattached"
+    for node_id in nodes:
+        cluster_of.setdefault(node_id, unattached)
+    clusters = defaultdict(list)
+    for node_id in nodes:
+        clusters[cluster_of[node_id]].append(node_id)
+
+    # Small clusters are packed together: one Graphviz call per cluster costs
+    # more than laying out a few dozen nodes
+    result: Dict[str, List[str]] = {}
+    used = {"overview"}
+    packed, pack = [], []
+
+    def name_for(head):
+        base = head if head == unattached else _SLUG_RE.sub("_", _local(head)).strip("_") or "cluster"
+        name, n = base, 1
+        while name.lower() in used:
+            n += 1
+            name = f"{base}_{n}"
+        used.add(name.lower())
+        return name
+
+    for head in sorted(clusters, key=lambda h: (-len(clusters[h]), h)):
+        ids = clusters[head]
+        if len(ids) >= min_nodes or head == unattached:
+            result[name_for(head)] = ids
+        else:
+            if pack and len(pack) + len(ids) > max_nodes:
+                packed.append(pack)
+                pack = []
+            pack.extend(ids)
+    if pack:
+        packed.append(pack)
+    for i, ids in enumerate(packed, 1):
+        result[name_for(f"misc_{i}")] = ids
+    return result
+
+
+#########################################
+#  DOT text per cluster
+#########################################
+def cluster_dot(name: str, ids: Sequence[str], nodes: Dict[str, Dict], out_edges: Dict[str, List],
+                cluster_of: Dict[str, str]) -> str:
+    """
+    Strict digraph for one cluster, nodes and edges sorted so the text (and
+    its hash) only changes when the cluster does. Far ends of edges leaving
+    the cluster are drawn as dashed stubs labelled with their cluster.
+    """
+    own = set(ids)
+    lines = ["strict digraph G {", "rankdir=LR;", "fontsize=10;", f"label={dot_quote(name)};"]
+    for node_id in sorted(own):
+        lines.append(f"{dot_quote(node_id)} [{_dot_attrs(nodes[node_id])}];")
+    stubs = {}
+    edge_lines = []
+    for src in sorted(own):
+        for dst, attrs in out_edges.get(src, ()):
+            if dst not in own and dst not in stubs:
+                stub = dict(nodes.get(dst, {"label": _local(dst)}))
+                stub["style"] = "filled,dashed"
+                stub["label"] = f"{stub.get('label', _local(dst))}\n[{cluster_of.get(dst, '?')}]"
+                stubs[dst] = stub
+            edge_lines.append((src, dst, _dot_attrs(attrs)))
+    for node_id in sorted(stubs):
+        lines.append(f"{dot_quote(node_id)} [{_dot_attrs(stubs[node_id])}];")
+    for src, dst, attrs in sorted(edge_lines):
+        lines.append(f"{dot_quote(src)} -> {dot_quote(dst)} [{attrs}];")
+    lines.append("}")
+    return "\n".join(lines) + "\n"
+
+
+def overview_dot(clusters: Dict[str, List[str]], out_edges: Dict[str, List],
+                 cluster_of: Dict[str, str], fmt: str) -> str:
+    """One node per cluster (linked to its rendering), edges weighted by count."""
+    links = defaultdict(int)
+    for src, targets in out_edges.items():
+        for dst, _ in targets:
+            a, b = cluster_of.get(src), cluster_of.get(dst)
+            if a and b and a != b:
+                links[(a, b)] += 1
+    lines = ["strict digraph G {", "rankdir=LR;", "fontsize=10;"]
+    for name in sorted(clusters):
+        attrs = {"shape": "box", "style": "filled", "fillcolor": "lightblue",
+                 "label": f"{name}\n{len(clusters[name])} nodes", "URL": f"{name}.{fmt}"}
+        lines.append(f"{dot_quote(name)} [{_dot_attrs(attrs)}];")
+    for (a, b), n in sorted(links.items()):
+        lines.append(f"{dot_quote(a)} -> {dot_quote(b)} [{_dot_attrs({'label': n, 'penwidth': min(8, 1 + n // 10)})}];")
+    lines.append("}")
+    return "\n".join(lines) + "\n"
+
+
+#########################################
+#  Graphviz subprocesses
+#########################################
+def _run(cmd: List[str], timeout: float):
+    result = subprocess.run(cmd, capture_output=True, text=True, timeout=timeout)
+    if result.returncode != 0:
+        raise RuntimeError(f"{' '.join(cmd[:2])} exited {result.returncode}: {result.stderr.strip()[:500]}")
+
+
+def layout_cluster(dot_text: str, version: str, cache_dir: str = None,
+                   timeout: float = None) -> Tuple[str, bool]:
+    """
+    Path of the positioned DOT for `dot_text`, laying it out only on a cache
+    miss. Returns (path, cache_hit).
+    """
+    cache_dir = cache_dir or LAYOUT_CACHE_DIR
+    digest = hashlib.sha256(f"{version}\n{DOT_BINARY}\n{dot_text}".encode("utf-8")).hexdigest()
+    path = os.path.join(cache_dir, digest[:2], f"{digest}.dot")
+    if os.path.exists(path):
+        return path, True
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    src_path = f"{path}.{os.getpid()}.{threading.get_ident()}.in"
+    tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    try:
+        with open(src_path, "w", encoding="utf-8") as f:
+            f.write(dot_text)
+        _run([DOT_BINARY, "-Tdot", src_path, "-o", tmp_path], timeout or RENDER_TIMEOUT)
+        os.replace(tmp_path, path)
+    finally:
+        for leftover in (src_path, tmp_path):
+            if os.path.exists(leftover):
+                os.remove(leftover)
+    return path, False
+
+
+def draw(layout_path: str, output_path: str, fmt: str, timeout: float = None):
+    """Draws an already positioned DOT file; no layout is computed."""
+    tmp_path = f"{output_path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    try:
+        _run([NEATO_BINARY, "-n2", f"-T{fmt}", layout_path, "-o", tmp_path], timeout or RENDER_TIMEOUT)
+        os.replace(tmp_path, output_path)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+
+def _render_one(name: str, dot_text: str, out_dir: str, formats: Sequence[str],
+                version: str, previous: Dict) -> Dict:
+    """Worker: lay out (or reuse) and draw one cluster in every format."""
+    start = time.perf_counter()
+    digest = hashlib.sha256(dot_text.encode("utf-8")).hexdigest()
+    outputs = {fmt: os.path.join(out_dir, f"{name}.{fmt}") for fmt in formats}
+    entry = {"name": name, "sha256": digest, "outputs": outputs}
+
+    # Same DOT and every output already on disk: nothing to do at all
+    if previous.get("sha256") == digest and all(os.path.exists(p) for p in outputs.values()):
+        entry.update(status="unchanged", layout_cached=True, seconds=0.0)
+        return entry
+
+    dot_path = os.path.join(out_dir, f"{name}.dot")
+    with open(dot_path, "w", encoding="utf-8") as f:
+        f.write(dot_text)
+    try:
+        with metrics.span("render_layout", cluster=name):
+            layout_path, hit = layout_cluster(dot_text, version)
+        with metrics.span("render_draw", cluster=name):
+            for fmt, output_path in outputs.items():
+                draw(layout_path, output_path, fmt)
+        entry.update(status="rendered", layout_cached=hit)
+    except Exception as e:
+        entry.update(status="failed", error=f"{type(e).__name__}: {e}")
+    entry["seconds"] = round(time.perf_counter() - start, 3)
+    return entry
+
+
+def render_ontology(turtle_file: str, out_dir: Optional[str] = None, formats: Sequence[str] = None,
+                    workers: Optional[int] = None, max_nodes: int = None, use_cache: bool = True) -> Dict:
+    """
+    Renders `turtle_file` as per-cluster drawings (plus overview.<fmt>) into
+    `out_dir` (default: RENDER_DIR/<ttl stem>) and writes render_manifest.json
+    there. Returns the manifest.
+    """
+    formats = tuple(formats or RENDER_FORMATS)
+    version = graphviz_version()
+    if out_dir is None:
+        out_dir = os.path.join(RENDER_DIR, os.path.splitext(os.path.basename(turtle_file))[0])
+    os.makedirs(out_dir, exist_ok=True)
+    manifest_path = os.path.join(out_dir, MANIFEST_NAME)
+    previous = {}
+    if os.path.exists(manifest_path):
+        with open(manifest_path, "r", encoding="utf-8") as f:
+            last = json.load(f)
+        # A Graphviz upgrade may draw differently: redraw everything
+        if last.get("graphviz") == version:
+            previous = {c["name"]: c for c in last.get("clusters", [])}
+
+    start = time.time()
+    with metrics.span("render_partition"):
+        g = load_triples(turtle_file, format="ttl", use_cache=use_cache)
+        index = GraphIndex(g)
+        nodes, edges = build_dot_model(g, index)
+        clusters = partition(index, nodes, edges, max_nodes=max_nodes)
+        cluster_of = {n: name for name, ids in clusters.items() for n in ids}
+        out_edges = defaultdict(list)
+        for src, dst, attrs in edges:
+            out_edges[src].append((dst, attrs))
+        texts = {name: cluster_dot(name, ids, nodes, out_edges, cluster_of) for name, ids in clusters.items()}
+        texts["overview"] = overview_dot(clusters, out_edges, cluster_of, formats[0])
+
+    # Graphviz does the work in child processes; threads only wait on them
+    workers = workers or os.cpu_count() or 1
+    results = []
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        futures = [pool.submit(_render_one, name, texts[name], out_dir, formats, version, previous.get(name, {}))
+                   for name in sorted(texts, key=lambda n: -len(texts[n]))]
+        for future in as_completed(futures):
+            entry = future.result()
+            results.append(entry)
+            if entry["status"] == "failed":
+                print(f"[ERROR] Rendering cluster '{entry['name']}' failed: {entry['error']}")
+
+    # Outputs of clusters that no longer exist would otherwise linger
+    for name, entry in previous.items():
+        if name not in texts:
+            for path in list(entry.get("outputs", {}).values()) + [os.path.join(out_dir, f"{name}.dot")]:
+                if os.path.exists(path):
+                    os.remove(path)
+
+    counts = defaultdict(int)
+    for entry in results:
+        counts[entry["status"]] += 1
+    hits = sum(1 for e in results if e["status"] == "rendered" and e["layout_cached"])
+    manifest = {
+        "turtle_file": turtle_file,
+        "graphviz": version,
+        "formats": list(formats),
+        "nodes": len(nodes),
+        "edges": len(edges),
+        "wall_seconds": round(time.time() - start, 2),
+        "rendered": counts["rendered"],
+        "unchanged": counts["unchanged"],
+        "failed": counts["failed"],
+        "layout_cache_hits": hits,
+        "clusters": sorted(({**e, "nodes": len(clusters.get(e["name"], ()))} for e in results),
+                           key=lambda e: e["name"]),
+    }
+    tmp_path = f"{manifest_path}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(manifest, f, indent=2)
+    os.replace(tmp_path, manifest_path)
+
+    metrics.incr("render_clusters", len(results))
+    metrics.incr("render_layouts", counts["rendered"] - hits)
+    metrics.incr("render_layout_cache_hits", hits + counts["unchanged"])
+    print(f"[INFO] Rendered {turtle_file}: {len(clusters)} clusters, {counts['rendered']} drawn "
+          f"({hits} from cached layouts), {counts['unchanged']} unchanged, {counts['failed']} failed "
+          f"in {manifest['wall_seconds']}s -> {out_dir}")
+    return manifest
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="TTL -> per-cluster Graphviz drawings, laid out in parallel")
+    parser.add_argument("turtle_files", nargs="+")
+    parser.add_argument("--out-dir", default=None,
+                        help="output directory (default: RENDER_DIR/<ttl stem>; only with one input)")
+    parser.add_argument("--formats", default=",".join(RENDER_FORMATS),
+                        help="comma-separated Graphviz output formats (default: %(default)s)")
+    parser.add_argument("--workers", type=int, default=None,
+                        help="concurrent Graphviz processes (default: CPU count)")
+    parser.add_argument("--max-nodes", type=int, default=RENDER_MAX_NODES,
+                        help="split clusters larger than this (default: %(default)s)")
+    args = parser.parse_args()
+    if args.out_dir and len(args.turtle_files) > 1:
+        parser.error("--out-dir needs a single input file")
+
+    failed = 0
+    for ttl in args.turtle_files:
+        manifest = render_ontology(ttl, args.out_dir, formats=[f for f in args.formats.split(",") if f],
+                                   workers=args.workers, max_nodes=args.max_nodes)
+        failed += manifest["failed"]
+    raise SystemExit(1 if failed else 0)
@@ -0,0 +1,174 @@
+# scripts/retrieval.py
+import os
+import re
+import math
+import heapq
+from collections import Counter, defaultdict
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+from chunking import split_into_blocks, count_tokens
+from metrics import metrics
+
+#########################################
+#  Passage retrieval (BM25)
+#########################################
+# Long manuals are mostly procedures, tables and boilerplate that add nothing
+# to the ontology. Instead of extracting from every chunk, the pages are cut
+# into section-aware passages, indexed with BM25, and only the top-k passages
+# for each target concept are sent to the LLM. Purely lexical: no embedding
+# model, no network, index build is linear in the document.
+
+PASSAGE_TOKENS = int(os.getenv("RETRIEVAL_PASSAGE_TOKENS", "300"))
+TOP_K = int(os.getenv("RETRIEVAL_TOP_K", "8"))
+BM25_K1 = 1.5
+BM25_B = 0.75
+
+_WORD_RE = re.compile(r"[A-Za-z0-9]+")
+_CAMEL_RE = re.compile(r"(?<=[a-z0-9])(?=[A-Z])|(?<=[A-Z])(?=[A-Z][a-z])")
+STOPWORDS = frozenset(
+    "a an and are as at be by for from has have in into is it its of on or that the "
+    "this to was were will with which when shall may must not no all any each".split()
+)
+
+Page = Tuple[Optional[int], str]
+
+
+def tokenize(text: str) -> List[str]:
+    """
+    Lowercased word tokens with camelCase / snake_case names split, stopwords
+    removed and a crude plural strip, so "TrackedVehicles" matches "tracked
+    vehicle".
+    """
+    tokens = []
+    for word in _WORD_RE.findall(text.replace("_", " ")):
+        for part in _CAMEL_RE.split(word):
+            part = part.lower()
+            if part in STOPWORDS:
+                continue
+            if len(part) > 3 and part.endswith("s") and not part.endswith("ss"):
+                part = part[:-1]
+            tokens.append(part)
+    return tokens
+
+
+class Passage:
+    __slots__ = ("index", "page", "heading", "text")
+
+    def __init__(self, index: int, page: Optional[int], heading: str, text: str):
+        self.index = index
+        self.page = page
+        self.heading = heading
+        self.text = text
+
+    def render(self) -> str:
+        """Passage text with its page/section context, as sent to the LLM."""
+        where = [f"page {self.page}"] if self.page is not None else []
+        if self.heading and not self.text.startswith(self.heading):
+            where.append(self.heading)
+        return f"[{' | '.join(where)}]\n{self.text}" if where else self.text
+
+
+def build_passages(pages: Iterable[Page], max_tokens: int = None,
+                   model: str = "o3-mini") -> List[Passage]:
+    """
+    Packs each page's paragraph blocks (chunking.split_into_blocks) into
+    passages of at most ~`max_tokens` tokens. A passage never spans pages or
+    sections and remembers the heading of the section it belongs to.
+    """
+    max_tokens = max_tokens or PASSAGE_TOKENS
+    passages: List[Passage] = []
+    heading = ""
+    for page_number, page_text in pages:
+        current: List[str] = []
+        current_tokens = 0
+
+        def flush():
+            if current:
+                passages.append(Passage(len(passages), page_number, heading, "\n".join(current)))
+
+        for text, starts_section in split_into_blocks(page_text or ""):
+            n = count_tokens(text, model)
+            if current and (starts_section or current_tokens + n > max_tokens):
+                flush()
+                current, current_tokens = [], 0
+            if starts_section:
+                heading = text.splitlines()[0].strip()
+            current.append(text)
+            current_tokens += n
+        flush()
+    return passages
+
+
+class BM25Index:
+    """
+    Okapi BM25 over passages with an inverted index (term -> [(passage,
+    tf)]), so a query only touches the postings of its own terms.
+    """
+
+    def __init__(self, passages: Sequence[Passage], k1: float = BM25_K1, b: float = BM25_B):
+        self.passages = list(passages)
+        self.k1 = k1
+        self.b = b
+        self.postings: Dict[str, List[Tuple[int, int]]] = defaultdict(list)
+        self.lengths: List[int] = []
+        for passage in self.passages:
+            # Headings are indexed with the body so section titles count
+            terms = tokenize(f"{passage.heading}\n{passage.text}")
+            self.lengths.append(len(terms))
+            for term, tf in Counter(terms).items():
+                self.postings[term].append((passage.index, tf))
+        n = len(self.passages)
+        self.avg_length = (sum(self.lengths) / n) if n else 0.0
+        self.idf = {term: math.log(1 + (n - len(p) + 0.5) / (len(p) + 0.5))
+                    for term, p in self.postings.items()}
+
+    def search(self, query: str, k: int = TOP_K) -> List[Tuple[float, Passage]]:
+        """Top-`k` (score, passage) pairs for `query`, best first."""
+        scores: Dict[int, float] = defaultdict(float)
+        for term in set(tokenize(query)):
+            idf = self.idf.get(term)
+            if idf is None:
+                continue
+            for idx, tf in self.postings[term]:
+                norm = self.k1 * (1 - self.b + self.b * self.lengths[idx] / (self.avg_length or 1))
+                scores[idx] += idf * tf * (self.k1 + 1) / (tf + norm)
+        best = heapq.nlargest(k, scores.items(), key=lambda item: item[1])
+        return [(score, self.passages[idx]) for idx, score in best]
+
+
+def select_passages(index: BM25Index, concepts: Iterable[str], k: int = TOP_K) -> Dict[str, List[Passage]]:
+    """concept -> its top-`k` passages."""
+    return {concept: [p for _, p in index.search(concept, k)] for concept in concepts}
+
+
+def build_focused_document(pages: Iterable[Page], concepts: Sequence[str], k: int = TOP_K,
+                           model: str = "o3-mini") -> Tuple[str, Dict]:
+    """
+    The text to extract from when only `concepts` matter: the union of the
+    top-`k` passages of every concept, deduplicated and in document order,
+    each prefixed with its page/section. Returns (text, report); the report
+    lists the pages picked per concept and the token reduction.
+    """
+    with metrics.span("retrieval"):
+        passages = build_passages(pages, model=model)
+        index = BM25Index(passages)
+        selected = select_passages(index, concepts, k)
+
+    chosen = sorted({p.index for hits in selected.values() for p in hits})
+    text = "\n\n".join(passages[i].render() for i in chosen)
+    total_tokens = sum(count_tokens(p.text, model) for p in passages)
+    sent_tokens = count_tokens(text, model) if text else 0
+
+    report = {
+        "passages": len(passages),
+        "selected": len(chosen),
+        "document_tokens": total_tokens,
+        "selected_tokens": sent_tokens,
+        "concepts": {c: sorted({p.page for p in hits if p.page is not None})
+                     for c, hits in selected.items()},
+    }
+    metrics.incr("retrieval_passages_selected", len(chosen))
+    metrics.incr("retrieval_tokens_skipped", max(0, total_tokens - sent_tokens))
+    print(f"[INFO] Retrieval: {len(chosen)}/{len(passages)} passages for {len(concepts)} concepts "
+          f"(~{sent_tokens} of {total_tokens} tokens)")
+    return text, report
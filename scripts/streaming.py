@@ -0,0 +1,349 @@
+# scripts/streaming.py
+import os
+import re
+import json
+from typing import Callable, Dict, List, Optional
+
+import rdflib
+
+#########################################
+#  Incremental parsers for streamed LLM output
+#########################################
+# Both parsers are fed the response text delta by delta. The JSON parser
+# hands every finished entity / relationship object to a callback as soon as
+# its closing brace arrives; the Turtle splitter yields complete statements.
+# Either raises MalformedStreamError as soon as the output cannot be what we
+# asked for, so the caller can close the stream instead of paying for the rest.
+
+# Leading/trailing ``` fences are expected (the non-streaming cleaners drop them too)
+FENCE = "```"
+# Structural characters outside / inside a JSON string
+_JSON_STRUCT_RE = re.compile(r'[{}\[\]"]')
+_JSON_STRING_RE = re.compile(r'["\\]')
+# Prose before the root object ("Sure! Here is the JSON:") is skipped, up to
+# this many characters; a reply that has not opened its object by then is
+# not the JSON we asked for
+MAX_PREAMBLE_CHARS = int(os.getenv("ONTOLOGY_STREAM_MAX_PREAMBLE_CHARS", "2000"))
+
+
+class MalformedStreamError(ValueError):
+    """The streamed output is not well-formed; further tokens are wasted."""
+
+
+class JSONItemStreamParser:
+    """
+    Incremental parser for the extraction reply
+    {"entities": [{...}, ...], "relationships": [{...}, ...]}.
+    Every object that completes inside one of the `callbacks` arrays is
+    decoded and passed to its callback, and kept in `items` so a reply that
+    is cut off later can still be salvaged. An object that does not decode
+    raises MalformedStreamError, unless `on_invalid(array_name, raw_text,
+    error)` is given to collect it instead.
+    """
+
+    def __init__(self, on_entity: Optional[Callable[[Dict], None]] = None,
+                 on_relationship: Optional[Callable[[Dict], None]] = None,
+                 on_invalid: Optional[Callable[[str, str, str], None]] = None):
+        self.callbacks = {"entities": on_entity, "relationships": on_relationship}
+        self.on_invalid = on_invalid
+        self.items: Dict[str, List[Dict]] = {"entities": [], "relationships": []}
+        self.done = False
+        self._preamble = ""
+        self._stack: List[str] = []
+        self._in_string = False
+        self._escape = False
+        self._array_name = None
+        self._last_key = None
+        self._key_parts: Optional[List[str]] = None
+        self._item_parts: Optional[List[str]] = None
+
+    def feed(self, text: str):
+        if self.done or not text:
+            return
+        pos = 0
+        if not self._stack:
+            pos = self._skip_preamble(text)
+            if pos is None:
+                return
+        item_start = 0 if self._item_parts is not None else None
+        key_start = 0 if self._key_parts is not None else None
+        n = len(text)
+
+        while pos < n:
+            if self._in_string:
+                if self._escape:
+                    self._escape = False
+                    pos += 1
+                    continue
+                m = _JSON_STRING_RE.search(text, pos)
+                if m is None:
+                    pos = n
+                    break
+                pos = m.end()
+                if m.group() == "\\":
+                    self._escape = True
+                    continue
+                self._in_string = False
+                if key_start is not None:
+                    self._key_parts.append(text[key_start:pos - 1])
+                    self._last_key = "".join(self._key_parts)
+                    self._key_parts = key_start = None
+                continue
+
+            m = _JSON_STRUCT_RE.search(text, pos)
+            if m is None:
+                pos = n
+                break
+            ch, pos = m.group(), m.end()
+            depth = len(self._stack)
+            if ch == '"':
+                self._in_string = True
+                if depth == 1:
+                    self._key_parts, key_start = [], pos
+            elif ch == "{":
+                if depth == 2 and self._stack[-1] == "[" and self._array_name in self.callbacks:
+                    self._item_parts, item_start = [], pos - 1
+                self._stack.append(ch)
+            elif ch == "[":
+                if depth == 1:
+                    self._array_name = self._last_key
+                self._stack.append(ch)
+            else:
+                if not self._stack or self._stack[-1] != ("{" if ch == "}" else "["):
+                    raise MalformedStreamError(f"Unbalanced '{ch}' in streamed JSON")
+                self._stack.pop()
+                if ch == "}" and len(self._stack) == 2 and item_start is not None:
+                    self._item_parts.append(text[item_start:pos])
+                    self._emit("".join(self._item_parts))
+                    self._item_parts = item_start = None
+                elif ch == "]" and len(self._stack) == 1:
+                    self._array_name = None
+                elif not self._stack:
+                    self.done = True
+                    return
+
+        if item_start is not None:
+            self._item_parts.append(text[item_start:])
+        if key_start is not None:
+            self._key_parts.append(text[key_start:])
+
+    def _skip_preamble(self, text: str):
+        """
+        Consumes whitespace, ``` fence lines and a prose lead-in before the
+        root object. Returns the offset of the root '{' in `text`, or None
+        to wait for more.
+        """
+        self._preamble += text
+        brace = self._preamble.find("{")
+        if brace < 0:
+            if len(self._preamble) > MAX_PREAMBLE_CHARS:
+                raise MalformedStreamError(
+                    f"Expected a JSON object, got: {self._preamble.strip()[:80]!r}")
+            return None
+        if brace > MAX_PREAMBLE_CHARS:
+            raise MalformedStreamError(f"Expected a JSON object, got: {self._preamble.strip()[:80]!r}")
+        # Offset of the root brace within the current delta
+        offset = brace - (len(self._preamble) - len(text))
+        self._preamble = ""
+        self._stack.append("{")
+        return offset + 1
+
+    def _emit(self, raw: str):
+        try:
+            obj = json.loads(raw)
+        except ValueError as e:
+            if self.on_invalid is None:
+                raise MalformedStreamError(f"Invalid object in '{self._array_name}': {e}")
+            self.on_invalid(self._array_name, raw, str(e))
+            return
+        if not isinstance(obj, dict):
+            return
+        self.items[self._array_name].append(obj)
+        callback = self.callbacks[self._array_name]
+        if callback is not None:
+            callback(obj)
+
+    def pending_item(self):
+        """
+        (array_name, text so far) of an item that has started but not
+        closed -- the cut-off tail of a truncated reply -- or None.
+        """
+        if self._item_parts is None:
+            return None
+        return self._array_name, "".join(self._item_parts)
+
+    def close(self):
+        if not self.done:
+            raise MalformedStreamError("Streamed JSON ended before the root object closed")
+
+
+class TurtleStatementSplitter:
+    """
+    Splits streamed Turtle into complete statements: directives and triple
+    blocks terminated by a top-level '.', plus SPARQL-style PREFIX/BASE
+    lines. Strings (including long strings), IRIs, comments and nested
+    [ ] / ( ) are tracked so dots inside them do not end a statement.
+    Fence lines are dropped. A statement still open after
+    `max_statement_chars` characters raises MalformedStreamError (prose
+    without a terminating dot would otherwise be buffered to the end).
+    """
+
+    def __init__(self, max_statement_chars: Optional[int] = None):
+        self.max_statement_chars = max_statement_chars
+        self._buf = ""
+        self._pos = 0          # next character to scan
+        self._start = 0        # start of the current statement
+        self._quote = None     # active string delimiter: ", ', \"\"\" or '''
+        self._in_iri = False
+        self._in_comment = False
+        self._depth = 0
+
+    def feed(self, text: str) -> List[str]:
+        self._buf += text
+        statements = self._scan(final=False)
+        if self.max_statement_chars and len(self._buf) > self.max_statement_chars:
+            raise MalformedStreamError(
+                f"No statement terminator within {self.max_statement_chars} chars: {self._buf[:80]!r}")
+        return statements
+
+    def close(self) -> List[str]:
+        statements = self._scan(final=True)
+        tail = self._buf[self._start:].strip()
+        if tail:
+            statements.append(tail)
+        self._buf, self._pos, self._start = "", 0, 0
+        return statements
+
+    def _at_line_start(self, i: int) -> bool:
+        j = i - 1
+        while j >= 0 and self._buf[j] in " \t":
+            j -= 1
+        return j < 0 or self._buf[j] == "\n"
+
+    def _scan(self, final: bool) -> List[str]:
+        buf, statements = self._buf, []
+        i, n = self._pos, len(buf)
+        while i < n:
+            ch = buf[i]
+            if self._in_comment:
+                if ch == "\n":
+                    self._in_comment = False
+                i += 1
+            elif self._quote:
+                if ch == "\\":
+                    if i + 1 >= n and not final:
+                        break
+                    i += 2
+                elif buf.startswith(self._quote, i):
+                    i += len(self._quote)
+                    self._quote = None
+                elif ch == self._quote[0] and len(self._quote) == 3 and n - i < 3 and not final:
+                    break  # may be the start of the closing delimiter
+                else:
+                    i += 1
+            elif self._in_iri:
+                if ch == ">":
+                    self._in_iri = False
+                    if self._depth == 0 and self._is_sparql_directive(i + 1):
+                        statements.append(buf[self._start:i + 1].strip())
+                        self._start = i + 1
+                i += 1
+            elif ch in "\"'":
+                if n - i < 3 and not final:
+                    break  # cannot tell a short string from a long one yet
+                self._quote = ch * 3 if buf.startswith(ch * 3, i) else ch
+                i += len(self._quote)
+            elif ch == "<":
+                self._in_iri = True
+                i += 1
+            elif ch == "#":
+                self._in_comment = True
+                i += 1
+            elif ch == "`" and self._at_line_start(i):
+                newline = buf.find("\n", i)
+                if newline < 0 and not final:
+                    break
+                end = n if newline < 0 else newline + 1
+                fragment = buf[self._start:i].strip()
+                if fragment:
+                    statements.append(fragment)
+                self._start = i = end
+            elif ch in "[(":
+                self._depth += 1
+                i += 1
+            elif ch in "])":
+                self._depth = max(0, self._depth - 1)
+                i += 1
+            elif ch == "." and self._depth == 0:
+                if i + 1 >= n and not final:
+                    break  # a following digit would make this a decimal
+                if i + 1 >= n or buf[i + 1].isspace() or buf[i + 1] == "#":
+                    statement = buf[self._start:i + 1].strip()
+                    if statement and statement != ".":
+                        statements.append(statement)
+                    self._start = i + 1
+                i += 1
+            else:
+                i += 1
+
+        # Keep only the unfinished statement in memory
+        self._buf = buf[self._start:]
+        self._pos = i - self._start
+        self._start = 0
+        return statements
+
+    def _is_sparql_directive(self, end: int) -> bool:
+        head = self._buf[self._start:end].lstrip()
+        return head[:1] != "@" and is_turtle_directive(head)
+
+
+# Prefixes the model routinely uses without declaring; declared ones win
+DEFAULT_TURTLE_PREFIXES = (
+    "@prefix rdf: <http://www.w3.org/1999/02/22-rdf-syntax-ns#> .\n"
+    "@prefix rdfs: <http://www.w3.org/2000/01/rdf-schema#> .\n"
+    "@prefix owl: <http://www.w3.org/2002/07/owl#> .\n"
+    "@prefix xsd: <http://www.w3.org/2001/XMLSchema#> .\n"
+)
+
+
+_DIRECTIVE_RE = re.compile(r"\s*(@prefix|@base|prefix\s|base\s)", re.IGNORECASE)
+
+
+def is_turtle_directive(statement: str) -> bool:
+    return _DIRECTIVE_RE.match(statement) is not None
+
+
+class TurtleStatementChecker:
+    """
+    Parses each streamed statement on its own (with the prefixes seen so far)
+    and raises MalformedStreamError after `max_consecutive_errors` failures
+    in a row -- one bad triple is repairable, a run of them means the model
+    has gone off the rails. With None it only reports: check() returns
+    False and `last_error` holds the parser message.
+    """
+
+    def __init__(self, max_consecutive_errors: Optional[int] = 5):
+        self.max_consecutive_errors = max_consecutive_errors
+        self.header = DEFAULT_TURTLE_PREFIXES
+        self.statements = 0
+        self.errors = 0
+        self.last_error = None
+        self._consecutive = 0
+
+    def check(self, statement: str) -> bool:
+        self.statements += 1
+        try:
+            rdflib.Graph().parse(data=self.header + statement + "\n", format="turtle")
+        except Exception as e:
+            self.errors += 1
+            self._consecutive += 1
+            self.last_error = f"{type(e).__name__}: {e}"
+            if self.max_consecutive_errors and self._consecutive >= self.max_consecutive_errors:
+                raise MalformedStreamError(
+                    f"{self._consecutive} consecutive invalid Turtle statements, last: "
+                    f"{statement[:80]!r} ({type(e).__name__})")
+            return False
+        self._consecutive = 0
+        if is_turtle_directive(statement):
+            self.header += statement + "\n"
+        return True
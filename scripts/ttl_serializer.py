@@ -0,0 +1,239 @@
+# scripts/ttl_serializer.py
+import re
+from collections import defaultdict
+from typing import Dict, Optional
+
+import rdflib
+from rdflib import BNode, Literal, URIRef
+from rdflib.namespace import OWL, RDF, RDFS, SKOS, XSD
+
+#########################################
+#  Deterministic JSON -> Turtle
+#########################################
+DEFAULT_BASE_IRI = "http://www.example.org/ontology#"
+
+# Relationship types that mean "is a kind of" / "is an instance of"
+SUBCLASS_TYPES = {"subclassof", "subclass_of", "is_a", "isa", "is_a_kind_of", "kind_of", "type_of"}
+INSTANCE_TYPES = {"instanceof", "instance_of", "is_instance_of", "rdf:type", "type", "member_of_class"}
+
+XSD_TYPES = {
+    "string": XSD.string, "str": XSD.string, "text": XSD.string,
+    "integer": XSD.integer, "int": XSD.integer,
+    "decimal": XSD.decimal, "float": XSD.decimal, "double": XSD.double, "number": XSD.decimal,
+    "boolean": XSD.boolean, "bool": XSD.boolean,
+    "date": XSD.date, "datetime": XSD.dateTime,
+}
+
+_WORD_RE = re.compile(r"[A-Za-z0-9]+")
+
+
+def _key(name: str) -> str:
+    # Same normalization merge_partial_json applies to names and endpoints
+    return name.strip().lower().replace(' ', '_')
+
+
+def class_local_name(name: str) -> str:
+    """'ground vehicle' / 'ground_vehicle' -> 'GroundVehicle'"""
+    words = _WORD_RE.findall(name)
+    local = "".join(w[:1].upper() + w[1:] for w in words) or "Unnamed"
+    return local if local[0].isalpha() else f"_{local}"
+
+
+def property_local_name(name: str) -> str:
+    """'has part' / 'Has_Part' -> 'hasPart'"""
+    local = class_local_name(name)
+    return local[0].lower() + local[1:] if local[0].isalpha() else local
+
+
+def _entity_kind(entity: Dict) -> str:
+    kind = re.sub(r"[\s_]", "", str(entity.get("type", "")).lower())
+    if kind in ("class", "owlclass", "concept"):
+        return "class"
+    if kind in ("individual", "instance", "namedindividual"):
+        return "individual"
+    if kind in ("objectproperty", "relation"):
+        return "object_property"
+    if kind in ("dataproperty", "datatypeproperty", "attribute"):
+        return "data_property"
+    return "individual" if entity.get("class_membership") else "class"
+
+
+def _literal(value) -> Literal:
+    if isinstance(value, bool):
+        return Literal(value, datatype=XSD.boolean)
+    if isinstance(value, int):
+        return Literal(value, datatype=XSD.integer)
+    if isinstance(value, float):
+        return Literal(value, datatype=XSD.decimal)
+    if isinstance(value, (list, tuple)):
+        return Literal(", ".join(str(v) for v in value))
+    return Literal(str(value))
+
+
+def _as_list(value):
+    if value is None:
+        return []
+    return value if isinstance(value, list) else [value]
+
+
+def merged_json_to_graph(merged: Dict, base_iri: str = DEFAULT_BASE_IRI,
+                         ontology_label: Optional[str] = None) -> rdflib.Graph:
+    """
+    Maps merge_partial_json output to OWL:
+      - entities -> owl:Class / owl:NamedIndividual / owl:ObjectProperty /
+        owl:DatatypeProperty, with rdfs:label, rdfs:comment and skos:altLabel
+        for resolved aliases
+      - superclasses / class_membership -> rdfs:subClassOf / rdf:type
+      - relationships -> rdfs:subClassOf, rdf:type, or an owl:ObjectProperty
+        (an owl:someValuesFrom restriction per pair of classes, assertions
+        between individuals)
+      - individual 'properties' -> owl:DatatypeProperty assertions
+      - source_chunks -> :sourceChunk annotations for provenance
+    """
+    ns = rdflib.Namespace(base_iri)
+    g = rdflib.Graph()
+    g.bind("", ns)
+    g.bind("owl", OWL)
+    g.bind("rdfs", RDFS)
+    g.bind("xsd", XSD)
+    g.bind("skos", SKOS)
+
+    ontology = URIRef(base_iri.rstrip("#/"))
+    g.add((ontology, RDF.type, OWL.Ontology))
+    if ontology_label:
+        g.add((ontology, RDFS.label, Literal(ontology_label)))
+
+    source_chunk = ns.sourceChunk
+    g.add((source_chunk, RDF.type, OWL.AnnotationProperty))
+    g.add((source_chunk, RDFS.label, Literal("source chunk")))
+
+    entities = merged.get("entities", [])
+    kinds: Dict[str, str] = {}
+    uris: Dict[str, URIRef] = {}
+    owners: Dict[str, str] = {}  # local name -> key of the entity it was minted for
+
+    def mint(key: str, local: str) -> URIRef:
+        """
+        IRI for a class / individual. Distinct entities whose names reduce
+        to the same local name ("Fuel-Tank" / "fuel tank", "???" / "-")
+        get _2, _3, ... instead of silently sharing one IRI.
+        """
+        candidate, n = local, 1
+        while owners.setdefault(candidate, key) != key:
+            n += 1
+            candidate = f"{local}_{n}"
+        return ns[candidate]
+
+    for entity in entities:
+        key = entity.get("id") or _key(entity["name"])
+        kinds[key] = _entity_kind(entity)
+        if kinds[key].endswith("property"):
+            # Spelling variants of a relation name are meant to be one property
+            uris[key] = ns[property_local_name(entity["name"])]
+        else:
+            uris[key] = mint(key, class_local_name(entity["name"]))
+
+    def ref(name: str, kind: str = "class") -> URIRef:
+        """URI for an entity or for a name only mentioned by reference."""
+        key = _key(name)
+        if key not in uris:
+            kinds[key] = kind
+            uris[key] = mint(key, class_local_name(name))
+            g.add((uris[key], RDF.type, OWL.Class if kind == "class" else OWL.NamedIndividual))
+            g.add((uris[key], RDFS.label, Literal(name.replace("_", " "))))
+        return uris[key]
+
+    owl_type = {
+        "class": OWL.Class,
+        "individual": OWL.NamedIndividual,
+        "object_property": OWL.ObjectProperty,
+        "data_property": OWL.DatatypeProperty,
+    }
+    aliases = merged.get("aliases", {})
+    class_pairs = defaultdict(set)   # object property -> {(source, target)} between classes
+    data_domains = defaultdict(set)  # data property -> classes it was given on
+
+    for entity in entities:
+        key = entity.get("id") or _key(entity["name"])
+        uri, kind = uris[key], kinds[key]
+        g.add((uri, RDF.type, owl_type[kind]))
+        g.add((uri, RDFS.label, Literal(entity["name"])))
+        if entity.get("description"):
+            g.add((uri, RDFS.comment, Literal(entity["description"])))
+        for alias in aliases.get(entity["name"], []):
+            g.add((uri, SKOS.altLabel, Literal(alias.replace("_", " "))))
+        for idx in entity.get("source_chunks", []):
+            g.add((uri, source_chunk, Literal(idx, datatype=XSD.integer)))
+
+        for sup in _as_list(entity.get("superclasses")):
+            g.add((uri, RDFS.subClassOf, ref(sup)))
+        for cls in _as_list(entity.get("class_membership")):
+            g.add((uri, RDF.type, ref(cls)))
+
+        if kind.endswith("property"):
+            for dom in _as_list(entity.get("domain")):
+                g.add((uri, RDFS.domain, ref(dom)))
+            for rng in _as_list(entity.get("range")):
+                datatype = XSD_TYPES.get(str(rng).lower().replace("xsd:", ""))
+                if kind == "data_property" and datatype is not None:
+                    g.add((uri, RDFS.range, datatype))
+                else:
+                    g.add((uri, RDFS.range, ref(rng)))
+            continue
+
+        for prop_name, value in (entity.get("properties") or {}).items():
+            prop = ns[property_local_name(prop_name)]
+            g.add((prop, RDF.type, OWL.DatatypeProperty))
+            g.add((prop, RDFS.label, Literal(prop_name.replace("_", " "))))
+            if kind == "individual":
+                g.add((uri, prop, _literal(value)))
+            else:
+                data_domains[prop].add(uri)
+
+    for rel in merged.get("relationships", []):
+        rel_type = _key(rel["type"])
+        source_kind = kinds.get(_key(rel["source"]), "class")
+        if rel_type in SUBCLASS_TYPES and source_kind == "class":
+            g.add((ref(rel["source"]), RDFS.subClassOf, ref(rel["target"])))
+            continue
+        if rel_type in INSTANCE_TYPES or (rel_type in SUBCLASS_TYPES and source_kind == "individual"):
+            g.add((ref(rel["source"], "individual"), RDF.type, ref(rel["target"])))
+            continue
+
+        prop = ns[property_local_name(rel["type"])]
+        if (prop, RDF.type, OWL.ObjectProperty) not in g:
+            g.add((prop, RDF.type, OWL.ObjectProperty))
+            g.add((prop, RDFS.label, Literal(rel["type"].replace("_", " "))))
+        source, target = ref(rel["source"]), ref(rel["target"])
+        if source_kind == "individual":
+            g.add((source, prop, target))
+        elif (source, target) not in class_pairs[prop]:
+            class_pairs[prop].add((source, target))
+            restriction = BNode()
+            g.add((restriction, RDF.type, OWL.Restriction))
+            g.add((restriction, OWL.onProperty, prop))
+            g.add((restriction, OWL.someValuesFrom, target))
+            g.add((source, RDFS.subClassOf, restriction))
+
+    # Several rdfs:domain (or range) values mean their intersection in OWL,
+    # so one is only stated when every use of the property agrees on it;
+    # the restrictions above keep the individual pairs
+    for prop, pairs in class_pairs.items():
+        sources, targets = {s for s, _ in pairs}, {t for _, t in pairs}
+        if len(sources) == 1 and g.value(prop, RDFS.domain) is None:
+            g.add((prop, RDFS.domain, sources.pop()))
+        if len(targets) == 1 and g.value(prop, RDFS.range) is None:
+            g.add((prop, RDFS.range, targets.pop()))
+    for prop, classes in data_domains.items():
+        if len(classes) == 1 and g.value(prop, RDFS.domain) is None:
+            g.add((prop, RDFS.domain, classes.pop()))
+
+    return g
+
+
+def serialize_merged_to_ttl(merged: Dict, base_iri: str = DEFAULT_BASE_IRI,
+                            ontology_label: Optional[str] = None) -> str:
+    """
+    Turtle text for merge_partial_json output; no LLM involved.
+    """
+    return merged_json_to_graph(merged, base_iri, ontology_label).serialize(format="turtle")
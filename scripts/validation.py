@@ -1,7 +1,219 @@
+import os
+import re
+import json
+from typing import Callable, Dict, List, Optional, Tuple
+
 import rdflib
 
-def clean_and_validate_ttl(raw_ttl: str) -> str:
-    lines = raw_ttl.splitlines()
-    if len(lines) <= 1:
-        return ""
-    return "\n".join(lines[1:-1])
+from metrics import metrics
+from streaming import (JSONItemStreamParser, TurtleStatementSplitter, TurtleStatementChecker,
+                       MalformedStreamError, DEFAULT_TURTLE_PREFIXES)
+
+#########################################
+#  Validation with targeted repair
+#########################################
+# LLM output is parsed for real (json / rdflib). When it does not parse, the
+# failing pieces are located -- single entity/relationship objects for JSON,
+# single statements for Turtle -- and only those are sent to `repair_fn`
+# (fragment, error, kind, context) -> corrected fragment. Repairs per call
+# are capped, so a badly broken reply costs a few small requests at most.
+
+MAX_REPAIR_ATTEMPTS = int(os.getenv("ONTOLOGY_MAX_REPAIRS", "3"))
+# Parser messages quoted back to the model are cut to this length
+MAX_ERROR_CHARS = 300
+
+_FENCED_RE = re.compile(r"```[\w+-]*[ \t]*\n(.*?)(?:\n[ \t]*```|\Z)", re.DOTALL)
+_PREFIX_DECL_RE = re.compile(r"^\s*@?prefix\s+([\w.-]*):", re.IGNORECASE | re.MULTILINE)
+
+RepairFn = Callable[[str, str, str, str], str]
+
+
+class ValidationError(ValueError):
+    """The output could not be parsed or repaired."""
+
+
+def strip_code_fences(raw: str) -> str:
+    """
+    Returns the content of the first ``` fenced block (a missing closing
+    fence is tolerated), or the whole text when there is no fence.
+    """
+    text = raw.strip()
+    m = _FENCED_RE.search(text)
+    if m:
+        return m.group(1).strip()
+    return text
+
+
+def _short(error) -> str:
+    error = " ".join(str(error).split())
+    return error if len(error) <= MAX_ERROR_CHARS else error[:MAX_ERROR_CHARS] + "..."
+
+
+#########################################
+#  JSON (extraction partials)
+#########################################
+def _locate_json_items(text: str):
+    """
+    Splits an extraction reply into its entity / relationship objects.
+    Returns (slots, structure_ok): slots are [array_name, obj or None, raw,
+    error] in reply order; structure_ok is False when the root object never
+    closed. Raises MalformedStreamError when the reply has no recognizable
+    structure at all.
+    """
+    slots: List[list] = []
+    parser = JSONItemStreamParser(
+        on_entity=lambda obj: slots.append(["entities", obj, None, None]),
+        on_relationship=lambda obj: slots.append(["relationships", obj, None, None]),
+        on_invalid=lambda name, raw, error: slots.append([name, None, raw, error]),
+    )
+    parser.feed(text)
+    pending = parser.pending_item()
+    if pending is not None:
+        slots.append([pending[0], None, pending[1], "reply was cut off inside this object"])
+    return slots, parser.done
+
+
+def _parse_fragment(text: str):
+    try:
+        return json.loads(strip_code_fences(text))
+    except ValueError:
+        return None
+
+
+def clean_and_validate_json(raw: str, repair_fn: Optional[RepairFn] = None,
+                            max_repairs: int = MAX_REPAIR_ATTEMPTS,
+                            on_repaired: Optional[Callable[[str, Dict], None]] = None) -> Dict:
+    """
+    Parses an extraction reply into a partial {"entities", "relationships"};
+    text before the first '{' is ignored. If the reply as a whole is not
+    valid JSON, the well-formed objects are kept and each broken one is sent
+    to `repair_fn` (at most `max_repairs` calls); objects that stay broken
+    are dropped and counted under partial["validation"].
+    `on_repaired(array_name, obj)` is called for every repaired object.
+    Raises ValidationError when nothing is usable.
+    """
+    text = strip_code_fences(raw)
+    # Discard a prose lead-in ("Sure! Here is the JSON:") and any trailing
+    # remark; the object itself is what was asked for
+    brace = text.find("{")
+    if brace > 0:
+        text = text[brace:]
+    try:
+        data, _ = json.JSONDecoder().raw_decode(text)
+    except ValueError as e:
+        first_error = e
+    else:
+        if not isinstance(data, dict):
+            raise ValidationError(f"Expected a JSON object, got {type(data).__name__}")
+        return data
+
+    try:
+        slots, structure_ok = _locate_json_items(text)
+    except MalformedStreamError as e:
+        raise ValidationError(f"Invalid JSON returned ({first_error}): {e}")
+    if not slots:
+        raise ValidationError(f"Invalid JSON returned ({first_error}): {text[:200]}...")
+
+    repaired = dropped = 0
+    for slot in slots:
+        name, obj, fragment, error = slot
+        if obj is not None:
+            continue
+        fixed = None
+        if repair_fn is not None and repaired + dropped < max_repairs:
+            context = f"This is one object of the \"{name}\" list of an ontology extraction."
+            fixed = _parse_fragment(repair_fn(fragment, _short(error), "json", context))
+            metrics.incr("validation_repairs", kind="json",
+                         outcome="fixed" if isinstance(fixed, dict) else "failed")
+        if isinstance(fixed, dict):
+            slot[1] = fixed
+            repaired += 1
+            if on_repaired is not None:
+                on_repaired(name, fixed)
+        else:
+            dropped += 1
+
+    partial = {"entities": [], "relationships": []}
+    for name, obj, _, _ in slots:
+        if obj is not None:
+            partial[name].append(obj)
+    partial["validation"] = {"error": _short(first_error), "structure_ok": structure_ok,
+                             "repaired": repaired, "dropped": dropped}
+    metrics.incr("validation_dropped_fragments", dropped, kind="json")
+    print(f"[INFO] Invalid JSON partial salvaged: {len(slots) - dropped} objects kept "
+          f"({repaired} repaired), {dropped} dropped")
+    return partial
+
+
+#########################################
+#  Turtle
+#########################################
+def split_turtle_statements(text: str) -> List[str]:
+    splitter = TurtleStatementSplitter()
+    return splitter.feed(text) + splitter.close()
+
+
+def _comment_out(statement: str, error: str) -> str:
+    lines = [f"# INVALID ({error or 'parse error'}):"]
+    lines.extend("# " + line for line in statement.splitlines())
+    return "\n".join(lines)
+
+
+def validate_ttl(raw_ttl: str, repair_fn: Optional[RepairFn] = None,
+                 max_repairs: int = MAX_REPAIR_ATTEMPTS) -> Tuple[str, Dict]:
+    """
+    Returns (turtle, report). Valid input comes back as is (fences removed).
+    Otherwise every statement is parsed on its own with the prefixes declared
+    before it; failing statements are sent to `repair_fn` (with the prefix
+    block as context, at most `max_repairs` calls) and the ones that still
+    fail are commented out, so the result always parses.
+    """
+    text = strip_code_fences(raw_ttl)
+    report = {"statements": 0, "invalid": 0, "repaired": 0, "dropped": 0}
+    if not text:
+        return "", report
+    try:
+        rdflib.Graph().parse(data=text, format="turtle")
+        return text, report
+    except Exception:
+        pass
+
+    checker = TurtleStatementChecker(max_consecutive_errors=None)
+    out = []
+    for statement in split_turtle_statements(text):
+        report["statements"] += 1
+        if checker.check(statement):
+            out.append(statement)
+            continue
+        report["invalid"] += 1
+        error = _short(checker.last_error)
+        if repair_fn is not None and report["repaired"] + report["dropped"] < max_repairs:
+            fixed = strip_code_fences(repair_fn(statement, error, "turtle", checker.header))
+            ok = bool(fixed) and checker.check(fixed)
+            metrics.incr("validation_repairs", kind="turtle", outcome="fixed" if ok else "failed")
+            if ok:
+                report["repaired"] += 1
+                out.append(fixed)
+                continue
+        report["dropped"] += 1
+        out.append(_comment_out(statement, error))
+
+    # Statements were checked with the standard prefixes pre-bound; declare
+    # the ones the reply used without declaring
+    declared = set(_PREFIX_DECL_RE.findall("\n".join(out)))
+    missing = [line for line in DEFAULT_TURTLE_PREFIXES.splitlines()
+               if _PREFIX_DECL_RE.match(line).group(1) not in declared]
+
+    metrics.incr("validation_dropped_fragments", report["dropped"], kind="turtle")
+    print(f"[INFO] Turtle validation: {report['invalid']}/{report['statements']} statements invalid, "
+          f"{report['repaired']} repaired, {report['dropped']} commented out")
+    header = "\n".join(missing) + "\n\n" if missing else ""
+    return header + "\n\n".join(out) + "\n", report
+
+
+def clean_and_validate_ttl(raw_ttl: str, repair_fn: Optional[RepairFn] = None,
+                           max_repairs: int = MAX_REPAIR_ATTEMPTS) -> str:
+    """
+    Strips code fences and returns Turtle that parses; see validate_ttl.
+    """
+    return validate_ttl(raw_ttl, repair_fn=repair_fn, max_repairs=max_repairs)[0]
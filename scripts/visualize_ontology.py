@@ -1,6 +1,9 @@
-import rdflib
-import pydot
+import os
+from collections import defaultdict
+from rdflib import BNode, URIRef
 from rdflib.namespace import RDFS, RDF, OWL
+from metrics import metrics
+from graph_cache import load_triples
 
 def get_rdfs_label(graph, uri):
     """
@@ -20,135 +23,335 @@ def get_rdfs_comment(graph, uri):
     cmt = next(graph.objects(uri, RDFS.comment), None)
     return str(cmt) if cmt else ""
 
-def visualize_ontology(turtle_file, output_dot="ontology_graph.dot"):
+
+_BUILTIN_NAMESPACES = (str(OWL), str(RDF), str(RDFS))
+
+
+class GraphIndex:
     """
-    Parses the .ttl file and produces a .dot graph with:
-      - Classes (shape=box, labeled by rdfs:label)
-      - Subclass-of edges (blue dotted)
-      - ObjectProperty domain->range edges (gray, deduplicated)
-      - Individuals (shape=ellipse, labeled by rdfs:label)
-      - Instance-level ObjectProperty edges (green)
-      - rdfs:comment displayed in node tooltips
-      - Uses a strict graph to avoid duplicate edges
+    Everything visualize_ontology needs from the graph, gathered in one pass
+    over the triples instead of one graph lookup per node and predicate.
     """
-    g = rdflib.Graph()
-    g.parse(turtle_file, format="ttl")
 
-    # Use strict=True so parallel edges get merged automatically
-    dot = pydot.Dot(graph_type='digraph', rankdir='LR', fontsize='10', strict=True)
+    def __init__(self, g):
+        self.labels = {}
+        self.comments = {}
+        self.types = defaultdict(set)
+        self.domains = defaultdict(list)
+        self.ranges = defaultdict(list)
+        self.subclass_of = []
+        # (class, property, target, restriction node) for every
+        # "class subClassOf [owl:onProperty p ; owl:someValuesFrom target]"
+        self.restrictions = []
+        self.outgoing = defaultdict(list)  # subject -> [(predicate, object)]
+        restricted = []
+        on_property, some_values = {}, {}
+
+        for s, p, o in g:
+            if p == RDF.type:
+                self.types[s].add(o)
+            elif p == RDFS.label:
+                if o and s not in self.labels:
+                    self.labels[s] = str(o)
+            elif p == RDFS.comment:
+                if o and s not in self.comments:
+                    self.comments[s] = str(o)
+            elif p == RDFS.subClassOf:
+                if isinstance(o, BNode):
+                    restricted.append((s, o))
+                else:
+                    self.subclass_of.append((s, o))
+            elif p == OWL.onProperty:
+                on_property[s] = o
+            elif p == OWL.someValuesFrom:
+                some_values[s] = o
+            elif p == RDFS.domain:
+                self.domains[s].append(o)
+            elif p == RDFS.range:
+                self.ranges[s].append(o)
+            self.outgoing[s].append((p, o))
+
+        for cls, node in restricted:
+            if node in on_property and node in some_values:
+                self.restrictions.append((cls, on_property[node], some_values[node], node))
+                # Drawn as an edge, not as a node of its own
+                self.types.pop(node, None)
+
+        self.classes = {s for s, t in self.types.items() if OWL.Class in t}
+        self.object_properties = {s for s, t in self.types.items() if OWL.ObjectProperty in t}
+
+    def is_individual(self, node):
+        """
+        Typed as owl:NamedIndividual or as some class of the ontology; nodes
+        typed only with OWL / RDF / RDFS built-ins (properties, the ontology
+        header, restrictions, ...) are not individuals.
+        """
+        return any(t == OWL.NamedIndividual or not str(t).startswith(_BUILTIN_NAMESPACES)
+                   for t in self.types.get(node, ()))
+
+    def label(self, uri):
+        label = self.labels.get(uri)
+        if label:
+            return label
+        # fallback to the portion after '#' or last '/'
+        return uri.split('#')[-1] or uri.rsplit('/', 1)[-1]
+
+    def comment(self, uri):
+        return self.comments.get(uri, "")
+
+    def neighbors(self):
+        """
+        Undirected adjacency over the edges build_dot_model draws: subClassOf,
+        domain -> range of object properties, class-level restrictions,
+        rdf:type and instance-level
+        object property links.
+        """
+        adj = defaultdict(set)
+
+        def link(a, b):
+            adj[a].add(b)
+            adj[b].add(a)
+
+        for subclass, superclass in self.subclass_of:
+            link(subclass, superclass)
+        for prop in self.object_properties:
+            for domain in self.domains.get(prop, ()):
+                for rng in self.ranges.get(prop, ()):
+                    link(domain, rng)
+        for cls, _, target, _ in self.restrictions:
+            link(cls, target)
+        for s, types in self.types.items():
+            for t in types:
+                if t in self.classes:
+                    link(s, t)
+        for s, pairs in self.outgoing.items():
+            for p, o in pairs:
+                if p in self.object_properties:
+                    link(s, o)
+        return adj
+
+    def find(self, name):
+        """
+        Resolves a full IRI, a local name or a label (case-insensitive) to a
+        node of the graph; returns None when nothing matches.
+        """
+        candidates = set(self.types) | set(self.labels)
+        for uri in candidates:
+            if str(uri) == name:
+                return uri
+        wanted = name.lower()
+        for uri in candidates:
+            local = uri.split('#')[-1] or uri.rsplit('/', 1)[-1]
+            if local.lower() == wanted or self.labels.get(uri, "").lower() == wanted:
+                return uri
+        return None
+
+
+def build_dot_model(g, index=None):
+    """
+    Computes the styled nodes and deduplicated edges for `g`.
+    Returns (nodes, edges): nodes maps node id -> attribute dict, edges is a
+    list of (source id, target id, attribute dict), both in insertion order.
+    """
+    index = index or GraphIndex(g)
+    nodes = {}
+    edges = []
+    edge_set = set()
 
     def add_or_update_node(uri, shape, color, fillcolor):
-        node_id = str(uri)
-        label = get_rdfs_label(g, uri)
-        comment = get_rdfs_comment(g, uri)
-
-        existing_node = dot.get_node(node_id)
-        if existing_node:
-            node = existing_node[0]
-        else:
-            node = pydot.Node(node_id)
-            dot.add_node(node)
-
-        node.set("shape", shape)
-        node.set("style", "filled")
-        node.set("fillcolor", fillcolor)
-        node.set("color", color)
-        node.set("label", label)
+        node = nodes.setdefault(str(uri), {})
+        node["shape"] = shape
+        node["style"] = "filled"
+        node["fillcolor"] = fillcolor
+        node["color"] = color
+        node["label"] = index.label(uri)
+        comment = index.comment(uri)
         if comment:
-            node.set("tooltip", comment)
+            node["tooltip"] = comment
 
-        return node
+    def add_edge(src, dst, key, **attrs):
+        edge_tuple = (src, dst, key)
+        if edge_tuple not in edge_set:
+            edge_set.add(edge_tuple)
+            edges.append((src, dst, attrs))
 
     # --- 1) Identify all Classes ---
-    owl_classes = set(g.subjects(RDF.type, OWL.Class))
-    for cls in owl_classes:
+    for cls in index.classes:
         add_or_update_node(cls, shape="box", color="black", fillcolor="lightblue")
 
     # --- 2) subClassOf edges ---
-    # We'll store edges in a set to ensure no duplicates
-    edge_set = set()
-    for subclass, superclass in g.subject_objects(RDFS.subClassOf):
-        if (subclass, RDF.type, OWL.Class) in g:
-            sub_id = str(subclass)
-            sup_id = str(superclass)
-
+    for subclass, superclass in index.subclass_of:
+        if subclass in index.classes:
             add_or_update_node(subclass, "box", "black", "lightblue")
             add_or_update_node(superclass, "box", "black", "lightblue")
-
-            edge_tuple = (sub_id, sup_id, "subClassOf")
-            if edge_tuple not in edge_set:
-                edge_set.add(edge_tuple)
-                edge = pydot.Edge(
-                    sub_id, sup_id,
-                    label="subClassOf",
-                    style="dotted",
-                    color="blue"
-                )
-                dot.add_edge(edge)
+            add_edge(str(subclass), str(superclass), "subClassOf",
+                     label="subClassOf", style="dotted", color="blue")
 
     # --- 3) ObjectProperties: domain->range edges ---
-    object_properties = set(g.subjects(RDF.type, OWL.ObjectProperty))
-
-    for prop in object_properties:
-        prop_label = get_rdfs_label(g, prop)
-        # domain(s)
-        for domain in g.objects(prop, RDFS.domain):
+    for prop in index.object_properties:
+        prop_label = index.label(prop)
+        for domain in index.domains.get(prop, ()):
             add_or_update_node(domain, shape="box", color="black", fillcolor="lightblue")
-            # range(s)
-            for rng in g.objects(prop, RDFS.range):
+            for rng in index.ranges.get(prop, ()):
                 add_or_update_node(rng, shape="box", color="black", fillcolor="lightblue")
-                domain_id = str(domain)
-                range_id = str(rng)
-                edge_tuple = (domain_id, range_id, prop_label)
-                if edge_tuple not in edge_set:
-                    edge_set.add(edge_tuple)
-                    dot.add_edge(pydot.Edge(
-                        domain_id, range_id,
-                        label=prop_label,
-                        fontsize="8",
-                        color="gray"
-                    ))
+                add_edge(str(domain), str(rng), prop_label,
+                         label=prop_label, fontsize="8", color="gray")
+    # Class-level relationships stated as someValuesFrom restrictions
+    for cls, prop, target, _ in index.restrictions:
+        if prop in index.object_properties and isinstance(target, URIRef):
+            prop_label = index.label(prop)
+            add_or_update_node(cls, shape="box", color="black", fillcolor="lightblue")
+            add_or_update_node(target, shape="box", color="black", fillcolor="lightblue")
+            add_edge(str(cls), str(target), prop_label,
+                     label=prop_label, fontsize="8", color="gray")
 
     # --- 4) Identify Individuals ---
-    individuals = set()
-    for subj, _, obj in g.triples((None, RDF.type, None)):
-        if obj not in (OWL.Class, OWL.ObjectProperty, RDFS.Class):
-            individuals.add(subj)
-
+    individuals = [s for s in index.types if index.is_individual(s)]
     for ind in individuals:
         add_or_update_node(ind, "ellipse", "black", "lightyellow")
 
     # -- 4b) rdf:type edges for individuals to classes
     for ind in individuals:
-        ind_id = str(ind)
-        for obj_class in g.objects(ind, RDF.type):
-            if (obj_class, RDF.type, OWL.Class) in g:
-                cls_id = str(obj_class)
-                edge_tuple = (ind_id, cls_id, "rdf:type")
-                if edge_tuple not in edge_set:
-                    edge_set.add(edge_tuple)
-                    dot.add_edge(pydot.Edge(
-                        ind_id, cls_id,
-                        label="rdf:type",
-                        color="green"
-                    ))
+        for obj_class in index.types[ind]:
+            if obj_class in index.classes:
+                add_edge(str(ind), str(obj_class), "rdf:type", label="rdf:type", color="green")
 
     # --- 5) Instance-level ObjectProperties
     for ind in individuals:
-        ind_id = str(ind)
-        for prop, obj in g.predicate_objects(ind):
-            if (prop, RDF.type, OWL.ObjectProperty) in g:
+        for prop, obj in index.outgoing.get(ind, ()):
+            if prop in index.object_properties:
                 add_or_update_node(obj, "ellipse", "black", "lightyellow")
-                prop_label = get_rdfs_label(g, prop)
-                obj_id = str(obj)
-                edge_tuple = (ind_id, obj_id, prop_label)
-                if edge_tuple not in edge_set:
-                    edge_set.add(edge_tuple)
-                    dot.add_edge(pydot.Edge(
-                        ind_id, obj_id,
-                        label=prop_label,
-                        color="green"
-                    ))
-
-    dot.write_raw(output_dot)
+                prop_label = index.label(prop)
+                add_edge(str(ind), str(obj), prop_label, label=prop_label, color="green")
+
+    return nodes, edges
+
+
+def neighborhood_triples(g, index, focus, hops=2):
+    """
+    The node set within `hops` edges of `focus` and the subset of triples of
+    `g` needed to draw it (everything about those nodes, plus the object
+    properties whose domain or range is among them).
+    """
+    adj = index.neighbors()
+    keep = {focus}
+    frontier = [focus]
+    for _ in range(hops):
+        nxt = []
+        for node in frontier:
+            for other in adj.get(node, ()):
+                if other not in keep:
+                    keep.add(other)
+                    nxt.append(other)
+        frontier = nxt
+
+    props = {p for p in index.object_properties
+             if any(d in keep for d in index.domains.get(p, ()))
+             or any(r in keep for r in index.ranges.get(p, ()))}
+    # Restriction nodes of kept classes, so their edges are drawn too
+    restrictions = {node for cls, _, _, node in index.restrictions if cls in keep}
+    triples = [(s, p, o) for s, p, o in g if s in keep or s in props or s in restrictions]
+    return keep, triples
+
+
+def dot_quote(value):
+    """
+    Quotes a DOT ID/attribute value (full IRIs are not valid bare DOT IDs).
+    """
+    escaped = str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+    return f'"{escaped}"'
+
+
+def _dot_attrs(attrs):
+    return ", ".join(f"{k}={dot_quote(v)}" for k, v in attrs.items())
+
+
+def write_dot(nodes, edges, output_dot):
+    """
+    Streams a strict digraph to `output_dot` line by line.
+    Returns the number of bytes written.
+    """
+    if os.path.dirname(output_dot):
+        os.makedirs(os.path.dirname(output_dot), exist_ok=True)
+    written = 0
+    with open(output_dot, "w", encoding="utf-8", buffering=1 << 20) as f:
+        for line in ("strict digraph G {\n", "rankdir=LR;\n", "fontsize=10;\n"):
+            written += f.write(line)
+        for node_id, attrs in nodes.items():
+            written += f.write(f"{dot_quote(node_id)} [{_dot_attrs(attrs)}];\n")
+        for src, dst, attrs in edges:
+            written += f.write(f"{dot_quote(src)} -> {dot_quote(dst)} [{_dot_attrs(attrs)}];\n")
+        written += f.write("}\n")
+    return written
+
+
+def visualize_ontology(turtle_file, output_dot="ontology_graph.dot", use_cache=True):
+    """
+    Parses the .ttl file and produces a .dot graph with:
+      - Classes (shape=box, labeled by rdfs:label)
+      - Subclass-of edges (blue dotted)
+      - ObjectProperty domain->range edges (gray, deduplicated)
+      - Individuals (shape=ellipse, labeled by rdfs:label)
+      - Instance-level ObjectProperty edges (green)
+      - rdfs:comment displayed in node tooltips
+      - Uses a strict graph to avoid duplicate edges
+    Labels, comments and types are indexed in a single pass over the graph
+    and the DOT text is streamed straight to `output_dot`. The parsed triples
+    come from graph_cache, so re-rendering an unchanged file skips parsing.
+    """
+    with metrics.span("visualize_parse"):
+        g = load_triples(turtle_file, format="ttl", use_cache=use_cache)
+
+    with metrics.span("visualize_build"):
+        nodes, edges = build_dot_model(g)
+    with metrics.span("visualize_write"):
+        written = write_dot(nodes, edges, output_dot)
+    metrics.incr("bytes_written", written, artifact="dot")
+    metrics.incr("graph_triples", len(g))
     print(f"[INFO] Wrote robust, deduplicated .dot to: {output_dot}")
+
+
+def visualize_neighborhood(turtle_file, focus, hops=2, output_dot=None, use_cache=True):
+    """
+    Focused DOT export: only the nodes within `hops` edges of `focus` (IRI,
+    local name or label) and the edges among them, styled exactly like
+    visualize_ontology. Small enough for Graphviz even when the whole
+    ontology is not. Returns the path written.
+    """
+    g = load_triples(turtle_file, format="ttl", use_cache=use_cache)
+    index = GraphIndex(g)
+    node = index.find(focus)
+    if node is None:
+        raise KeyError(f"'{focus}' is not a class, property or individual of {turtle_file}")
+
+    keep, triples = neighborhood_triples(g, index, node, hops)
+    nodes, edges = build_dot_model(triples)
+    kept = {str(n) for n in keep}
+    nodes = {n: attrs for n, attrs in nodes.items() if n in kept}
+    edges = [e for e in edges if e[0] in kept and e[1] in kept]
+    if str(node) in nodes:
+        nodes[str(node)]["penwidth"] = "3"
+
+    if output_dot is None:
+        base = os.path.splitext(turtle_file)[0]
+        local = node.split('#')[-1] or node.rsplit('/', 1)[-1]
+        output_dot = f"{base}_{local}_{hops}hop.dot"
+    write_dot(nodes, edges, output_dot)
+    print(f"[INFO] Wrote {len(nodes)} nodes / {len(edges)} edges around '{index.label(node)}' to: {output_dot}")
+    return output_dot
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="TTL -> DOT (whole graph or an N-hop neighborhood)")
+    parser.add_argument("turtle_file")
+    parser.add_argument("output_dot", nargs="?", default=None)
+    parser.add_argument("--focus", help="class/individual IRI, local name or label to center on")
+    parser.add_argument("--hops", type=int, default=2)
+    args = parser.parse_args()
+
+    if args.focus:
+        visualize_neighborhood(args.turtle_file, args.focus, args.hops, args.output_dot)
+    else:
+        visualize_ontology(args.turtle_file, args.output_dot or "ontology_graph.dot")
@@ -0,0 +1,10 @@
+# tests/conftest.py
+import os
+import sys
+
+# The pipeline modules live flat in scripts/ and import each other by name
+SCRIPTS_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "scripts")
+sys.path.insert(0, SCRIPTS_DIR)
+
+# generate_ontology builds its API client at import time; no test talks to it
+os.environ.setdefault("OPENAI_API_KEY", "test")
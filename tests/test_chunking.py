@@ -0,0 +1,60 @@
+# tests/test_chunking.py
+from chunking import chunk_text_by_tokens, count_tokens, is_heading, split_into_blocks
+
+
+def manual(sections=6, paragraphs=5):
+    parts = []
+    for s in range(1, sections + 1):
+        parts.append(f"{s}-1. SECTION {s} MAINTENANCE")
+        for p in range(paragraphs):
+            parts.append(" ".join(f"Check item {s}.{p}.{k} of the hull and tighten its bolts."
+                                  for k in range(6)))
+            parts.append("")
+    return "\n".join(parts)
+
+
+def test_headings():
+    for line in ("3-2. ENGINE COMPARTMENT", "4.1.2 Hydraulic System", "CHAPTER 5", "APPENDIX B",
+                 "LUBRICATION INSTRUCTIONS"):
+        assert is_heading(line)
+    for line in ("WARNING", "Check the oil level.", "", "2. the pump is removed first. Then"):
+        assert not is_heading(line)
+
+
+def test_blocks_mark_sections():
+    blocks = split_into_blocks("CHAPTER 1\nIntro text.\n\nMore text.\n2-1. FUEL SYSTEM\nFuel.")
+    assert blocks == [("CHAPTER 1\nIntro text.", True), ("More text.", False),
+                      ("2-1. FUEL SYSTEM\nFuel.", True)]
+
+
+def test_chunks_respect_budget_and_cover_the_text():
+    document = manual()
+    budget = 400
+    chunks = chunk_text_by_tokens(document, max_tokens=budget, overlap_tokens=40)
+    assert len(chunks) > 1
+    for chunk in chunks:
+        # Joining blocks with newlines may round up by a token or two
+        assert count_tokens(chunk) <= budget + 2
+    for block, _ in split_into_blocks(document):
+        assert any(block in chunk for chunk in chunks)
+
+
+def test_sections_start_chunks_and_continuations_repeat_the_heading():
+    chunks = chunk_text_by_tokens(manual(), max_tokens=400, overlap_tokens=40)
+    for chunk in chunks:
+        # Either a section starts here, or the chunk continues one and
+        # carries its heading
+        assert is_heading(chunk.splitlines()[0])
+
+
+def test_small_document_is_one_chunk():
+    document = manual(sections=2, paragraphs=1)
+    assert chunk_text_by_tokens(document, max_tokens=10_000) == [document.replace("\n\n", "\n").strip()]
+
+
+def test_oversized_block_is_split_on_sentences():
+    block = " ".join(f"Sentence number {i} describes the turret." for i in range(200))
+    chunks = chunk_text_by_tokens(block, max_tokens=100, overlap_tokens=0)
+    assert len(chunks) > 1
+    assert all(chunk.endswith("turret.") for chunk in chunks)
+    assert " ".join(chunks) == block
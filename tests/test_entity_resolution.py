@@ -0,0 +1,56 @@
+# tests/test_entity_resolution.py
+from entity_resolution import EntityResolver
+from generate_ontology import merge_partial_json, normalize_name
+
+PART_NAMES = [
+    "Engine", "Engine Oil", "Battery", "Battery Box", "Abrams tank", "M1 Abrams",
+    "Fuel Tank", "Fuel Filter", "Road Wheel", "Road Wheels", "Track Shoe",
+    "Track Shoes", "Hull", "Turret", "Turret Ring", "Main Gun", "Air Cleaner",
+    "Oil Cooler", "Hydraulic Pump", "Drive Sprocket",
+]
+
+
+def resolve(names, **entity_fields):
+    entities = {normalize_name(n): dict(entity_fields, name=n, sources=[0]) for n in names}
+    return EntityResolver().resolve(entities)
+
+
+def test_part_names():
+    assert resolve(PART_NAMES) == {
+        "m1_abrams": "abrams_tank",
+        "road_wheels": "road_wheel",
+        "track_shoes": "track_shoe",
+    }
+
+
+def test_contained_names_are_not_merged():
+    for short, long in [("Engine", "Engine Oil"), ("Battery", "Battery Box"),
+                        ("Fuel", "Fuel Tank"), ("Turret", "Turret Ring")]:
+        assert resolve([short, long]) == {}
+
+
+def test_aliases_differing_by_designator_or_kind_are_merged():
+    assert resolve(["Abrams tank", "M1 Abrams"]) == {"m1_abrams": "abrams_tank"}
+    assert resolve(["M1 Abrams", "m1_abrams tank"]) == {"m1_abrams_tank": "m1_abrams"}
+    assert resolve(["the Main Gun", "Main Gun"]) == {"main_gun": "the_main_gun"}
+
+
+def test_distinct_designators_are_never_merged():
+    assert resolve(["M1 Abrams", "M1A1 Abrams"]) == {}
+    # "Abrams tank" could be either vehicle
+    assert resolve(["Abrams tank", "M1 Abrams", "M1A1 Abrams"]) == {}
+
+
+def test_descriptions_do_not_outweigh_names():
+    assert resolve(["Engine", "Engine Oil"], description="Part of the power pack.") == {}
+
+
+def test_merge_folds_relationships_onto_canonical_entity():
+    merged = merge_partial_json([
+        {"entities": [{"name": "M1 Abrams"}, {"name": "Hull"}],
+         "relationships": [{"source": "M1 Abrams", "type": "hasPart", "target": "Hull"}]},
+        {"entities": [{"name": "Abrams tank"}],
+         "relationships": [{"source": "Abrams tank", "type": "hasPart", "target": "Road Wheels"}]},
+    ], resolver=EntityResolver())
+    assert [e["name"] for e in merged["entities"]] == ["M1 Abrams", "Hull"]
+    assert merged["aliases"] == {"M1 Abrams": ["Abrams tank"]}
@@ -0,0 +1,88 @@
+# tests/test_incremental_merge.py
+import os
+import shutil
+
+import rdflib
+from rdflib import BNode
+from rdflib.namespace import OWL, RDF
+
+from incremental_merge import apply_merged
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+EXTRACTION = {
+    "entities": [
+        {"name": "Tracked Vehicle", "type": "Class", "description": "Moves on tracks."},
+        {"name": "Turret", "type": "Class", "description": "Rotating gun mount."},
+        {"name": "Main Gun", "type": "Class"},
+        {"name": "Track", "type": "Class"},
+        {"name": "M1 Abrams", "type": "Individual", "class_membership": ["Tracked Vehicle"],
+         "properties": {"weight": 54000}},
+    ],
+    "relationships": [
+        # Curated class -> restriction on a class this document does not own
+        {"source": "Tracked Vehicle", "type": "hasPart", "target": "Turret"},
+        {"source": "Tracked Vehicle", "type": "hasPart", "target": "Track"},
+        # Owned class -> restriction the document owns
+        {"source": "Turret", "type": "hasPart", "target": "Main Gun"},
+        {"source": "M1 Abrams", "type": "hasPart", "target": "Turret"},
+    ],
+}
+
+
+def curated_copy(tmp_path):
+    path = str(tmp_path / "ontology.ttl")
+    shutil.copy(os.path.join(ROOT, "4omTTL.ttl"), path)
+    return path
+
+
+def orphan_restrictions(path):
+    graph = rdflib.Graph().parse(path, format="turtle")
+    return [node for node in graph.subjects(RDF.type, OWL.Restriction)
+            if isinstance(node, BNode) and not list(graph.subject_predicates(node))]
+
+
+def restriction_count(path):
+    graph = rdflib.Graph().parse(path, format="turtle")
+    return len(list(graph.subjects(RDF.type, OWL.Restriction)))
+
+
+def test_reapplying_the_same_extraction_is_a_no_op(tmp_path):
+    path = curated_copy(tmp_path)
+    first = apply_merged(path, EXTRACTION, "manual", use_cache=False)
+    assert first["added"] > 0
+    restrictions = restriction_count(path)
+    for _ in range(2):
+        again = apply_merged(path, EXTRACTION, "manual", use_cache=False)
+        assert (again["added"], again["removed"]) == (0, 0)
+        assert again["changed_entities"] == [] and again["removed_entities"] == []
+        assert again["triples_after"] == first["triples_after"]
+    assert restriction_count(path) == restrictions
+    assert orphan_restrictions(path) == []
+
+
+def test_dropped_restrictions_are_removed_with_their_subtree(tmp_path):
+    path = curated_copy(tmp_path)
+    apply_merged(path, EXTRACTION, "manual", use_cache=False)
+    before = restriction_count(path)
+    revised = dict(EXTRACTION, relationships=[
+        rel for rel in EXTRACTION["relationships"] if rel["target"] != "Main Gun"])
+    summary = apply_merged(path, revised, "manual", use_cache=False)
+    # subClassOf link + type, onProperty, someValuesFrom of the restriction
+    assert summary["removed"] == 4
+    assert restriction_count(path) == before - 1
+    assert orphan_restrictions(path) == []
+
+
+def test_removed_entity_takes_restrictions_pointing_at_it(tmp_path):
+    path = curated_copy(tmp_path)
+    apply_merged(path, EXTRACTION, "manual", use_cache=False)
+    revised = {
+        "entities": [e for e in EXTRACTION["entities"] if e["name"] != "Main Gun"],
+        "relationships": [rel for rel in EXTRACTION["relationships"] if rel["target"] != "Main Gun"],
+    }
+    summary = apply_merged(path, revised, "manual", use_cache=False)
+    assert any(uri.endswith("#MainGun") for uri in summary["removed_entities"])
+    assert orphan_restrictions(path) == []
+    graph = rdflib.Graph().parse(path, format="turtle")
+    assert not any(str(o).endswith("#MainGun") for o in graph.objects())
@@ -0,0 +1,69 @@
+# tests/test_llm_cache.py
+import os
+import time
+from types import SimpleNamespace
+
+import generate_ontology
+from llm_cache import LLMCache, make_cache_key
+
+MESSAGES = [{"role": "system", "content": "Extract."}, {"role": "user", "content": "Hull."}]
+
+
+def test_key_covers_model_messages_and_params():
+    key = make_cache_key("o3-mini", MESSAGES)
+    assert key == make_cache_key("o3-mini", [dict(m) for m in MESSAGES])
+    assert key != make_cache_key("gpt-4o-mini", MESSAGES)
+    assert key != make_cache_key("o3-mini", MESSAGES[:1])
+    assert key != make_cache_key("o3-mini", MESSAGES, temperature=0)
+
+
+def test_round_trip_and_counters(tmp_path):
+    cache = LLMCache(cache_dir=str(tmp_path))
+    key = make_cache_key("o3-mini", MESSAGES)
+    assert cache.get(key) is None
+    assert not cache.contains(key)
+    cache.put(key, '{"entities": []}', model="o3-mini")
+    assert cache.contains(key)
+    assert cache.get(key) == '{"entities": []}'
+    # A fresh instance reads the same file
+    assert LLMCache(cache_dir=str(tmp_path)).get(key) == '{"entities": []}'
+    stats = cache.stats()
+    assert (stats["hits"], stats["misses"], stats["entries"]) == (1, 1, 1)
+    assert stats["bytes_saved"] == len('{"entities": []}')
+
+
+def test_bypass_misses_but_still_writes(tmp_path):
+    cache = LLMCache(cache_dir=str(tmp_path), bypass=True)
+    cache.put("ab" * 32, "fresh")
+    assert cache.get("ab" * 32) is None
+    assert LLMCache(cache_dir=str(tmp_path)).get("ab" * 32) == "fresh"
+
+
+def test_eviction_drops_least_recently_used(tmp_path):
+    cache = LLMCache(cache_dir=str(tmp_path), max_bytes=250)
+    keys = [f"{i:02d}" * 32 for i in range(3)]
+    for i, key in enumerate(keys[:2]):
+        cache.put(key, "x" * 60)
+        past = time.time() - 100 + i
+        os.utime(cache._path(key), (past, past))
+    cache.get(keys[0])  # refreshes the oldest entry
+    cache.put(keys[2], "x" * 60)
+    assert cache.contains(keys[0]) and cache.contains(keys[2])
+    assert not cache.contains(keys[1])
+    assert cache.stats()["evictions"] == 1
+
+
+def test_chat_completion_is_served_from_cache(tmp_path, monkeypatch):
+    calls = []
+
+    class FakeClient:
+        def create(self, **kwargs):
+            calls.append(kwargs)
+            message = SimpleNamespace(content="  reply  ")
+            return SimpleNamespace(choices=[SimpleNamespace(message=message)], usage=None)
+
+    monkeypatch.setattr(generate_ontology, "client", FakeClient())
+    monkeypatch.setattr(generate_ontology, "llm_cache", LLMCache(cache_dir=str(tmp_path)))
+    assert generate_ontology.chat_completion("o3-mini", MESSAGES) == "reply"
+    assert generate_ontology.chat_completion("o3-mini", MESSAGES) == "reply"
+    assert len(calls) == 1
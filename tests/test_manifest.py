@@ -0,0 +1,83 @@
+# tests/test_manifest.py
+import json
+import os
+
+import pytest
+
+import generate_ontology
+from generate_ontology import (ConcurrentMerger, extract_partials_incrementally, load_manifest,
+                               merge_partial_json)
+
+CHUNKS = ["1-1. HULL\nThe hull is welded steel.", "1-2. TURRET\nThe turret rotates.",
+          "1-3. TRACKS\nEach track has 78 shoes."]
+
+
+@pytest.fixture
+def extractions(monkeypatch):
+    calls = []
+
+    def fake_extract(chunk, **kwargs):
+        calls.append(chunk)
+        if "FAIL" in chunk:
+            raise RuntimeError("API down")
+        name = chunk.splitlines()[0].split(". ")[1].title()
+        partial = {"entities": [{"name": name}], "relationships": []}
+        if kwargs.get("on_entity"):
+            kwargs["on_entity"](partial["entities"][0])
+        return partial
+
+    monkeypatch.setattr(generate_ontology, "extract_partial_json", fake_extract)
+    return calls
+
+
+def partial_files(partials_dir):
+    return sorted(n for n in os.listdir(partials_dir) if n.startswith("partial_"))
+
+
+def test_unchanged_chunks_are_reused(tmp_path, extractions):
+    first = extract_partials_incrementally(CHUNKS, str(tmp_path), max_workers=2)
+    assert len(extractions) == 3
+    second = extract_partials_incrementally(CHUNKS, str(tmp_path), max_workers=2)
+    assert len(extractions) == 3
+    assert second == first
+    # Whitespace changes keep the fingerprint
+    reflowed = [chunk.replace(" ", "  ") for chunk in CHUNKS]
+    assert extract_partials_incrementally(reflowed, str(tmp_path)) == first
+    assert len(extractions) == 3
+
+
+def test_revised_chunk_is_re_extracted_and_stale_files_removed(tmp_path, extractions):
+    extract_partials_incrementally(CHUNKS, str(tmp_path))
+    revised = [CHUNKS[0], "1-2. GUN MOUNT\nThe mount holds the gun.", CHUNKS[2]]
+    partials = extract_partials_incrementally(revised, str(tmp_path))
+    assert extractions[3:] == [revised[1]]
+    assert [p["entities"][0]["name"] for p in partials] == ["Hull", "Gun Mount", "Tracks"]
+    manifest = load_manifest(str(tmp_path))
+    assert len(manifest["chunks"]) == 3 and len(partial_files(str(tmp_path))) == 3
+    assert sorted(manifest["chunks"].values()) == partial_files(str(tmp_path))
+
+
+def test_failed_chunks_are_retried(tmp_path, extractions):
+    chunks = CHUNKS[:2] + ["1-3. FAIL\nNothing."]
+    partials = extract_partials_incrementally(chunks, str(tmp_path))
+    assert "error" in partials[2]
+    extract_partials_incrementally(chunks, str(tmp_path))
+    assert extractions.count(chunks[2]) == 2
+    assert extractions.count(chunks[0]) == 1
+
+
+def test_repeated_chunks_are_extracted_once(tmp_path, extractions):
+    partials = extract_partials_incrementally(CHUNKS + CHUNKS[:1], str(tmp_path))
+    assert len(extractions) == 3
+    assert partials[3] == partials[0]
+    with open(os.path.join(str(tmp_path), "manifest.json"), encoding="utf-8") as f:
+        assert len(json.load(f)["order"]) == 4
+
+
+def test_streaming_merger_sees_reused_and_new_chunks(tmp_path, extractions):
+    extract_partials_incrementally(CHUNKS[:2], str(tmp_path))
+    merger = ConcurrentMerger()
+    chunks = CHUNKS + CHUNKS[:1]
+    partials = extract_partials_incrementally(chunks, str(tmp_path), merger=merger, max_workers=2)
+    assert extractions[2:] == [CHUNKS[2]]
+    assert merger.result() == merge_partial_json(partials)
@@ -0,0 +1,164 @@
+# tests/test_merge.py
+import copy
+import random
+from collections import defaultdict
+
+from generate_ontology import (ConcurrentMerger, PartialMerger, merge_partial_json,
+                               merge_partial_json_stream)
+
+
+def reference_merge(partials):
+    """
+    merge_partial_json as it was before the hash-indexed rewrite (quadratic
+    relationship dedup, substring description dedup), kept as the oracle.
+    """
+    def normalize_name(name):
+        return name.strip().lower().replace(' ', '_')
+
+    entities = defaultdict(dict)
+    relationships = defaultdict(list)
+    entity_provenance = defaultdict(set)
+    relationship_provenance = defaultdict(set)
+    for idx, partial in enumerate(partials):
+        for entity in partial.get('entities', []):
+            name = normalize_name(entity['name'])
+            entity_provenance[name].add(idx)
+            if name not in entities:
+                entities[name] = entity
+                entities[name]['sources'] = [idx]
+            else:
+                if 'description' in entity:
+                    existing_desc = entities[name].get('description', '')
+                    new_desc = entity['description'].strip()
+                    if new_desc and new_desc not in existing_desc:
+                        entities[name]['description'] = f"{existing_desc}\n{new_desc}".strip()
+                for key in [k for k in entity if k not in ('name', 'description')]:
+                    entities[name][key] = entity[key]
+                entities[name]['sources'].append(idx)
+        for rel in partial.get('relationships', []):
+            if not all(key in rel for key in ['source', 'type', 'target']):
+                continue
+            key = (normalize_name(rel['source']), normalize_name(rel['type']),
+                   normalize_name(rel['target']))
+            relationship_provenance[key].add(idx)
+            if not any(r['properties'] == rel.get('properties', {}) for r in relationships[key]):
+                relationships[key].append({
+                    'source': normalize_name(rel['source']),
+                    'target': normalize_name(rel['target']),
+                    'type': rel['type'].strip(),
+                    'properties': rel.get('properties', {}),
+                    'sources': [idx]
+                })
+    valid_relationships = [rel for rels in relationships.values() for rel in rels
+                           if rel['source'] in entities and rel['target'] in entities]
+    final_entities = [{
+        'name': data['name'],
+        'description': data.get('description', ''),
+        'properties': data.get('properties', {}),
+        'source_chunks': sorted(data['sources'])
+    } for data in entities.values()]
+    return {
+        'entities': final_entities,
+        'relationships': valid_relationships,
+        'provenance': {
+            'entity_sources': {k: sorted(v) for k, v in entity_provenance.items()},
+            'relationship_sources': {k: sorted(v) for k, v in relationship_provenance.items()}
+        },
+        'stats': {
+            'total_entities': len(final_entities),
+            'total_relationships': len(valid_relationships),
+            'unique_relationship_types': len(set(r['type'] for r in valid_relationships))
+        }
+    }
+
+
+def random_partials(seed, count=40):
+    rng = random.Random(seed)
+    names = [f"Part {i}" for i in range(30)] + ["Hull", "Turret", "Main Gun"]
+    types = ["hasPart", "mountedOn", "connectedTo"]
+    partials = []
+    for _ in range(count):
+        entities = []
+        for name in rng.sample(names, rng.randint(0, 6)):
+            entity = {"name": rng.choice([name, name.upper(), f" {name} "]),
+                      "properties": {"weight": rng.choice([1, 2, 3])}}
+            if rng.random() < 0.7:
+                entity["description"] = f"{name} sentence {rng.randint(0, 2)}."
+            entities.append(entity)
+        relationships = []
+        for _ in range(rng.randint(0, 8)):
+            rel = {"source": rng.choice(names), "type": rng.choice(types),
+                   "target": rng.choice(names)}
+            if rng.random() < 0.5:
+                rel["properties"] = {"count": rng.choice([1, 2])}
+            relationships.append(rel)
+        partials.append({"entities": entities, "relationships": relationships})
+    return partials
+
+
+def comparable(merged):
+    """
+    The parts of a merge result the reference also produces; the rewrite
+    adds ids, aliases and schema fields and joins relationship keys with '|'.
+    """
+    return {
+        'entities': [{k: e[k] for k in ('name', 'description', 'properties', 'source_chunks')}
+                     for e in merged['entities']],
+        'relationships': merged['relationships'],
+        'entity_sources': merged['provenance']['entity_sources'],
+        'relationship_sources': {"|".join(k) if isinstance(k, tuple) else k: v
+                                 for k, v in merged['provenance']['relationship_sources'].items()},
+        'stats': {k: merged['stats'][k] for k in
+                  ('total_entities', 'total_relationships', 'unique_relationship_types')},
+    }
+
+
+def test_merge_matches_reference():
+    for seed in range(5):
+        partials = random_partials(seed)
+        expected = comparable(reference_merge(copy.deepcopy(partials)))
+        assert comparable(merge_partial_json(copy.deepcopy(partials))) == expected
+
+
+def test_merge_does_not_mutate_partials():
+    partials = random_partials(1)
+    before = copy.deepcopy(partials)
+    merge_partial_json(partials)
+    assert partials == before
+
+
+def test_stream_matches_list():
+    partials = random_partials(2)
+    assert merge_partial_json_stream(iter(partials)) == merge_partial_json(partials)
+
+
+def test_concurrent_merger_is_order_independent():
+    partials = random_partials(3, count=12)
+    merger = ConcurrentMerger()
+    # Chunks finish in reverse order, items interleaved across chunks
+    for idx in reversed(range(len(partials))):
+        merger.add_partial(partials[idx], idx)
+        merger.finish_chunk(idx)
+    assert merger.result() == merge_partial_json(partials)
+
+
+def test_description_sentences_are_deduplicated():
+    merger = PartialMerger()
+    merger.add_partial({"entities": [{"name": "Hull", "description": "Armored body. Holds the crew."}]})
+    merger.add_partial({"entities": [{"name": "hull", "description": "Holds the crew. Welded steel."}]})
+    [hull] = merger.result()["entities"]
+    assert hull["description"] == "Armored body. Holds the crew.\nWelded steel."
+    assert hull["source_chunks"] == [0, 1]
+
+
+def test_relationships_need_both_endpoints():
+    merged = merge_partial_json([
+        {"entities": [{"name": "Hull"}, {"name": "Turret"}],
+         "relationships": [{"source": "Turret", "type": "mountedOn", "target": "Hull"},
+                           {"source": "Turret", "type": "hasPart", "target": "Main Gun"},
+                           {"source": "Turret", "type": "mountedOn"}]},
+    ])
+    assert [(r["source"], r["type"], r["target"]) for r in merged["relationships"]] == \
+        [("turret", "mountedOn", "hull")]
+    assert merged["provenance"]["relationship_sources"] == {
+        "turret|mountedon|hull": [0], "turret|haspart|main_gun": [0]}
@@ -0,0 +1,66 @@
+# tests/test_ontology_store.py
+import json
+
+import pytest
+
+from entity_resolution import EntityResolver
+from generate_ontology import merge_partial_json
+from ontology_store import STORE_SUFFIX, OntologyStore, load_merged, save_merged
+
+MERGED = merge_partial_json([
+    {"entities": [
+        {"name": "Tank", "type": "Class", "description": "Tracked. Armored."},
+        {"name": "Hull", "type": "Class", "properties": {"material": "steel"}},
+        {"name": "M1 Abrams", "type": "Individual", "class_membership": ["Tank"],
+         "properties": {"weight": 54000, "speed": 67.5, "crew": ["driver", "gunner"]}},
+        {"name": "Pipe|Fitting", "type": "Class"},
+        {"name": "Lüfter", "type": "Class", "description": "Ventilator."},
+    ], "relationships": [
+        {"source": "M1 Abrams", "type": "hasPart", "target": "Hull"},
+        {"source": "Pipe|Fitting", "type": "part of", "target": "Hull", "properties": {"count": 2}},
+        {"source": "Lüfter", "type": "mountedOn", "target": "Hull"},
+    ]},
+    {"entities": [{"name": "Abrams tank", "type": "Individual"}, {"name": "hull"}],
+     "relationships": [{"source": "Abrams tank", "type": "hasPart", "target": "Hull"}]},
+], resolver=EntityResolver())
+
+
+def test_round_trip_is_exact(tmp_path):
+    path = str(tmp_path / f"merged{STORE_SUFFIX}")
+    assert save_merged(MERGED, path) > 0
+    assert load_merged(path) == json.loads(json.dumps(MERGED))
+    assert OntologyStore.from_merged(MERGED).to_merged() == json.loads(json.dumps(MERGED))
+
+
+def test_provenance_keys_with_separator_survive(tmp_path):
+    path = str(tmp_path / f"merged{STORE_SUFFIX}")
+    save_merged(MERGED, path)
+    keys = load_merged(path)["provenance"]["relationship_sources"]
+    assert "pipe|fitting|part_of|hull" in keys
+
+
+def test_views_and_adjacency(tmp_path):
+    path = str(tmp_path / f"merged{STORE_SUFFIX}")
+    save_merged(MERGED, path)
+    store = OntologyStore.load(path)
+    assert len(store) == len(MERGED["entities"])
+    hull = store.find("hull")
+    assert hull.name == "Hull" and hull.properties == {"material": "steel"}
+    assert sorted(r.source.name for r in hull.incoming()) == ["Lüfter", "M1 Abrams", "Pipe|Fitting"]
+    abrams = store.find("m1_abrams")
+    assert abrams.fields == {"type": "Individual", "class_membership": ["Tank"]}
+    assert [r.type for r in abrams.outgoing()] == ["hasPart"]
+    assert store.find("nothing") is None
+
+
+def test_json_files_load_too(tmp_path):
+    path = tmp_path / "merged_ontology.json"
+    path.write_text(json.dumps(MERGED), encoding="utf-8")
+    assert load_merged(str(path)) == json.loads(json.dumps(MERGED))
+
+
+def test_rejects_other_files(tmp_path):
+    path = tmp_path / f"junk{STORE_SUFFIX}"
+    path.write_bytes(b"NOPE" + bytes(64))
+    with pytest.raises(ValueError):
+        OntologyStore.load(str(path))
@@ -0,0 +1,69 @@
+# tests/test_parse_manual.py
+import os
+
+import pytest
+
+from parse_manual import _extract_page_range, strip_tables, tables_to_partial
+
+VEHICLE_MANUAL = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+                              "data", "primary_documents", "vehical_manual.pdf")
+
+
+@pytest.fixture(scope="module")
+def vehicle_pages():
+    if not os.path.exists(VEHICLE_MANUAL):
+        pytest.skip("vehical_manual.pdf not available")
+    # Page 20 (sensitivity table) through 61 (appendix C) hold every table
+    return _extract_page_range(VEHICLE_MANUAL, 19, 61, detect=True)
+
+
+def tables_on(pages):
+    return [table for _, _, tables in pages for table in tables]
+
+
+def test_specification_tables_are_found(vehicle_pages):
+    tables = tables_on(vehicle_pages)
+    assert [t["page"] for t in tables] == [20, 53, 54, 60, 60, 60, 61, 61]
+    b1 = next(t for t in tables if t["caption"].startswith("Table B1"))
+    assert b1["header"][2] == "Combat Weight (kg)"
+    assert ["AMX 40 LeClerc", "N", "43700"] == b1["rows"][2][:3]
+
+
+def test_statistics_printouts_and_debris_are_rejected(vehicle_pages):
+    for table in tables_on(vehicle_pages):
+        text = " ".join([table["caption"]] + table["header"] + [row[0] for row in table["rows"]])
+        for word in ("Nparm", "Sum of Squares", "Analysis of Variance", "C Total", "Std Error"):
+            assert word not in text
+        assert table["caption"] != '"'
+    classes = {e["name"] for e in tables_to_partial(tables_on(vehicle_pages))["entities"]
+               if e["type"] == "Class"}
+    assert classes == {"Attribute/Performance Descriptions", "Tracked Vehicle", "Wheeled Vehicle"}
+
+
+def test_rejected_tables_stay_in_the_prose(vehicle_pages):
+    for number, text, tables in vehicle_pages:
+        if number in (50, 51, 58, 59):
+            assert tables == []
+            assert strip_tables(text, tables) == text.strip()
+    page_50 = next(text for number, text, _ in vehicle_pages if number == 50)
+    assert "Effect Test" in page_50
+
+
+def test_rows_with_blank_label_continue_the_row_above(vehicle_pages):
+    partial = tables_to_partial([t for t in tables_on(vehicle_pages) if t["page"] == 20])
+    entities = {e["name"]: e for e in partial["entities"]}
+    power = entities["Power"]["properties"]
+    assert power["Variation"] == [10, 20, 5]
+    # The rows above the first label belong to it
+    assert entities["Combat Weight (Gross Combined)"]["properties"]["Variation"][:3] == [5, 10, 20]
+
+
+def test_tables_to_partial_keeps_every_row():
+    partial = tables_to_partial([{
+        "caption": "Table A1 Engines", "page": 3,
+        "header": ["Engine", "Power (hp)", "Weight (kg)"],
+        "rows": [["", "100", "50"], ["V8", "400", "300"], ["", "450", ""], ["6.5", "1", "2"]],
+    }])
+    [cls, v8] = partial["entities"]
+    assert cls == {"name": "Engine", "type": "Class"}
+    assert v8["properties"] == {"Power (hp)": [100, 400, 450], "Weight (kg)": [50, 300]}
@@ -0,0 +1,17 @@
+# tests/test_pipeline.py
+import pipeline
+
+
+def test_cache_stats_are_per_document(monkeypatch):
+    def fake_pipeline(pdf_path, ttl_file, dot_file, page_workers=None, **kwargs):
+        pipeline.llm_cache.hits += 2
+        pipeline.llm_cache.misses += 1
+        return "metrics.json"
+
+    monkeypatch.setattr(pipeline, "process_pdf_to_ontology_and_visualize", fake_pipeline)
+    monkeypatch.setattr(pipeline.llm_cache, "cache_dir", "/nonexistent/llm_cache")
+    first = pipeline._process_document_safely("a.pdf", {})
+    second = pipeline._process_document_safely("b.pdf", {})
+    # The same worker's second document does not count the first one's hits
+    assert (first["cache"]["hits"], first["cache"]["misses"]) == (2, 1)
+    assert (second["cache"]["hits"], second["cache"]["misses"]) == (2, 1)
@@ -0,0 +1,102 @@
+# tests/test_streaming.py
+import json
+import random
+
+import pytest
+import rdflib
+from rdflib.compare import isomorphic
+
+from streaming import JSONItemStreamParser, MalformedStreamError, TurtleStatementSplitter
+
+REPLY = {
+    "entities": [
+        {"name": "Hull", "type": "Class", "description": "Braces {} and [brackets] \"quoted\"."},
+        {"name": "Turret", "type": "Class", "properties": {"rotation": [0, 360]}},
+        {"name": "M1 Abrams", "type": "Individual", "class_membership": ["Tank"]},
+    ],
+    "relationships": [
+        {"source": "Turret", "type": "mountedOn", "target": "Hull", "properties": {"note": "a\\b"}},
+    ],
+    "notes": {"entities": [{"name": "not an item"}]},
+}
+
+TURTLE = """@prefix : <http://example.org/o#> .
+@prefix rdfs: <http://www.w3.org/2000/01/rdf-schema#> .
+PREFIX owl: <http://www.w3.org/2002/07/owl#>
+
+:Hull a owl:Class ; rdfs:label "Hull. With a dot" ; rdfs:comment \"\"\"Long.
+Text with # and . inside\"\"\" .
+:Turret a owl:Class ; :weight 1.5 ; rdfs:seeAlso <http://example.org/a.b> .  # trailing . comment
+:Gun :parts ( :Barrel :Breech ) ; :mount [ a :Mount ] .
+"""
+
+
+def deltas(text, seed):
+    rng = random.Random(seed)
+    i = 0
+    while i < len(text):
+        n = rng.randint(1, 7)
+        yield text[i:i + n]
+        i += n
+
+
+def parse_stream(text, seed):
+    entities, relationships = [], []
+    parser = JSONItemStreamParser(on_entity=entities.append, on_relationship=relationships.append)
+    for delta in deltas(text, seed):
+        parser.feed(delta)
+    parser.close()
+    return entities, relationships
+
+
+@pytest.mark.parametrize("seed", range(10))
+def test_streamed_items_equal_the_parsed_reply(seed):
+    text = "```json\n" + json.dumps(REPLY, indent=seed % 3) + "\n```"
+    assert parse_stream(text, seed) == (REPLY["entities"], REPLY["relationships"])
+
+
+def test_prose_lead_in_is_skipped():
+    text = "Sure! Here is the extraction:\n\n" + json.dumps(REPLY)
+    assert parse_stream(text, 1) == (REPLY["entities"], REPLY["relationships"])
+
+
+def test_reply_without_object_is_rejected():
+    parser = JSONItemStreamParser()
+    with pytest.raises(MalformedStreamError):
+        for _ in range(100):
+            parser.feed("I cannot help with that request. ")
+
+
+def test_truncated_reply_keeps_finished_items():
+    text = json.dumps(REPLY)
+    parser = JSONItemStreamParser()
+    cut = text.index('"Turret"') + 20
+    parser.feed(text[:cut])
+    assert parser.items["entities"] == REPLY["entities"][:1]
+    assert parser.pending_item()[0] == "entities"
+    with pytest.raises(MalformedStreamError):
+        parser.close()
+
+
+def test_unbalanced_json_is_rejected():
+    parser = JSONItemStreamParser()
+    with pytest.raises(MalformedStreamError):
+        parser.feed('{"entities": [{"name": "Hull"}]]}')
+
+
+@pytest.mark.parametrize("seed", range(10))
+def test_streamed_statements_rebuild_the_graph(seed):
+    splitter = TurtleStatementSplitter()
+    statements = []
+    for delta in deltas("```turtle\n" + TURTLE + "```\n", seed):
+        statements.extend(splitter.feed(delta))
+    statements.extend(splitter.close())
+    assert len(statements) == 6
+    rebuilt = rdflib.Graph().parse(data="\n".join(statements), format="turtle")
+    assert isomorphic(rebuilt, rdflib.Graph().parse(data=TURTLE, format="turtle"))
+
+
+def test_statement_without_terminator_is_bounded():
+    splitter = TurtleStatementSplitter(max_statement_chars=100)
+    with pytest.raises(MalformedStreamError):
+        splitter.feed("This is prose that never ends its statement " * 5)
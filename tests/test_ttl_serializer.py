@@ -0,0 +1,81 @@
+# tests/test_ttl_serializer.py
+import rdflib
+from rdflib import Literal, Namespace
+from rdflib.compare import isomorphic
+from rdflib.namespace import OWL, RDF, RDFS, SKOS, XSD
+
+from generate_ontology import merge_partial_json
+from ttl_serializer import DEFAULT_BASE_IRI, merged_json_to_graph, serialize_merged_to_ttl
+
+EX = Namespace(DEFAULT_BASE_IRI)
+
+MERGED = merge_partial_json([
+    {"entities": [
+        {"name": "Vehicle", "type": "Class"},
+        {"name": "Tank", "type": "Class", "superclasses": ["Vehicle"], "description": "Tracked."},
+        {"name": "Car", "type": "Class", "superclasses": ["Vehicle"]},
+        {"name": "Hull", "type": "Class"},
+        {"name": "Wheel", "type": "Class"},
+        {"name": "M1 Abrams", "type": "Individual", "class_membership": ["Tank"],
+         "properties": {"weight": 54000, "speed": 67.5, "crew name": "four"}},
+        {"name": "Fuel-Tank", "type": "Class"},
+        {"name": "fuel tank", "type": "Class"},
+    ], "relationships": [
+        {"source": "Tank", "type": "hasPart", "target": "Hull"},
+        {"source": "Car", "type": "hasPart", "target": "Wheel"},
+        {"source": "Tank", "type": "mountedOn", "target": "Hull"},
+    ]},
+])
+
+
+def test_turtle_round_trips_to_the_same_graph():
+    graph = merged_json_to_graph(MERGED)
+    parsed = rdflib.Graph().parse(data=serialize_merged_to_ttl(MERGED), format="turtle")
+    assert isomorphic(graph, parsed)
+
+
+def test_output_is_deterministic():
+    assert isomorphic(merged_json_to_graph(MERGED), merged_json_to_graph(MERGED))
+
+
+def test_one_restriction_per_class_pair():
+    assert serialize_merged_to_ttl(MERGED).count("owl:Restriction") == 3
+
+
+def test_classes_individuals_and_literals():
+    g = merged_json_to_graph(MERGED)
+    assert (EX.Tank, RDF.type, OWL.Class) in g
+    assert (EX.Tank, RDFS.subClassOf, EX.Vehicle) in g
+    assert (EX.Tank, RDFS.comment, Literal("Tracked.")) in g
+    assert (EX.M1Abrams, RDF.type, EX.Tank) in g
+    assert (EX.M1Abrams, EX.weight, Literal(54000, datatype=XSD.integer)) in g
+    assert (EX.M1Abrams, EX.speed, Literal(67.5, datatype=XSD.decimal)) in g
+    assert (EX.weight, RDF.type, OWL.DatatypeProperty) in g
+
+
+def restrictions(g, prop):
+    return {(cls, g.value(node, OWL.someValuesFrom))
+            for node in g.subjects(OWL.onProperty, prop)
+            for cls in g.subjects(RDFS.subClassOf, node)}
+
+
+def test_domain_and_range_only_when_every_use_agrees():
+    g = merged_json_to_graph(MERGED)
+    # hasPart is used on Tank and on Car: no rdfs:domain, which would mean
+    # Tank AND Car and make "Tank hasPart Wheel" follow
+    assert restrictions(g, EX.hasPart) == {(EX.Tank, EX.Hull), (EX.Car, EX.Wheel)}
+    assert g.value(EX.hasPart, RDFS.domain) is None
+    assert g.value(EX.hasPart, RDFS.range) is None
+    assert g.value(EX.mountedOn, RDFS.domain) == EX.Tank
+    assert g.value(EX.mountedOn, RDFS.range) == EX.Hull
+
+
+def test_colliding_names_get_distinct_iris():
+    g = merged_json_to_graph(MERGED)
+    labels = {str(g.value(uri, RDFS.label)) for uri in (EX.FuelTank, EX.FuelTank_2)}
+    assert labels == {"Fuel-Tank", "fuel tank"}
+
+
+def test_aliases_become_alt_labels():
+    merged = dict(MERGED, aliases={"Tank": ["Abrams tank"]})
+    assert (EX.Tank, SKOS.altLabel, Literal("Abrams tank")) in merged_json_to_graph(merged)
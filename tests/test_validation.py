@@ -0,0 +1,65 @@
+# tests/test_validation.py
+import json
+
+import pytest
+import rdflib
+
+from validation import ValidationError, clean_and_validate_json, validate_ttl
+
+PARTIAL = {"entities": [{"name": "Hull"}, {"name": "Turret"}],
+           "relationships": [{"source": "Turret", "type": "mountedOn", "target": "Hull"}]}
+
+
+def test_valid_json_with_fences_and_prose():
+    raw = "Here you go:\n```json\n" + json.dumps(PARTIAL) + "\n```"
+    assert clean_and_validate_json(raw) == PARTIAL
+    assert clean_and_validate_json(json.dumps(PARTIAL) + "\nHope this helps!") == PARTIAL
+
+
+def test_only_the_broken_object_is_repaired():
+    raw = '{"entities": [{"name": "Hull"}, {"name": "Turret",}], "relationships": []}'
+    calls = []
+
+    def repair(fragment, error, kind, context):
+        calls.append(fragment)
+        return '{"name": "Turret"}'
+
+    partial = clean_and_validate_json(raw, repair_fn=repair)
+    assert calls == ['{"name": "Turret",}']
+    assert partial["entities"] == PARTIAL["entities"]
+    assert partial["validation"]["repaired"] == 1
+
+
+def test_unrepaired_objects_are_dropped():
+    raw = '{"entities": [{"name": "Hull"}, {"name": "Turret",}], "relationships": []}'
+    partial = clean_and_validate_json(raw)
+    assert partial["entities"] == [{"name": "Hull"}]
+    assert partial["validation"]["dropped"] == 1
+
+
+def test_nothing_usable_raises():
+    with pytest.raises(ValidationError):
+        clean_and_validate_json("I could not find any entities.")
+
+
+def test_valid_turtle_is_returned_as_is():
+    ttl = "@prefix : <http://example.org/o#> .\n:Hull a :Part ."
+    assert validate_ttl("```turtle\n" + ttl + "\n```") == (ttl, {"statements": 0, "invalid": 0,
+                                                                 "repaired": 0, "dropped": 0})
+
+
+def test_invalid_turtle_statements_are_repaired_or_commented_out():
+    ttl = ("@prefix : <http://example.org/o#> .\n"
+           ":Hull a owl:Class .\n"
+           ":Turret a :Part ; :on :Hull ,, .\n"
+           ":Gun a :Part :oops .\n")
+
+    def repair(statement, error, kind, context):
+        return ":Turret a :Part ; :on :Hull ." if "Turret" in statement else "still broken"
+
+    text, report = validate_ttl(ttl, repair_fn=repair)
+    assert (report["invalid"], report["repaired"], report["dropped"]) == (2, 1, 1)
+    graph = rdflib.Graph().parse(data=text, format="turtle")
+    # Hull (owl: is declared for it) and the repaired Turret statement
+    assert len(graph) == 3
+    assert "# INVALID" in text